@@ -0,0 +1,257 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, select, union_all
+
+from models import db, Cast, Movie, TVSeries, Season, Episode, MediaTable, CatalogVersion, MediaDocument
+from serializers import dumps, loads, compact_document, serialize_movie, serialize_tv
+
+# Catalog loader shared by the public media routes.
+#
+# Titles are assembled in memory from a fixed set of queries (media entries,
+# movies, tv series, cast, seasons, episodes) instead of looking rows up one
+# title at a time, so the number of round-trips does not grow with the catalog.
+# The result is stored per title in media_document at write time, which is
+# what the read routes serve; load_catalog only runs for titles without one.
+
+MEDIA_TYPES = ('movie', 'tv')
+
+# Every key a title document can carry, used to validate ?fields= projections
+DOCUMENT_FIELDS = frozenset([
+    'id', 'type', 'title', 'description', 'thumbnail', 'release_date', 'language', 'rating',
+    'cast', 'video_links', 'download_links', 'total_seasons', 'seasons'
+])
+
+
+def _restrict(query, column, ids):
+    # ids=None means "the whole catalog": no IN list at all, just a plain scan
+    if ids is None:
+        return query
+    return query.filter(column.in_(ids))
+
+
+def query_media_ids(media_type=None, language=None, year=None, after_id=None, limit=None, updated_since=None):
+    """Return the ids of titles matching the filters, in id order.
+
+    Filters are evaluated in SQL; ``after_id``/``limit`` implement keyset
+    pagination over the shared ``media_table.id``. ``updated_since`` keeps
+    titles whose document changed after that (naive UTC) datetime.
+    """
+    query = db.session.query(MediaTable.id)
+    if media_type:
+        query = query.filter(MediaTable.type == media_type)
+    if updated_since is not None:
+        query = query.filter(MediaTable.updated_at > updated_since)
+    if language or year:
+        # Ids from each title table through its language/release_date index, rather than an OR
+        # across outer joins, which can only be answered by scanning media_table
+        models = [model for kind, model in (('movie', Movie), ('tv', TVSeries)) if media_type in (None, kind)]
+        query = query.filter(MediaTable.id.in_(union_all(*[
+            select(model.id).where(and_(*_title_filters(model, language, year))) for model in models
+        ])))
+    if after_id is not None:
+        query = query.filter(MediaTable.id > after_id)
+    query = query.order_by(MediaTable.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [row.id for row in query]
+
+
+def _title_filters(model, language, year):
+    conditions = []
+    if language:
+        conditions.append(model.language == language)
+    if year:
+        # release_date is stored as 'YYYY-MM-DD' text; the range lets the index narrow it down
+        year = int(year)
+        conditions += [model.release_date >= f"{year:04d}-01-01", model.release_date < f"{year + 1:04d}-01-01",
+                       model.release_date.like(f"{year:04d}-%")]
+    return conditions
+
+
+def project(document, fields):
+    return {key: document[key] for key in fields if key in document}
+
+
+def load_catalog(media_ids=None, fields=None):
+    """Build the public JSON documents for ``media_ids`` (or every title), ordered by id.
+
+    Issues at most six queries regardless of how many titles, seasons or
+    episodes are involved. When ``fields`` is given the documents are
+    projected to those keys and cast/season queries are skipped if unused.
+    """
+    include_cast = fields is None or 'cast' in fields
+    include_seasons = fields is None or 'seasons' in fields
+    if media_ids is not None:
+        media_ids = list(media_ids)
+        if not media_ids:
+            return []
+
+    entries = _restrict(db.session.query(MediaTable.id, MediaTable.type), MediaTable.id, media_ids) \
+        .order_by(MediaTable.id).all()
+    movie_ids = [e.id for e in entries if e.type == 'movie']
+    tv_ids = [e.id for e in entries if e.type == 'tv']
+    # When loading everything the id lists are only used for emptiness checks
+    movie_filter = None if media_ids is None else movie_ids
+    tv_filter = None if media_ids is None else tv_ids
+
+    movies = {}
+    if movie_ids:
+        movies = {m.id: m for m in _restrict(Movie.query, Movie.id, movie_filter)}
+
+    tv_series = {}
+    seasons_by_tv = defaultdict(list)
+    episodes_by_season = defaultdict(list)
+    if tv_ids:
+        tv_series = {t.id: t for t in _restrict(TVSeries.query, TVSeries.id, tv_filter)}
+    if tv_ids and include_seasons:
+        seasons = _restrict(Season.query, Season.tv_series_id, tv_filter) \
+            .order_by(Season.tv_series_id, Season.season_number).all()
+        for season in seasons:
+            seasons_by_tv[season.tv_series_id].append(season)
+        if seasons:
+            episodes = _restrict(Episode.query.join(Season), Season.tv_series_id, tv_filter) \
+                .order_by(Episode.season_id, Episode.episode_number).all()
+            for episode in episodes:
+                episodes_by_season[episode.season_id].append(episode)
+
+    cast_by_media = defaultdict(list)
+    if include_cast and (movies or tv_series):
+        for member in _restrict(Cast.query, Cast.media_id, media_ids).order_by(Cast.id):
+            cast_by_media[member.media_id].append(member)
+
+    media_list = []
+    for entry in entries:
+        if entry.type == 'movie' and entry.id in movies:
+            media_list.append(serialize_movie(movies[entry.id], cast_by_media[entry.id]))
+        elif entry.type == 'tv' and entry.id in tv_series:
+            tv = tv_series[entry.id]
+            media_list.append(serialize_tv(tv, cast_by_media[entry.id], seasons_by_tv[tv.id], episodes_by_season))
+    if fields is not None:
+        media_list = [project(document, fields) for document in media_list]
+    return media_list
+
+
+def store_documents(media_ids, chunk_size=500):
+    """Re-encode the stored documents of ``media_ids`` and stamp their ``updated_at``.
+
+    Runs inside the caller's transaction.
+    """
+    media_ids = list(media_ids)
+    now = datetime.utcnow()
+    for start in range(0, len(media_ids), chunk_size):
+        chunk = media_ids[start:start + chunk_size]
+        rows = [{
+            'media_id': document['id'],
+            'type': document['type'],
+            'body': dumps(document).decode('utf-8'),
+            'summary': dumps(compact_document(document)).decode('utf-8') if document['type'] == 'tv' else None,
+            'updated_at': now,
+        } for document in load_catalog(chunk)]
+        MediaDocument.query.filter(MediaDocument.media_id.in_(chunk)).delete(synchronize_session=False)
+        MediaTable.query.filter(MediaTable.id.in_(chunk)).update(
+            {MediaTable.updated_at: now}, synchronize_session=False
+        )
+        if rows:
+            db.session.execute(MediaDocument.__table__.insert(), rows)
+
+
+def load_document_bodies(media_ids=None, compact=False):
+    """Encoded documents (bytes) of ``media_ids`` (or every title), ordered like ``media_ids``.
+
+    Two queries. Titles that have no stored document yet (written before
+    media_document existed, or outside the app) are built on the fly. With
+    ``compact`` TV documents carry season summaries instead of episodes.
+    """
+    media_ids = query_media_ids() if media_ids is None else list(media_ids)
+    if not media_ids:
+        return []
+    columns = [MediaDocument.media_id, MediaDocument.body]
+    if compact:
+        columns += [MediaDocument.type, MediaDocument.summary]
+    bodies = {}
+    for row in db.session.query(*columns).filter(MediaDocument.media_id.in_(media_ids)):
+        if compact and row.type == 'tv':
+            # Rows stored before summaries existed are compacted here until they are rebuilt
+            bodies[row.media_id] = row.summary.encode('utf-8') if row.summary is not None \
+                else dumps(compact_document(loads(row.body)))
+        else:
+            bodies[row.media_id] = row.body.encode('utf-8')
+    missing = [media_id for media_id in media_ids if media_id not in bodies]
+    if missing:
+        for document in load_catalog(missing):
+            bodies[document['id']] = dumps(compact_document(document) if compact else document)
+    return [bodies[media_id] for media_id in media_ids if media_id in bodies]
+
+
+def load_seasons(tv_id):
+    """Seasons of series ``tv_id`` in order, or ``None`` if there is no such series."""
+    seasons = Season.query.filter(Season.tv_series_id == tv_id).order_by(Season.season_number).all()
+    if not seasons and db.session.query(TVSeries.id).filter(TVSeries.id == tv_id).first() is None:
+        return None
+    return seasons
+
+
+def load_season_episodes(tv_id, season_number, after_number=None, limit=None):
+    """``(season, episodes)`` of one season, paginated by episode number; ``(None, [])`` if it does not exist."""
+    season = Season.query.filter(Season.tv_series_id == tv_id, Season.season_number == season_number).first()
+    if season is None:
+        return None, []
+    query = Episode.query.filter(Episode.season_id == season.id)
+    if after_number is not None:
+        query = query.filter(Episode.episode_number > after_number)
+    query = query.order_by(Episode.episode_number)
+    if limit is not None:
+        query = query.limit(limit)
+    return season, query.all()
+
+
+def iter_document_bodies(media_type=None, updated_since=None, batch_size=500):
+    """Yield encoded documents one title at a time, reading ``batch_size`` titles per round-trip.
+
+    Keyset pagination on the media id keeps memory flat however large the
+    catalog is, and no server-side cursor has to stay open between batches.
+    """
+    last_id = None
+    while True:
+        ids = query_media_ids(media_type=media_type, after_id=last_id, limit=batch_size, updated_since=updated_since)
+        if not ids:
+            return
+        yield from load_document_bodies(ids)
+        # Detached rows are not needed again; keep the identity map from growing across batches
+        db.session.expunge_all()
+        last_id = ids[-1]
+
+
+def rebuild_documents(batch_size=500):
+    """Re-encode every title's document, committing every ``batch_size`` titles. Returns the title count."""
+    total, last_id = 0, 0
+    while True:
+        ids = query_media_ids(after_id=last_id, limit=batch_size)
+        if not ids:
+            break
+        store_documents(ids)
+        db.session.commit()
+        total += len(ids)
+        last_id = ids[-1]
+    return total
+
+
+def get_catalog_version():
+    """Return ``(version, updated_at)`` of the catalog; ``(0, None)`` before the first write."""
+    row = db.session.query(CatalogVersion.version, CatalogVersion.updated_at) \
+        .filter(CatalogVersion.id == 1).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+
+def bump_catalog_version():
+    """Advance the catalog version inside the caller's transaction (commit is left to the caller)."""
+    now = datetime.utcnow()
+    updated = CatalogVersion.query.filter_by(id=1).update(
+        {CatalogVersion.version: CatalogVersion.version + 1, CatalogVersion.updated_at: now},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CatalogVersion(id=1, version=1, updated_at=now))
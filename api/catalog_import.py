@@ -0,0 +1,490 @@
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Cast, Movie, TVSeries, Season, Episode, MediaTable
+from catalog import MEDIA_TYPES, bump_catalog_version, store_documents
+from search import index_titles
+from changes import record_titles_added
+from stats import add_titles
+
+# Bulk catalog import.
+#
+# Metadata for a manifest of TMDB ids is fetched concurrently, then written in
+# batches: each batch is one transaction made of a handful of multi-row
+# INSERTs (media_table, movie, tv_series, cast, season, episode). Titles whose
+# (type, tmdb_id) already exist are skipped, so an interrupted import can
+# simply be run again without creating duplicates.
+
+logger = logging.getLogger(__name__)
+
+QUALITIES = ('720p', '1080p', '2160p')
+# Manifests at least this long check for titles already in the catalog against known_tmdb_ids()
+KNOWN_IDS_MIN_ITEMS = 2000
+MEDIA_FIELDS = ('title', 'description', 'thumbnail', 'release_date', 'language', 'rating')
+
+
+# Fields the admin forms must send, per type
+REQUIRED_FIELDS = {
+    'movie': ('title', 'description', 'thumbnail', 'release_date', 'language', 'cast', 'rating',
+              'video_links', 'download_links'),
+    'tv': ('title', 'description', 'thumbnail', 'release_date', 'language', 'cast', 'rating',
+           'total_seasons', 'seasons'),
+}
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class ValidationError(ValueError):
+    pass
+
+
+def link_values(video_links, download_links):
+    """Column values for the video/download links of a movie or episode payload.
+
+    Keys may be ``video_1080p``/``download_1080p`` or just ``1080p``; a
+    download is ``{"url": ..., "file_type": ...}`` or a bare URL.
+    """
+    values = {}
+    for quality in QUALITIES:
+        download = download_links.get(f'download_{quality}', download_links.get(quality)) or {}
+        if isinstance(download, str):
+            download = {'url': download}
+        values[f'video_{quality}'] = video_links.get(f'video_{quality}', video_links.get(quality))
+        values[f'download_{quality}'] = download.get('url')
+        values[f'download_{quality}_type'] = download.get('file_type')
+    return values
+
+
+def episode_values(season_id, data):
+    # Links are either flat on the episode or nested under video_links/download_links
+    values = link_values(data.get('video_links') or data, data.get('download_links') or data)
+    values.update({
+        'season_id': season_id,
+        'episode_number': data.get('episode_number'),
+        'episode_name': data.get('episode_name'),
+    })
+    return values
+
+
+def episode_columns_given(data):
+    """The episode columns ``data`` sets (as read by episode_values); a download sets its URL and file type."""
+    video_links = data.get('video_links') or data
+    download_links = data.get('download_links') or data
+    columns = {'episode_name'} if 'episode_name' in data else set()
+    for quality in QUALITIES:
+        if f'video_{quality}' in video_links or quality in video_links:
+            columns.add(f'video_{quality}')
+        if f'download_{quality}' in download_links or quality in download_links:
+            columns.update((f'download_{quality}', f'download_{quality}_type'))
+    return columns
+
+
+def season_list(seasons):
+    # add_tv_series takes {"season_1": {...}}; manifests may also use a plain list
+    if isinstance(seasons, dict):
+        return list(seasons.values())
+    return list(seasons or [])
+
+
+def _normalize_item(raw, default_type):
+    if isinstance(raw, (int, str)):
+        raw = {'tmdb_id': raw}
+    if not isinstance(raw, dict):
+        raise ManifestError(f"Unsupported manifest entry: {raw!r}")
+    item = dict(raw)
+    try:
+        item['tmdb_id'] = int(item['tmdb_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ManifestError(f"Manifest entry without a valid tmdb_id: {raw!r}")
+    item['type'] = item.get('type') or default_type
+    if item['type'] not in MEDIA_TYPES:
+        raise ManifestError(f"Manifest entry {item['tmdb_id']} needs a type of {' or '.join(MEDIA_TYPES)}")
+    return item
+
+
+def _csv_item(row):
+    # Flat CSV columns: tmdb_id,type[,video_720p,...,download_720p,download_720p_type,...]
+    item = {k: v for k, v in row.items() if k and v not in (None, '')}
+    video_links, download_links = {}, {}
+    for quality in QUALITIES:
+        if f'video_{quality}' in item:
+            video_links[f'video_{quality}'] = item.pop(f'video_{quality}')
+        url = item.pop(f'download_{quality}', None)
+        file_type = item.pop(f'download_{quality}_type', None)
+        if url:
+            download_links[f'download_{quality}'] = {'url': url, 'file_type': file_type}
+    if video_links:
+        item['video_links'] = video_links
+    if download_links:
+        item['download_links'] = download_links
+    return item
+
+
+def parse_manifest(text, fmt='json', default_type=None):
+    """Parse a JSON or CSV manifest into import items.
+
+    JSON may be a list of ids, a list of objects, or ``{"type": ..., "items": [...]}``;
+    CSV needs a header row with at least ``tmdb_id`` (and ``type`` unless a default is given).
+    """
+    if fmt == 'csv':
+        raw_items = [_csv_item(row) for row in csv.DictReader(io.StringIO(text))]
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ManifestError(f"Invalid JSON manifest: {e}")
+        if isinstance(data, dict):
+            default_type = data.get('type', default_type)
+            data = data.get('items', data.get('tmdb_ids', []))
+        if not isinstance(data, list):
+            raise ManifestError("JSON manifest must be a list or an object with an 'items' list")
+        raw_items = data
+    return [_normalize_item(raw, default_type) for raw in raw_items]
+
+
+def _integer(value, name, minimum=0):
+    # Form posts send numbers as strings; booleans are ints in Python but not here
+    if isinstance(value, bool):
+        raise ValidationError(f"{name} must be an integer")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{name} must be an integer")
+    if number < minimum:
+        raise ValidationError(f"{name} must be at least {minimum}")
+    return number
+
+
+def _text(value, name, column, required=False):
+    """``value`` if it is a string that fits ``column``; None is let through unless ``required``."""
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise ValidationError(f"{name} must be a {'non-empty ' if required else ''}string")
+    length = column.type.length
+    if length is not None and len(value) > length:
+        raise ValidationError(f"{name} must be at most {length} characters")
+    return value
+
+
+def validate_links(video_links, download_links, table, where=''):
+    """Check the link values link_values reads against the columns of ``table`` (movie or episode)."""
+    for quality in QUALITIES:
+        _text(video_links.get(f'video_{quality}', video_links.get(quality)), f'{where}video_{quality}',
+              table.c[f'video_{quality}'])
+        download = download_links.get(f'download_{quality}', download_links.get(quality)) or {}
+        name = f'{where}download_{quality}'
+        if isinstance(download, str):
+            _text(download, name, table.c[f'download_{quality}'])
+        elif isinstance(download, dict):
+            _text(download.get('url'), f'{name}.url', table.c[f'download_{quality}'])
+            _text(download.get('file_type'), f'{name}.file_type', table.c[f'download_{quality}_type'])
+        else:
+            raise ValidationError(f"{name} must be a URL or an object with url and file_type")
+
+
+def validate_cast(cast):
+    if not isinstance(cast, list) or not all(isinstance(member, dict) for member in cast):
+        raise ValidationError('cast must be a list of objects')
+    columns = Cast.__table__.c
+    for position, member in enumerate(cast, 1):
+        _text(member.get('name'), f'cast[{position}].name', columns.name, required=True)
+        _text(member.get('character'), f'cast[{position}].character', columns.character)
+        _text(member.get('image'), f'cast[{position}].image', columns.image)
+    return cast
+
+
+def validate_episodes(season_number, episodes):
+    """Check a season's episode list and return it with integer episode numbers."""
+    if not isinstance(episodes, list):
+        raise ValidationError(f"Episodes of season {season_number} must be a list")
+    validated, seen = [], set()
+    for episode in episodes:
+        if not isinstance(episode, dict):
+            raise ValidationError(f"Episodes of season {season_number} must be objects")
+        number = _integer(episode.get('episode_number'), 'episode_number', 1)
+        if number in seen:
+            raise ValidationError(f"Duplicate episode S{season_number}E{number}")
+        seen.add(number)
+        where = f"S{season_number}E{number} "
+        _text(episode.get('episode_name'), f'{where}episode_name', Episode.__table__.c.episode_name)
+        # Links are either flat on the episode or nested, as episode_values reads them
+        video_links, download_links = episode.get('video_links') or episode, episode.get('download_links') or episode
+        if not isinstance(video_links, dict) or not isinstance(download_links, dict):
+            raise ValidationError(f'{where}video_links and download_links must be objects')
+        validate_links(video_links, download_links, Episode.__table__, where)
+        validated.append(dict(episode, episode_number=number))
+    return validated
+
+
+def validate_seasons(seasons):
+    """Check a seasons object or list and return it as a list with integer season/episode numbers."""
+    if not isinstance(seasons, (dict, list)):
+        raise ValidationError('seasons must be an object or a list')
+    validated, seen = [], set()
+    for season in season_list(seasons):
+        if not isinstance(season, dict):
+            raise ValidationError('seasons must contain objects')
+        number = _integer(season.get('season_number'), 'season_number')
+        if number in seen:
+            raise ValidationError(f'Duplicate season {number}')
+        seen.add(number)
+        total_episodes = season.get('total_episodes')
+        if total_episodes is not None:
+            total_episodes = _integer(total_episodes, 'total_episodes')
+        validated.append(dict(season, season_number=number, total_episodes=total_episodes,
+                              episodes=validate_episodes(number, season.get('episodes') or [])))
+    return validated
+
+
+def validate_episode_batch(data):
+    """Check a batch episode upload: a single season object or ``{"seasons": ...}``."""
+    if not isinstance(data, dict):
+        raise ValidationError('No data provided')
+    seasons = validate_seasons(data['seasons'] if 'seasons' in data else [data])
+    if not any(season['episodes'] for season in seasons):
+        raise ValidationError('No episodes provided')
+    return seasons
+
+
+def validate_episode(data):
+    """Check an add_episode payload and return it with integer season/episode numbers."""
+    if not isinstance(data, dict):
+        raise ValidationError('No data provided')
+    season_number = _integer(data.get('season_number'), 'season_number')
+    return dict(validate_episodes(season_number, [data])[0], season_number=season_number)
+
+
+def validate_title(data, media_type):
+    """Check an add_movie/add_tv_series payload and return it as a write_batch record.
+
+    Raises ValidationError with a message meant for the admin UI.
+    """
+    if not isinstance(data, dict) or 'tmdb_id' not in data:
+        raise ValidationError('No data or TMDB ID provided')
+    for field in REQUIRED_FIELDS[media_type]:
+        if field not in data:
+            raise ValidationError(f'Missing required field: {field}')
+
+    record = {field: data.get(field) for field in MEDIA_FIELDS}
+    record.update({'type': media_type, 'tmdb_id': _integer(data['tmdb_id'], 'tmdb_id', 1)})
+    table = (Movie if media_type == 'movie' else TVSeries).__table__
+    for field in MEDIA_FIELDS:
+        if field != 'rating':
+            _text(record[field], field, table.c[field], required=field == 'title')
+    try:
+        record['rating'] = float(record['rating'] or 0)
+    except (TypeError, ValueError):
+        raise ValidationError('rating must be a number')
+    record['cast'] = validate_cast(data.get('cast') or [])
+
+    if media_type == 'movie':
+        for field in ('video_links', 'download_links'):
+            links = data.get(field) or {}
+            if not isinstance(links, dict):
+                raise ValidationError(f'{field} must be an object')
+            record[field] = links
+        validate_links(record['video_links'], record['download_links'], table)
+        return record
+
+    seasons = validate_seasons(data['seasons'])
+    record['seasons'] = seasons
+    record['total_seasons'] = _integer(data['total_seasons'] or 0, 'total_seasons')
+    return record
+
+
+def existing_titles(keys, chunk_size=500):
+    """Map (type, tmdb_id) -> media id for the keys already in the catalog."""
+    found = {}
+    keys = list(keys)
+    for model, kind in ((Movie, 'movie'), (TVSeries, 'tv')):
+        ids = [tmdb_id for key_type, tmdb_id in keys if key_type == kind]
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            # Filtering on type as well lets the lookup use the unique (type, tmdb_id) index
+            for row in db.session.query(model.id, model.tmdb_id) \
+                    .filter(model.type == kind, model.tmdb_id.in_(chunk)):
+                found.setdefault((kind, row.tmdb_id), row.id)
+    return found
+
+
+def known_tmdb_ids():
+    """Every TMDB id in the catalog as ``{type: set}``, read off the (type, tmdb_id) indexes.
+
+    Large imports test membership here instead of looking their ids up in
+    chunks, and only resolve the media ids of the ones already present.
+    """
+    known = {}
+    for model, kind in ((Movie, 'movie'), (TVSeries, 'tv')):
+        known[kind] = {row.tmdb_id for row in db.session.query(model.tmdb_id)
+                       .filter(model.type == kind).yield_per(10000)}
+    return known
+
+
+def _merge_metadata(item, details):
+    # Values given in the manifest win over what TMDB returned
+    record = dict(details or {})
+    record.update({k: v for k, v in item.items() if v is not None})
+    if not record.get('title'):
+        raise ValueError('No title in manifest and TMDB returned no details')
+    return record
+
+
+def write_batch(records):
+    """Insert ``records`` in one transaction using multi-row INSERTs. Returns the new media ids in order."""
+    # media_table rows only carry their type, so ids are allocated per type and handed out in
+    # any order; that avoids sort_by_parameter_order, which SQLite executes row by row
+    allocated = {}
+    for kind in MEDIA_TYPES:
+        count = sum(1 for record in records if record['type'] == kind)
+        if count:
+            allocated[kind] = iter(db.session.execute(
+                insert(MediaTable.__table__).returning(MediaTable.__table__.c.id),
+                [{'type': kind}] * count
+            ).scalars().all())
+    media_ids = [next(allocated[record['type']]) for record in records]
+
+    movie_rows, tv_rows, cast_rows, season_rows, tv_seasons = [], [], [], [], {}
+    for media_id, record in zip(media_ids, records):
+        values = {field: record.get(field) for field in MEDIA_FIELDS}
+        values.update({'id': media_id, 'tmdb_id': record['tmdb_id'], 'type': record['type']})
+        if record['type'] == 'movie':
+            values.update(link_values(record.get('video_links') or {}, record.get('download_links') or {}))
+            movie_rows.append(values)
+        else:
+            seasons = season_list(record.get('seasons'))
+            values['total_seasons'] = record.get('total_seasons') or len(seasons)
+            tv_rows.append(values)
+            for season in seasons:
+                season_rows.append({
+                    'tv_series_id': media_id,
+                    'season_number': season.get('season_number'),
+                    'total_episodes': season.get('total_episodes') or len(season.get('episodes') or []),
+                })
+                tv_seasons[(media_id, season.get('season_number'))] = season.get('episodes') or []
+        for member in record.get('cast') or []:
+            cast_rows.append({
+                'media_id': media_id,
+                'name': member.get('name'),
+                'character': member.get('character'),
+                'image': member.get('image'),
+            })
+
+    if movie_rows:
+        db.session.execute(insert(Movie.__table__), movie_rows)
+    if tv_rows:
+        db.session.execute(insert(TVSeries.__table__), tv_rows)
+    if cast_rows:
+        db.session.execute(insert(Cast.__table__), cast_rows)
+    if season_rows:
+        table = Season.__table__
+        returned = db.session.execute(
+            insert(table).returning(table.c.id, table.c.tv_series_id, table.c.season_number),
+            season_rows
+        ).all()
+        episode_rows = []
+        for season_id, tv_series_id, season_number in returned:
+            for episode in tv_seasons[(tv_series_id, season_number)]:
+                episode_rows.append(episode_values(season_id, episode))
+        if episode_rows:
+            db.session.execute(insert(Episode.__table__), episode_rows)
+    index_titles(media_ids)
+    store_documents(media_ids)
+    record_titles_added(media_ids)
+    add_titles(media_ids)
+    bump_catalog_version()
+    return media_ids
+
+
+def run_import(items, fetch_details, batch_size=100, max_workers=8, progress=None):
+    """Import ``items`` and return one result dict per distinct (type, tmdb_id).
+
+    ``fetch_details(type, tmdb_id)`` returns normalized metadata (or ``None``);
+    it is called from up to ``max_workers`` threads. Each batch is committed on
+    its own; if a batch fails its items are retried one by one so a single bad
+    record only fails itself. ``progress(result)`` is called as items finish.
+    """
+    unique = {}
+    for item in items:
+        unique.setdefault((item['type'], item['tmdb_id']), item)
+
+    results = {}
+
+    def report(key, status, media_id=None, error=None):
+        result = {'type': key[0], 'tmdb_id': key[1], 'status': status, 'id': media_id}
+        if error:
+            result['error'] = error
+        results[key] = result
+        if progress:
+            progress(result)
+
+    if len(unique) >= KNOWN_IDS_MIN_ITEMS:
+        known = known_tmdb_ids()
+        existing = existing_titles([key for key in unique if key[1] in known[key[0]]])
+    else:
+        existing = existing_titles(unique)
+    for key, media_id in existing.items():
+        report(key, 'skipped', media_id, 'already in catalog')
+    pending = [key for key in unique if key not in existing]
+
+    def fetch(key):
+        item = unique[key]
+        # Manifests that already carry full metadata do not need TMDB
+        details = None if item.get('title') else fetch_details(*key)
+        return _merge_metadata(item, details)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for start in range(0, len(pending), batch_size):
+            keys = pending[start:start + batch_size]
+            futures = {key: pool.submit(fetch, key) for key in keys}
+            records = []
+            for key in keys:
+                try:
+                    records.append(futures[key].result())
+                except Exception as e:
+                    report(key, 'failed', error=str(e))
+            if not records:
+                continue
+            try:
+                media_ids = write_batch(records)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Import batch failed, retrying items individually", exc_info=e)
+                for record in records:
+                    key = (record['type'], record['tmdb_id'])
+                    try:
+                        media_id, = write_batch([record])
+                        db.session.commit()
+                        report(key, 'imported', media_id)
+                    except IntegrityError as item_error:
+                        db.session.rollback()
+                        # Added by someone else since the existing_titles check
+                        duplicate = existing_titles([key]).get(key)
+                        if duplicate is not None:
+                            report(key, 'skipped', duplicate, 'already in catalog')
+                        else:
+                            report(key, 'failed', error=str(item_error))
+                    except Exception as item_error:
+                        db.session.rollback()
+                        report(key, 'failed', error=str(item_error))
+                continue
+            for media_id, record in zip(media_ids, records):
+                report((record['type'], record['tmdb_id']), 'imported', media_id)
+
+    return [results[key] for key in unique]
+
+
+def summarize(results):
+    summary = {'imported': 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, literal, select
+
+from models import db, CatalogChange, MediaDocument
+from serializers import dumps, encode_envelope
+
+# Change feed for clients that keep a local copy of the catalog.
+#
+# Every admin write appends entries to catalog_changes in the same transaction
+# as the write itself, so a committed change is always visible in the feed and
+# a rolled back one never is. Clients remember the last sequence they applied
+# and ask /changes?after=<sequence> for the rest. Each entry carries only what
+# changed: the full document for a new title, the season or episode otherwise.
+#
+# Entries past the retention window are compacted away; a client whose
+# sequence is older than the oldest retained entry has to re-sync from /media.
+
+CHANGE_KINDS = ('movie_added', 'tv_added', 'movie_updated', 'tv_updated', 'movie_removed', 'tv_removed',
+                'season_added', 'season_updated', 'episode_added', 'episode_updated')
+
+
+def record_change(kind, media_id, payload, season_number=None, episode_number=None):
+    """Append one entry inside the caller's transaction. ``payload`` is a JSON-serializable dict."""
+    db.session.add(CatalogChange(
+        kind=kind,
+        media_id=media_id,
+        season_number=season_number,
+        episode_number=episode_number,
+        payload=dumps(payload).decode('utf-8'),
+        created_at=datetime.utcnow()
+    ))
+
+
+def _record_titles(media_ids, suffix, chunk_size):
+    media_ids = list(media_ids)
+    now = datetime.utcnow()
+    for start in range(0, len(media_ids), chunk_size):
+        chunk = media_ids[start:start + chunk_size]
+        db.session.execute(insert(CatalogChange).from_select(
+            ['kind', 'media_id', 'payload', 'created_at'],
+            select(
+                MediaDocument.type + suffix, MediaDocument.media_id, MediaDocument.body, literal(now)
+            ).where(MediaDocument.media_id.in_(chunk)).order_by(MediaDocument.media_id)
+        ))
+
+
+def record_titles_added(media_ids, chunk_size=500):
+    """Append a ``<type>_added`` entry per title, copying its stored document.
+
+    Runs after store_documents in the same transaction; the documents are
+    copied with INSERT ... SELECT, so they are not read back into Python.
+    """
+    _record_titles(media_ids, '_added', chunk_size)
+
+
+def record_titles_updated(media_ids, chunk_size=500):
+    """Append a ``<type>_updated`` entry per title with its full document, like record_titles_added."""
+    _record_titles(media_ids, '_updated', chunk_size)
+
+
+def change_bounds():
+    """Return ``(oldest_sequence, latest_sequence)`` of the retained entries, ``(None, None)`` if there are none."""
+    return db.session.query(func.min(CatalogChange.sequence), func.max(CatalogChange.sequence)).one()
+
+
+def load_changes(after, limit):
+    """Entries with a sequence above ``after``, oldest first, encoded as JSON bytes."""
+    rows = db.session.query(CatalogChange).filter(CatalogChange.sequence > after) \
+        .order_by(CatalogChange.sequence).limit(limit).all()
+    return [(row.sequence, encode_envelope({
+        'sequence': row.sequence,
+        'kind': row.kind,
+        'media_id': row.media_id,
+        'season_number': row.season_number,
+        'episode_number': row.episode_number,
+        'created_at': row.created_at.isoformat() + 'Z'
+    }, data=row.payload.encode('utf-8'))) for row in rows]
+
+
+def compact_changes(retention_days):
+    """Delete entries older than ``retention_days``. Returns the number of entries removed.
+
+    The newest entry is always kept, so the retained range never becomes
+    empty and clients can still tell whether their sequence is too old.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    latest = db.session.query(func.max(CatalogChange.sequence)).scalar()
+    if latest is None:
+        return 0
+    removed = CatalogChange.query.filter(
+        CatalogChange.created_at < cutoff, CatalogChange.sequence < latest
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
@@ -0,0 +1,93 @@
+import gzip
+
+from flask import request
+
+from instrumentation import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Negotiated response compression.
+#
+# Responses at least min_size bytes long are compressed with the best encoding
+# the client accepts: brotli when the brotli package is installed, gzip
+# otherwise. Cached responses (response_cache.py) keep one compressed copy per
+# encoding, so a cache hit costs no compression; everything else is
+# compressed by an after_request hook. Streamed responses are left alone.
+# Every encoding of a body is a separate representation, so each gets its own
+# strong ETag: the identity one with the encoding appended.
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml',
+])
+
+
+def available_encodings():
+    """Supported encodings in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def encoded_etag(etag, encoding):
+    """ETag of the ``encoding`` representation of a body whose identity ETag is ``etag``."""
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = available_encodings()
+
+    def compress(self, body, encoding, level=None):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality if level is None else level)
+        # mtime=0 keeps the output (and anything hashed from it) the same for the same body
+        return gzip.compress(body, compresslevel=self.gzip_level if level is None else level, mtime=0)
+
+    def variants(self, body):
+        """``{encoding: compressed body}`` for every supported encoding; empty below ``min_size``."""
+        if len(body) < self.min_size:
+            return {}
+        with timed('compress'):
+            return {encoding: self.compress(body, encoding) for encoding in self.encodings}
+
+    def negotiate(self, offered=None):
+        """The encoding to answer the current request with, among ``offered`` (default: all supported)."""
+        return request.accept_encodings.best_match(offered if offered is not None else self.encodings)
+
+    def should_compress(self, response):
+        return (response.status_code == 200
+                and not response.is_streamed
+                and 'Content-Encoding' not in response.headers
+                and is_compressible(response.mimetype)
+                and (response.content_length or 0) >= self.min_size)
+
+
+def init_compression(app, compressor):
+    """Compress eligible responses of ``app``.
+
+    Register after init_instrumentation: after_request hooks run in reverse
+    order, so this one still sees the request's timings.
+    """
+    @app.after_request
+    def compress_response(response):
+        if not compressor.should_compress(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = compressor.negotiate()
+        if encoding is None:
+            return response
+        with timed('compress'):
+            response.set_data(compressor.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
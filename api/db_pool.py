@@ -0,0 +1,152 @@
+import threading
+import time
+
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Connection pool configuration and metrics.
+#
+# Two modes:
+#   null  - no pooling in the app; every checkout opens a connection. Meant for
+#           serverless instances sitting behind an external pooler (PgBouncer /
+#           the Neon pooler endpoint), where per-instance pools just hoard
+#           server connections.
+#   queue - a sized QueuePool for long-running WSGI workers.
+# Both pool classes record checkouts, wait time and overflow so they can be
+# inspected on the internal pool endpoint.
+
+POOL_MODES = ('null', 'queue')
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, waited):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'timeouts': self.timeouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'wait_ms_total': round(self.wait_seconds_total * 1000, 3),
+                'wait_ms_avg': round(self.wait_seconds_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+class MetricsPoolMixin:
+    """Times ``_do_get`` (waiting for a free slot, or connecting when the pool has none)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self.metrics.record_checkin()
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def stats(self):
+        stats = {'mode': self.mode}
+        stats.update(self.metrics.snapshot())
+        return stats
+
+
+class MetricsNullPool(MetricsPoolMixin, NullPool):
+    mode = 'null'
+
+
+class MetricsQueuePool(MetricsPoolMixin, QueuePool):
+    mode = 'queue'
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            'size': self.size(),
+            'idle': self.checkedin(),
+            'overflow': max(self.overflow(), 0),
+            'max_overflow': self._max_overflow,
+        })
+        return stats
+
+
+def _flag(value, default):
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_uri, environ):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_POOL_* / DB_STATEMENT_TIMEOUT_MS settings.
+
+    The mode defaults to ``null`` on Vercel and ``queue`` elsewhere.
+    """
+    mode = environ.get('DB_POOL_MODE') or ('null' if environ.get('VERCEL') else 'queue')
+    if mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, got {mode!r}")
+
+    # Pre-ping costs a round-trip per checkout, so it is opt-in; pool_recycle covers idle disconnects
+    options = {'pool_pre_ping': _flag(environ.get('DB_POOL_PRE_PING'), False)}
+    if mode == 'null':
+        options['poolclass'] = MetricsNullPool
+    else:
+        options.update({
+            'poolclass': MetricsQueuePool,
+            'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 300)),
+        })
+
+    statement_timeout = environ.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout and database_uri.startswith('postgresql'):
+        # Sent as a startup parameter, so it applies to every statement on the connection
+        options['connect_args'] = {'options': f"-c statement_timeout={int(statement_timeout)}"}
+    return options
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if hasattr(pool, 'stats'):
+        return pool.stats()
+    return {'mode': type(pool).__name__, 'status': pool.status()}
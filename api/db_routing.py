@@ -0,0 +1,143 @@
+import itertools
+import logging
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+# Read-replica routing.
+#
+# Replicas listed in DATABASE_READ_URL become extra Flask-SQLAlchemy binds
+# (replica_1, replica_2, ...). Views marked with @read_replica run their
+# queries on a healthy replica; everything else, and any statement that writes,
+# stays on the primary. A replica is healthy when it answers and its
+# catalog_version has caught up with the primary, or has been behind for less
+# than the allowed lag. After an admin write the client gets a short-lived
+# cookie that keeps its reads on the primary so it sees its own changes.
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+def replica_binds(read_urls):
+    """``{'replica_1': url, ...}`` from a comma-separated DATABASE_READ_URL."""
+    urls = [url.strip() for url in (read_urls or '').split(',') if url.strip()]
+    # Same psycopg2 compatibility fix as DATABASE_URL
+    urls = [url.replace('postgres://', 'postgresql://', 1) if url.startswith('postgres://') else url for url in urls]
+    return {f'{REPLICA_BIND_PREFIX}{number}': url for number, url in enumerate(urls, 1)}
+
+
+def read_replica(view):
+    """Mark a view whose queries may run on a read replica."""
+    view.read_replica = True
+    return view
+
+
+class RoutingSession(Session):
+    """Session that sends reads to ``g.db_read_bind`` when a request picked a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        key = g.get('db_read_bind') if bind is None and has_app_context() else None
+        # Flushes and DML always go to the primary, even inside a replica-routed request
+        if key is not None and not self._flushing and not getattr(clause, 'is_dml', False):
+            return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    # Read by the after_request hook that pins the client to the primary
+    if has_request_context():
+        g.db_wrote = True
+
+
+class _ReplicaState:
+    def __init__(self):
+        self.healthy = False
+        self.checked_at = 0.0
+        self.waiting_for = None
+        self.behind_since = None
+        self.error = None
+
+
+class ReplicaRouter:
+    """Picks a healthy replica per request, re-checking each one at most every ``check_interval`` seconds."""
+
+    def __init__(self, db, replica_keys, check_interval=5.0, max_lag=10.0):
+        self.db = db
+        self.replica_keys = list(replica_keys)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._states = {key: _ReplicaState() for key in self.replica_keys}
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+        self._listening = set()
+
+    @property
+    def enabled(self):
+        return bool(self.replica_keys)
+
+    def _catalog_version(self, engine):
+        with engine.connect() as conn:
+            return conn.execute(text('SELECT version FROM catalog_version WHERE id = 1')).scalar() or 0
+
+    def _watch_disconnects(self, key, engine):
+        # A dropped connection takes the replica out of rotation until its next check
+        def handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(key, context.original_exception)
+
+        event.listen(engine, 'handle_error', handle_error)
+        self._listening.add(key)
+
+    def _check(self, key):
+        state = self._states[key]
+        engine = self.db.engines[key]
+        if key not in self._listening:
+            self._watch_disconnects(key, engine)
+        now = time.time()
+        try:
+            replica_version = self._catalog_version(engine)
+            primary_version = self._catalog_version(self.db.engines[None])
+        except Exception as e:
+            state.healthy, state.error, state.checked_at = False, str(e), now
+            logger.warning("Read replica unavailable, reading from primary", extra={'bind': key, 'error': str(e)})
+            return
+        # Lag is measured as how long the replica has been missing a version the primary had
+        if state.waiting_for is not None and replica_version >= state.waiting_for:
+            state.waiting_for = state.behind_since = None
+        if replica_version < primary_version and state.waiting_for is None:
+            state.waiting_for, state.behind_since = primary_version, now
+        lag = now - state.behind_since if state.behind_since is not None else 0.0
+        state.healthy = lag < self.max_lag
+        state.error = None if state.healthy else f"behind the primary for {lag:.0f}s"
+        state.checked_at = now
+
+    def mark_down(self, key, error):
+        state = self._states[key]
+        state.healthy, state.error, state.checked_at = False, str(error), time.time()
+
+    def choose(self):
+        """Bind key of a healthy replica, or ``None`` to use the primary."""
+        now = time.time()
+        for key, state in self._states.items():
+            if now - state.checked_at >= self.check_interval:
+                with self._lock:
+                    if now - state.checked_at >= self.check_interval:
+                        self._check(key)
+        healthy = [key for key in self.replica_keys if self._states[key].healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def status(self):
+        return {key: {
+            'healthy': state.healthy,
+            'checked_at': state.checked_at or None,
+            'lag_seconds': round(time.time() - state.behind_since, 1) if state.behind_since is not None else 0.0,
+            'error': state.error,
+        } for key, state in self._states.items()}
@@ -0,0 +1,206 @@
+from sqlalchemy import and_, delete, exists, func, select, union_all, update
+
+from models import db, Cast, Movie, TVSeries, Season, Episode, MediaTable, MediaSearch, MediaDocument, Job, LinkCheck
+from catalog import bump_catalog_version, store_documents
+from catalog_import import QUALITIES
+from changes import record_change, record_titles_updated
+from migrations import applied_versions
+from search import index_titles
+from stats import adjust_stats, counter_delta, title_counters
+
+# Duplicate titles.
+#
+# Databases that predate the unique (type, tmdb_id) indexes can hold the same
+# TMDB title more than once, and migration 5 refuses to create the indexes
+# until they are merged. For each duplicated (type, tmdb_id) the oldest row
+# (lowest id, the one clients most likely know) is kept: it takes over the
+# cast members, seasons and episodes it lacks, fills its empty columns from
+# the duplicates, and the duplicate rows are deleted. Every step is one UPDATE
+# or DELETE over all duplicate groups at once. A title duplicated more than
+# once is merged over several rounds, one duplicate per title per round, so a
+# round never moves two seasons with the same number onto the same title.
+#
+# The merge has to work on a schema stuck at migration 4, so the derived
+# tables (documents, change feed, jobs, stats, link checks) are only
+# maintained when the migration that created them has been applied.
+
+TITLE_MODELS = ((Movie, 'movie'), (TVSeries, 'tv'))
+FILLED_COLUMNS = ('description', 'thumbnail', 'release_date', 'language', 'rating')
+MOVIE_LINK_COLUMNS = [column for quality in QUALITIES
+                      for column in (f'video_{quality}', f'download_{quality}', f'download_{quality}_type')]
+MAX_ROUNDS = 100
+
+
+def _duplicated_keys(model):
+    return select(model.type, model.tmdb_id, func.min(model.id).label('keep_id')) \
+        .group_by(model.type, model.tmdb_id).having(func.count(model.id) > 1).subquery()
+
+
+def duplicate_map():
+    """Subquery of ``(duplicate_id, keep_id)`` pairs, one per title row that has an older twin."""
+    parts = []
+    for model, _ in TITLE_MODELS:
+        keys = _duplicated_keys(model)
+        parts.append(select(model.id.label('duplicate_id'), keys.c.keep_id)
+                     .join(keys, and_(model.type == keys.c.type, model.tmdb_id == keys.c.tmdb_id))
+                     .where(model.id != keys.c.keep_id))
+    return union_all(*parts).subquery('duplicate_map')
+
+
+def find_duplicates():
+    """Every duplicated title as ``{type, tmdb_id, keep_id, duplicate_ids, titles}``, by type and TMDB id."""
+    report = []
+    for model, kind in TITLE_MODELS:
+        keys = _duplicated_keys(model)
+        groups = {}
+        for row in db.session.query(model.id, model.tmdb_id, model.title, model.created_at, keys.c.keep_id) \
+                .join(keys, and_(model.type == keys.c.type, model.tmdb_id == keys.c.tmdb_id)) \
+                .order_by(model.tmdb_id, model.id):
+            group = groups.setdefault(row.tmdb_id, {
+                'type': kind, 'tmdb_id': row.tmdb_id, 'keep_id': row.keep_id, 'duplicate_ids': [], 'titles': []
+            })
+            if row.id != row.keep_id:
+                group['duplicate_ids'].append(row.id)
+            group['titles'].append({
+                'id': row.id, 'title': row.title,
+                'created_at': row.created_at.isoformat() + 'Z' if row.created_at else None
+            })
+        report.extend(groups.values())
+    return report
+
+
+def _merge_round(pairs):
+    """Merge one duplicate into each kept title. ``pairs`` selects ``(duplicate_id, keep_id)``."""
+    session = db.session
+
+    def keep_of(column):
+        # Explicitly correlated: nested in an EXISTS it would otherwise select from its own copy of the table
+        return select(pairs.c.keep_id).where(pairs.c.duplicate_id == column).correlate(column.table).scalar_subquery()
+
+    duplicate_ids = select(pairs.c.duplicate_id)
+    keep_ids = select(pairs.c.keep_id)
+
+    # Empty columns of the kept title are filled from its duplicate
+    for model, kind in TITLE_MODELS:
+        table = model.__table__
+        source = table.alias('source')
+        columns = FILLED_COLUMNS + (tuple(MOVIE_LINK_COLUMNS) if kind == 'movie' else ('total_seasons',))
+        values = {}
+        for column in columns:
+            value = select(source.c[column]).join(pairs, pairs.c.duplicate_id == source.c.id) \
+                .where(pairs.c.keep_id == table.c.id).scalar_subquery()
+            values[column] = func.coalesce(table.c[column], value)
+        session.execute(update(table).where(table.c.id.in_(keep_ids)).values(values))
+
+    # Cast members the kept title lacks move over; the rest go with the duplicate
+    cast, kept_cast = Cast.__table__, Cast.__table__.alias('kept_cast')
+    session.execute(update(cast).where(
+        cast.c.media_id.in_(duplicate_ids),
+        ~exists().where(kept_cast.c.media_id == keep_of(cast.c.media_id), kept_cast.c.name == cast.c.name,
+                        func.coalesce(kept_cast.c.character, '') == func.coalesce(cast.c.character, ''))
+    ).values(media_id=keep_of(cast.c.media_id)))
+    session.execute(delete(cast).where(cast.c.media_id.in_(duplicate_ids)))
+
+    # Episodes of a season both titles have move to the kept title's season, unless it has that episode
+    season, episode = Season.__table__, Episode.__table__
+    kept_season, kept_episode = season.alias('kept_season'), episode.alias('kept_episode')
+    shared_season = season.alias('shared_season')
+    target = select(kept_season.c.id) \
+        .join(shared_season, shared_season.c.season_number == kept_season.c.season_number) \
+        .join(pairs, and_(pairs.c.duplicate_id == shared_season.c.tv_series_id,
+                          pairs.c.keep_id == kept_season.c.tv_series_id)) \
+        .where(shared_season.c.id == episode.c.season_id).correlate(episode).scalar_subquery()
+    session.execute(update(episode).where(
+        target.is_not(None),
+        ~exists().where(kept_episode.c.season_id == target, kept_episode.c.episode_number == episode.c.episode_number)
+    ).values(season_id=target))
+    announced = select(shared_season.c.total_episodes) \
+        .join(pairs, pairs.c.duplicate_id == shared_season.c.tv_series_id) \
+        .where(pairs.c.keep_id == season.c.tv_series_id, shared_season.c.season_number == season.c.season_number) \
+        .correlate(season).scalar_subquery()
+    session.execute(update(season).where(season.c.tv_series_id.in_(keep_ids))
+                    .values(total_episodes=func.coalesce(season.c.total_episodes, announced)))
+    shared_seasons = select(shared_season.c.id) \
+        .join(pairs, pairs.c.duplicate_id == shared_season.c.tv_series_id) \
+        .join(kept_season, and_(kept_season.c.tv_series_id == pairs.c.keep_id,
+                                kept_season.c.season_number == shared_season.c.season_number))
+    session.execute(delete(episode).where(episode.c.season_id.in_(shared_seasons)))
+    session.execute(delete(season).where(season.c.id.in_(shared_seasons)))
+    # Seasons only the duplicate has move over whole
+    session.execute(update(season).where(season.c.tv_series_id.in_(duplicate_ids))
+                    .values(tv_series_id=keep_of(season.c.tv_series_id)))
+
+    removed = session.execute(select(pairs.c.duplicate_id, pairs.c.keep_id)).all()
+    ids = [duplicate_id for duplicate_id, _ in removed]
+    session.execute(delete(MediaSearch.__table__).where(MediaSearch.__table__.c.media_id.in_(ids)))
+    for model, _ in TITLE_MODELS:
+        session.execute(delete(model.__table__).where(model.__table__.c.id.in_(ids)))
+    return removed
+
+
+def _merge_link_checks(duplicate_ids):
+    """Hand the link results of episodes that moved to their new title; drop those of removed rows."""
+    link_check, episode, season = LinkCheck.__table__, Episode.__table__, Season.__table__
+    owner_title = select(season.c.tv_series_id).join(episode, episode.c.season_id == season.c.id) \
+        .where(episode.c.id == link_check.c.owner_id).correlate(link_check).scalar_subquery()
+    db.session.execute(update(link_check).where(
+        link_check.c.media_id.in_(duplicate_ids), link_check.c.owner_type == 'episode', owner_title.is_not(None)
+    ).values(media_id=owner_title))
+    # Duplicate movies and episodes that were dropped for the kept title's own
+    db.session.execute(delete(link_check).where(link_check.c.media_id.in_(duplicate_ids)))
+
+
+def merge_duplicates(dry_run=False):
+    """Merge every duplicated title into its oldest row in one transaction and commit.
+
+    Returns ``{'titles': <kept titles>, 'removed': <rows deleted>, 'merged': {duplicate_id: keep_id}}``.
+    With ``dry_run`` nothing is written and ``merged`` lists what would be.
+    """
+    pairs = duplicate_map()
+    planned = dict(db.session.execute(select(pairs.c.duplicate_id, pairs.c.keep_id)).all())
+    if dry_run or not planned:
+        return {'titles': len(set(planned.values())), 'removed': len(planned), 'merged': planned}
+
+    applied = applied_versions(db.session.connection())
+    types = dict(db.session.query(MediaTable.id, MediaTable.type).filter(MediaTable.id.in_(planned)).all())
+    keep_ids = sorted(set(planned.values()))
+    counters_before = title_counters(keep_ids + list(planned)) if 12 in applied else None
+
+    merged = {}
+    for _ in range(MAX_ROUNDS):
+        # The lowest remaining duplicate of each title; its row is gone after the round
+        pairs = duplicate_map()
+        round_pairs = select(func.min(pairs.c.duplicate_id).label('duplicate_id'), pairs.c.keep_id) \
+            .group_by(pairs.c.keep_id).subquery('round_pairs')
+        removed = _merge_round(round_pairs)
+        if not removed:
+            break
+        merged.update(removed)
+
+    duplicate_ids = list(merged)
+    if 11 in applied:
+        db.session.execute(delete(Job.__table__).where(Job.__table__.c.media_id.in_(duplicate_ids)))
+    if 13 in applied:
+        _merge_link_checks(duplicate_ids)
+    if 7 in applied:
+        # store_documents also stamps media_table.updated_at (migration 8); before that the kept
+        # titles lose their stale documents and are served through load_catalog
+        stale = duplicate_ids if 8 in applied else duplicate_ids + keep_ids
+        db.session.execute(delete(MediaDocument.__table__).where(MediaDocument.__table__.c.media_id.in_(stale)))
+    db.session.execute(delete(MediaTable.__table__).where(MediaTable.__table__.c.id.in_(duplicate_ids)))
+    if 3 in applied:
+        index_titles(keep_ids)
+    if 8 in applied:
+        store_documents(keep_ids)
+    if 9 in applied:
+        for duplicate_id, keep_id in sorted(merged.items()):
+            record_change(f"{types.get(duplicate_id, 'movie')}_removed", duplicate_id, {
+                'id': duplicate_id, 'merged_into': keep_id
+            })
+        if 8 in applied:
+            record_titles_updated(keep_ids)
+    if counters_before is not None:
+        adjust_stats(counter_delta(counters_before, title_counters(keep_ids)))
+    bump_catalog_version()
+    db.session.commit()
+    return {'titles': len(keep_ids), 'removed': len(merged), 'merged': merged}
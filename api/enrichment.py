@@ -0,0 +1,139 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_
+
+from models import db, Cast, Movie, TVSeries, MediaTable
+from catalog import bump_catalog_version, store_documents
+from search import index_titles
+from changes import record_titles_updated
+from stats import adjust_stats, counter_delta, title_counters
+from jobs import enqueue
+
+# TMDB enrichment jobs.
+#
+# An `enrich` job re-fetches one title from TMDB and brings the catalog in
+# line: rating, poster and cast follow TMDB, while title, description,
+# release date and language are only filled in when the admin left them
+# empty. Titles whose data changed get a new document, search row and a
+# `<type>_updated` change feed entry, all in the batch's transaction; every
+# processed title is stamped with enriched_at, which schedule_refresh uses to
+# queue the titles due for another pass.
+
+ENRICH_JOB = 'enrich'
+
+# TMDB is the source of truth for these...
+REFRESHED_FIELDS = ('rating', 'thumbnail')
+# ...while these are only filled when empty, so admin edits are kept
+FILLED_FIELDS = ('title', 'description', 'release_date', 'language')
+
+
+def _cast_key(members):
+    return [(member['name'], member['character'], member['image']) for member in members]
+
+
+def merge_details(title, details, cast):
+    """Copy TMDB ``details`` onto ``title`` (a Movie or TVSeries). Returns the names of the fields changed.
+
+    ``cast`` is the title's current cast as dicts; it is replaced only when
+    TMDB returned one and it differs.
+    """
+    changed = []
+    for field in REFRESHED_FIELDS:
+        value = details.get(field)
+        # TMDB reports 0 for titles without votes and no poster as ''; neither replaces a known value
+        if value and value != getattr(title, field):
+            setattr(title, field, value)
+            changed.append(field)
+    for field in FILLED_FIELDS:
+        value = details.get(field)
+        if value and not getattr(title, field):
+            setattr(title, field, value)
+            changed.append(field)
+    new_cast = details.get('cast') or []
+    if new_cast and _cast_key(new_cast) != _cast_key(cast):
+        Cast.query.filter(Cast.media_id == title.id).delete(synchronize_session=False)
+        db.session.execute(insert(Cast.__table__), [{
+            'media_id': title.id, 'name': member['name'], 'character': member['character'], 'image': member['image'],
+        } for member in new_cast])
+        changed.append('cast')
+    return changed
+
+
+class EnrichmentHandler:
+    """jobs.Worker handler for ``enrich`` jobs; ``tmdb`` is a TMDBClient."""
+
+    def __init__(self, tmdb):
+        self.tmdb = tmdb
+
+    def load(self, jobs):
+        media_ids = [job.media_id for job in jobs]
+        keys = {}
+        for model in (Movie, TVSeries):
+            for row in db.session.query(model.id, model.type, model.tmdb_id).filter(model.id.in_(media_ids)):
+                keys[row.id] = (row.type, row.tmdb_id)
+        # None for titles deleted since the job was queued
+        return {job.id: keys.get(job.media_id) for job in jobs}
+
+    def fetch(self, key):
+        if key is None:
+            return None
+        media_type, tmdb_id = key
+        # Bypass the metadata cache: the point of a refresh is TMDB's current data
+        lookup = self.tmdb.movie if media_type == 'movie' else self.tmdb.tv
+        return lookup(tmdb_id, fresh=True)
+
+    def apply(self, items):
+        now = datetime.utcnow()
+        media_ids = [job.media_id for job, key, _ in items if key is not None]
+        titles = {}
+        for model in (Movie, TVSeries):
+            titles.update((title.id, title) for title in model.query.filter(model.id.in_(media_ids)))
+        cast = defaultdict(list)
+        for member in Cast.query.filter(Cast.media_id.in_(media_ids)).order_by(Cast.id):
+            cast[member.media_id].append({'name': member.name, 'character': member.character, 'image': member.image})
+
+        # Rating, language, release date and cast all feed the /api/stats counters
+        counters_before = title_counters(list(titles))
+        results, changed_ids = {}, []
+        for job, key, details in items:
+            title = titles.get(job.media_id)
+            if title is None:
+                results[job.id] = {'status': 'missing'}
+            elif details is None:
+                results[job.id] = {'status': 'not_found'}
+            else:
+                changed = merge_details(title, details, cast[title.id])
+                results[job.id] = {'status': 'updated' if changed else 'unchanged', 'fields': changed}
+                if changed:
+                    changed_ids.append(title.id)
+
+        # Titles TMDB does not know are stamped too, so they wait for the next refresh like the rest
+        MediaTable.query.filter(MediaTable.id.in_(list(titles))).update(
+            {MediaTable.enriched_at: now}, synchronize_session=False
+        )
+        if changed_ids:
+            db.session.flush()
+            adjust_stats(counter_delta({media_id: counters_before[media_id] for media_id in changed_ids},
+                                       title_counters(changed_ids)))
+            index_titles(changed_ids)
+            store_documents(changed_ids)
+            record_titles_updated(changed_ids)
+            bump_catalog_version()
+        return results
+
+
+def schedule_refresh(max_age_days, limit=None):
+    """Queue an ``enrich`` job for titles never enriched or enriched more than ``max_age_days`` ago.
+
+    Least recently enriched first; commits and returns the number queued.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    query = db.session.query(MediaTable.id) \
+        .filter(or_(MediaTable.enriched_at.is_(None), MediaTable.enriched_at < cutoff)) \
+        .order_by(MediaTable.enriched_at.is_(None).desc(), MediaTable.enriched_at, MediaTable.id)
+    if limit is not None:
+        query = query.limit(limit)
+    queued = enqueue(ENRICH_JOB, [row.id for row in query])
+    db.session.commit()
+    return queued
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db, dialect_insert, Season, Episode, CatalogChange
+from catalog import bump_catalog_version, store_documents
+from catalog_import import QUALITIES, episode_columns_given, episode_values
+from serializers import dumps, serialize_episode
+from stats import adjust_stats
+
+# Batch episode upsert for the admin tools.
+#
+# A whole upload (one season or several) is written with INSERT ... ON
+# CONFLICT statements against the (tv_series_id, season_number) and
+# (season_id, episode_number) unique constraints: one for the seasons and one
+# for the episodes per set of fields they carry (usually just one). Re-sending
+# the same upload is harmless: episodes whose values did not change are
+# reported as unchanged and not written at all. An update only sets the fields
+# the upload carries; the others keep their stored values.
+
+EPISODE_COLUMNS = ['episode_name'] + [
+    column for quality in QUALITIES
+    for column in (f'video_{quality}', f'download_{quality}', f'download_{quality}_type')
+]
+
+
+def _upsert_seasons(tv_id, seasons):
+    """Create missing seasons and return ``{season_number: (season_id, status)}``.
+
+    ``status`` is ``created``, ``updated`` (a new ``total_episodes``) or ``unchanged``.
+    """
+    existing = {row.season_number: row.total_episodes for row in db.session.query(
+        Season.season_number, Season.total_episodes
+    ).filter(Season.tv_series_id == tv_id, Season.season_number.in_([s['season_number'] for s in seasons]))}
+    table = Season.__table__
+    statement = dialect_insert(table)
+    # The conflict branch still has to SET something for RETURNING to report existing rows
+    statement = statement.on_conflict_do_update(
+        index_elements=['tv_series_id', 'season_number'],
+        set_={'total_episodes': func.coalesce(statement.excluded.total_episodes, table.c.total_episodes)}
+    ).returning(table.c.id, table.c.season_number)
+    rows = db.session.execute(statement, [{
+        'tv_series_id': tv_id,
+        'season_number': season['season_number'],
+        'total_episodes': season.get('total_episodes'),
+    } for season in seasons]).all()
+
+    totals = {season['season_number']: season.get('total_episodes') for season in seasons}
+    statuses = {}
+    for season_id, number in rows:
+        if number not in existing:
+            status = 'created'
+        elif totals[number] is not None and totals[number] != existing[number]:
+            status = 'updated'
+        else:
+            status = 'unchanged'
+        statuses[number] = (season_id, status)
+    return statuses
+
+
+def upsert_episodes(tv_id, seasons):
+    """Insert or update the episodes of ``seasons`` (validated) inside one transaction.
+
+    Returns one ``{'season_number', 'episode_number', 'status'}`` per episode,
+    status being ``created``, ``updated`` or ``unchanged``. The caller commits.
+    """
+    season_ids = _upsert_seasons(tv_id, seasons)
+    current = {}
+    for episode in Episode.query.filter(Episode.season_id.in_([season_id for season_id, _ in season_ids.values()])):
+        current[(episode.season_id, episode.episode_number)] = {column: getattr(episode, column) for column in EPISODE_COLUMNS}
+
+    now = datetime.utcnow()
+    results, rows, changes = [], {}, []
+    for season in seasons:
+        season_id, season_status = season_ids[season['season_number']]
+        if season_status != 'unchanged':
+            changes.append({'kind': 'season_added' if season_status == 'created' else 'season_updated',
+                            'season_number': season['season_number'], 'episode_number': None,
+                            'payload': {'season_number': season['season_number'], 'total_episodes': season.get('total_episodes')}})
+        for data in season['episodes']:
+            values = episode_values(season_id, data)
+            given = frozenset(episode_columns_given(data))
+            key = (season_id, values['episode_number'])
+            if key not in current:
+                status = 'created'
+                document = values
+            else:
+                document = dict(current[key], **{column: values[column] for column in given},
+                                season_id=season_id, episode_number=values['episode_number'])
+                status = 'unchanged' if all(current[key][column] == values[column] for column in given) else 'updated'
+            results.append({'season_number': season['season_number'], 'episode_number': values['episode_number'],
+                            'status': status})
+            if status == 'unchanged':
+                continue
+            rows.setdefault(given, []).append(values)
+            changes.append({'kind': 'episode_added' if status == 'created' else 'episode_updated',
+                            'season_number': season['season_number'], 'episode_number': values['episode_number'],
+                            'payload': serialize_episode(Episode(**document))})
+
+    # One statement per set of given fields, so an update never overwrites a field its payload left out
+    for given, group in rows.items():
+        statement = dialect_insert(Episode.__table__)
+        if given:
+            statement = statement.on_conflict_do_update(
+                index_elements=['season_id', 'episode_number'],
+                set_={column: statement.excluded[column] for column in EPISODE_COLUMNS if column in given}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=['season_id', 'episode_number'])
+        db.session.execute(statement, group)
+    if changes:
+        db.session.execute(CatalogChange.__table__.insert(), [{
+            'kind': change['kind'],
+            'media_id': tv_id,
+            'season_number': change['season_number'],
+            'episode_number': change['episode_number'],
+            'payload': dumps(change['payload']).decode('utf-8'),
+            'created_at': now,
+        } for change in changes])
+        adjust_stats({
+            ('seasons', ''): sum(1 for _, status in season_ids.values() if status == 'created'),
+            ('episodes', ''): sum(1 for result in results if result['status'] == 'created'),
+        })
+        store_documents([tv_id])
+        bump_catalog_version()
+    return results
@@ -1,12 +1,51 @@
-from flask import Flask, request, jsonify, render_template
-from flask_sqlalchemy import SQLAlchemy
+import click
+from flask import Flask, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
+import hashlib
 import json
 from functools import wraps
+import logging
 import os
-from datetime import datetime
-from sqlalchemy import Sequence  # Added for shared sequence
+import signal
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+# Sibling modules (models, catalog) are imported flat, the same way wsgi.py imports index
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import db, TVSeries, Season, Episode, Job
+from catalog import (query_media_ids, project, store_documents, load_document_bodies, iter_document_bodies,
+                     rebuild_documents, load_seasons, load_season_episodes,
+                     get_catalog_version, bump_catalog_version, MEDIA_TYPES, DOCUMENT_FIELDS)
+from serializers import dumps, loads, encode_array, encode_envelope, serialize_episode, serialize_season_summary
+from changes import record_change, change_bounds, load_changes, compact_changes
+from response_cache import create_cache_backend, cached_view
+from tmdb_client import TMDBClient, SQLMetadataCache, MemoryMetadataCache
+from catalog_import import (parse_manifest, run_import, summarize, write_batch, validate_title, episode_values,
+                            validate_episode, validate_episode_batch, existing_titles, ManifestError, ValidationError)
+from duplicates import find_duplicates, merge_duplicates
+from episodes import upsert_episodes
+from search import reindex_all, search_media, MAX_SEARCH_LIMIT
+from migrations import run_migrations, pending_migrations
+from db_pool import engine_options, pool_stats
+from db_routing import ReplicaRouter, replica_binds, read_replica, PRIMARY_COOKIE
+from structured_logging import configure_logging
+from instrumentation import MetricsRegistry, init_instrumentation, timed
+from compression import Compressor, encoded_etag, init_compression
+from pages import PAGES, PageStore, build_pages
+from jobs import JOB_STATUSES, Worker, enqueue, retry, job_counts, list_jobs, prune_jobs, serialize_job
+from enrichment import ENRICH_JOB, EnrichmentHandler, schedule_refresh
+from stats import adjust_stats, load_stats, reconcile_stats
+from snapshot import SnapshotManager, primary_catalog_version, remove_older_snapshots, snapshot_filename, write_snapshot
+from link_check import (LINK_STATUSES, LinkChecker, check_links, link_check_counts, broken_hosts, list_link_checks,
+                        serialize_link_check)
+
+# LOG_LEVEL=DEBUG|INFO|WARNING|ERROR, LOG_FORMAT=json|text
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO'), os.environ.get('LOG_FORMAT', 'json'))
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, template_folder='../templates')
 app.config['SECRET_KEY'] = 'zero-creations-media-database-2024'
@@ -34,257 +73,284 @@ try:
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///media.db'
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
+    # Pool mode, sizes and statement timeout come from DB_POOL_* settings, see db_pool.py
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], os.environ)
+    # Optional read replicas, comma-separated; each becomes a replica_<n> bind (see db_routing.py)
+    app.config['SQLALCHEMY_BINDS'] = {
+        key: dict(engine_options(url, os.environ), url=url)
+        for key, url in replica_binds(os.environ.get('DATABASE_READ_URL')).items()
     }
 except Exception as e:
-    print(f"Database configuration error: {e}")
+    logger.error("Database configuration error", exc_info=e)
+
+db.init_app(app)
+
+# Server-Timing headers, /metrics and the access log; PROFILE_SAMPLE_RATE > 0 stack-samples that
+# share of requests and keeps the samples of those slower than SLOW_REQUEST_MS in PROFILE_DIR
+metrics = MetricsRegistry()
+init_instrumentation(
+    app, metrics,
+    slow_request_ms=float(os.environ.get('SLOW_REQUEST_MS', 1000)),
+    profile_sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    profile_dir=os.environ.get('PROFILE_DIR', '/tmp/profiles')
+)
+
+# gzip (or brotli, when installed) for responses of at least COMPRESS_MIN_SIZE bytes; registered
+# after the instrumentation so compression time shows up in Server-Timing
+compressor = Compressor(
+    min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+    gzip_level=int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+)
+init_compression(app, compressor)
+
+replica_router = ReplicaRouter(
+    db, app.config.get('SQLALCHEMY_BINDS', {}),
+    check_interval=float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5)),
+    max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', 10))
+)
+# How long a client that just wrote keeps reading from the primary
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+
+@app.before_request
+def route_reads():
+    if not replica_router.enabled or request.method not in ('GET', 'HEAD'):
+        return
+    if not getattr(app.view_functions.get(request.endpoint), 'read_replica', False):
+        return
+    if not pinned_to_primary():
+        g.db_read_bind = replica_router.choose()
+
+def pinned_to_primary():
+    # Clients that just wrote read from the primary for a while, so they see their own changes
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    return primary_until >= time.time()
+
+@app.after_request
+def pin_reads_after_write(response):
+    if replica_router.enabled and g.get('db_wrote'):
+        response.set_cookie(PRIMARY_COOKIE, str(time.time() + READ_YOUR_WRITES_SECONDS),
+                            max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite='Lax')
+    return response
+
+# Public response cache: memory://?maxsize=256&ttl=300 (per instance), redis://... (shared) or none
+response_cache = create_cache_backend(os.environ.get('RESPONSE_CACHE_URL', 'memory://?maxsize=256&ttl=300'))
+# Browsers revalidate with the ETag; the CDN may serve a cached copy for s-maxage seconds
+PUBLIC_CACHE_CONTROL = os.environ.get(
+    'PUBLIC_CACHE_CONTROL', 'public, max-age=0, s-maxage=60, stale-while-revalidate=300'
+)
+
+def cached_public_view(view):
+    return cached_view(lambda: response_cache, get_catalog_version, PUBLIC_CACHE_CONTROL, compressor)(view)
 
-db = SQLAlchemy(app)
+# Snapshot mode (see snapshot.py): with CATALOG_SNAPSHOT_DIR set, /media/<id> is answered from a
+# memory-mapped snapshot of the catalog, without a database round-trip. Each instance checks the
+# catalog version every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds and builds the snapshot of a new
+# version into CATALOG_SNAPSHOT_DIR, unless `flask snapshot-build` put it in CATALOG_SNAPSHOT_BUILD_DIR
+CATALOG_SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR')
+CATALOG_SNAPSHOT_BUILD_DIR = os.environ.get(
+    'CATALOG_SNAPSHOT_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'build', 'snapshot')
+)
+snapshots = SnapshotManager(
+    app, CATALOG_SNAPSHOT_DIR, check_interval=float(os.environ.get('CATALOG_SNAPSHOT_CHECK_INTERVAL', 5)),
+    bundle_dir=CATALOG_SNAPSHOT_BUILD_DIR
+) if CATALOG_SNAPSHOT_DIR else None
+
+@app.after_request
+def rebuild_snapshot_after_write(response):
+    if snapshots is not None and g.get('db_wrote'):
+        snapshots.expire()
+    return response
+
+def snapshot_first(view):
+    """Answer ``view`` from the catalog snapshot while it is current; otherwise run it (database and cache)."""
+    @wraps(view)
+    def wrapper(media_id):
+        snapshot = snapshots.current() if snapshots is not None and not pinned_to_primary() else None
+        expand, unknown = media_expand()
+        # Unknown expansions are reported by the view
+        if snapshot is None or unknown:
+            return view(media_id)
+        body = snapshot.get(media_id, compact='episodes' not in expand)
+        if body is None:
+            return make_cors_response({'error': 'Media not found'}, 404)
+        response = make_json_response({'status': 'success'}, data=body)
+        # Same ETags as the cached response of the same document, one per encoding
+        encoding = compressor.negotiate() if compressor.should_compress(response) else None
+        etag = encoded_etag(hashlib.sha256(response.get_data()).hexdigest()[:32], encoding)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PUBLIC_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b'')
+        elif encoding is not None:
+            with timed('compress'):
+                response.set_data(compressor.compress(response.get_data(), encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+    return wrapper
+
+# HTML pages, precompressed by `flask build-pages`. Each deployment gets a fresh CDN cache, so the
+# CDN may keep them for long; browsers revalidate hourly with the ETag
+PAGES_BUILD_DIR = os.environ.get(
+    'PAGES_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'build', 'pages')
+)
+PAGE_CACHE_CONTROL = os.environ.get(
+    'PAGE_CACHE_CONTROL', 'public, max-age=3600, s-maxage=31536000, stale-while-revalidate=86400'
+)
+page_store = PageStore(PAGES_BUILD_DIR, compressor, PAGE_CACHE_CONTROL)
+
+def page_view(template):
+    def view():
+        return page_store.response(template)
+    return view
+
+for url, template in PAGES.items():
+    app.add_url_rule(url, endpoint=f"page_{template.rsplit('.', 1)[0]}", view_func=page_view(template))
 
 # TMDB API Configuration
-TMDB_API_KEY = '52f6a75a38a397d940959b336801e1c3'
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY', '52f6a75a38a397d940959b336801e1c3')
+TMDB_BASE_URL = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
 TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/original' # Updated to original for higher quality
 
-# Database Models
-#
-# A shared Sequence is used to ensure movies and tv series share a single ID namespace.
-# This makes it easy to look up any item by its ID regardless of type.
-#
-class Media(db.Model):
-    __abstract__ = True
-    id = db.Column(db.Integer, Sequence('media_id_seq'), primary_key=True)
-    tmdb_id = db.Column(db.Integer, nullable=False)
-    type = db.Column(db.String(10), nullable=False) # 'movie' or 'tv'
-    title = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
-    thumbnail = db.Column(db.String(500))
-    release_date = db.Column(db.String(20))
-    language = db.Column(db.String(50))
-    rating = db.Column(db.Float)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-
-class Cast(db.Model):
-    __tablename__ = 'cast'
-    id = db.Column(db.Integer, primary_key=True)
-    media_id = db.Column(db.Integer, db.ForeignKey('media_table.id'), nullable=False)
-    name = db.Column(db.String(200), nullable=False)
-    character = db.Column(db.String(200))
-    image = db.Column(db.String(500))
-
-class Movie(Media):
-    __tablename__ = 'movie'
-    id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
-    video_720p = db.Column(db.String(500))
-    video_1080p = db.Column(db.String(500))
-    video_2160p = db.Column(db.String(500))
-    download_720p = db.Column(db.String(500))
-    download_1080p = db.Column(db.String(500))
-    download_2160p = db.Column(db.String(500))
-    download_720p_type = db.Column(db.String(50))
-    download_1080p_type = db.Column(db.String(50))
-    download_2160p_type = db.Column(db.String(50))
-    __mapper_args__ = {
-        'polymorphic_identity': 'movie',
-    }
-    
-class TVSeries(Media):
-    __tablename__ = 'tv_series'
-    id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
-    total_seasons = db.Column(db.Integer)
-    __mapper_args__ = {
-        'polymorphic_identity': 'tv',
-    }
+# Admin credentials (the admin templates send these as HTTP Basic auth)
+ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'venura')
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'venura')
+
+def make_cors_response(data, status_code=200):
+    with timed('serialize'):
+        response = jsonify(data)
+    response.status_code = status_code
+    return response
+
+def make_json_response(payload, status_code=200, **encoded):
+    # encoded values are already-encoded JSON (bytes), or lists of them for arrays; see serializers.py
+    with timed('serialize'):
+        body = encode_envelope(payload, **{
+            key: value if isinstance(value, bytes) else encode_array(value) for key, value in encoded.items()
+        })
+    return app.response_class(body, status=status_code, mimetype='application/json')
+
+def auth_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth = request.authorization
+        if not auth or auth.username != ADMIN_USERNAME or auth.password != ADMIN_PASSWORD:
+            response = make_cors_response({'error': 'Authentication required'}, 401)
+            response.headers['WWW-Authenticate'] = 'Basic realm="Admin"'
+            return response
+        return f(*args, **kwargs)
+    return decorated
 
-class Season(db.Model):
-    __tablename__ = 'season'
-    id = db.Column(db.Integer, primary_key=True)
-    tv_series_id = db.Column(db.Integer, db.ForeignKey('tv_series.id'), nullable=False)
-    season_number = db.Column(db.Integer, nullable=False)
-    total_episodes = db.Column(db.Integer)
-    episodes = db.relationship('Episode', backref='season', lazy=True, cascade='all, delete-orphan')
-    __table_args__ = (db.UniqueConstraint('tv_series_id', 'season_number'),)
-
-class Episode(db.Model):
-    __tablename__ = 'episode'
-    id = db.Column(db.Integer, primary_key=True)
-    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), nullable=False)
-    episode_number = db.Column(db.Integer, nullable=False)
-    episode_name = db.Column(db.String(200))
-    video_720p = db.Column(db.String(500))
-    video_1080p = db.Column(db.String(500)) # Added for consistency
-    video_2160p = db.Column(db.String(500)) # Added for consistency
-    download_720p = db.Column(db.String(500))
-    download_1080p = db.Column(db.String(500)) # Added for consistency
-    download_2160p = db.Column(db.String(500)) # Added for consistency
-    download_720p_type = db.Column(db.String(50))
-    download_1080p_type = db.Column(db.String(50)) # Added for consistency
-    download_2160p_type = db.Column(db.String(50)) # Added for consistency
-    __table_args__ = (db.UniqueConstraint('season_id', 'episode_number'),)
-
-# This table will be used by both Movie and TVSeries for a single ID space
-class MediaTable(db.Model):
-    __tablename__ = 'media_table'
-    id = db.Column(db.Integer, Sequence('media_id_seq'), primary_key=True)
-    type = db.Column(db.String(10))
-    __mapper_args__ = {
-        'polymorphic_identity': 'media',
-        'polymorphic_on': type
-    }
-    
 # Initialize database with error handling
 def init_db():
     try:
         with app.app_context():
-            db.create_all()
-            
-            # For PostgreSQL: Set sequence to max existing ID + 1
-            if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql://'):
-                max_id = db.session.execute("SELECT COALESCE(MAX(id), 0) FROM media_table").scalar()
-                next_id = max_id + 1
-                db.session.execute(db.text(f"SELECT setval('media_id_seq', {next_id})"))
-                db.session.commit()
-                print(f"✅ Shared sequence set to start at: {next_id}")
-                
-        print("✅ Database initialized successfully")
+            run_migrations(db.engine)
+        logger.info("Database initialized")
         return True
     except Exception as e:
-        print(f"❌ Database initialization error: {e}")
+        logger.error("Database initialization failed", exc_info=e)
         return False
 
 # TMDB API Functions with better error messages
+def tmdb_cache_engine():
+    with app.app_context():
+        return db.engine
+
+def create_tmdb_cache(kind):
+    if kind == 'sql':
+        return SQLMetadataCache(tmdb_cache_engine)
+    if kind == 'memory':
+        return MemoryMetadataCache()
+    return None
+
+tmdb = TMDBClient(
+    api_key=TMDB_API_KEY,
+    base_url=TMDB_BASE_URL,
+    image_base_url=TMDB_IMAGE_BASE_URL,
+    cache=create_tmdb_cache(os.environ.get('TMDB_CACHE', 'sql')),
+    ttl=int(os.environ.get('TMDB_CACHE_TTL', 24 * 3600)),
+    stale_ttl=int(os.environ.get('TMDB_CACHE_STALE_TTL', 7 * 24 * 3600))
+)
+
 def fetch_movie_details(tmdb_id):
     try:
-        print(f"🎬 Fetching movie details for TMDB ID: {tmdb_id}")
-        url = f"{TMDB_BASE_URL}/movie/{tmdb_id}?api_key={TMDB_API_KEY}&append_to_response=credits"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            cast_list = []
-            # Only get top 5 cast members with a profile image
-            for member in data.get('credits', {}).get('cast', [])[:5]:
-                if member.get('profile_path'):
-                    cast_list.append({
-                        "name": member.get('name'),
-                        "character": member.get('character'),
-                        "image": f"{TMDB_IMAGE_BASE_URL}{member.get('profile_path')}"
-                    })
-            print(f"✅ Movie details loaded: {data.get('title', 'Unknown')}")
-            return {
-                'title': data.get('title', ''),
-                'description': data.get('overview', ''),
-                'thumbnail': f"{TMDB_IMAGE_BASE_URL}{data.get('poster_path', '')}" if data.get('poster_path') else '',
-                'release_date': data.get('release_date', ''),
-                'language': data.get('original_language', ''),
-                'rating': data.get('vote_average', 0),
-                'cast': cast_list
-            }
-        else:
-            print(f"❌ Failed to fetch movie: {response.status_code}")
+        logger.debug("Fetching movie details from TMDB", extra={'tmdb_id': tmdb_id})
+        with timed('tmdb'):
+            details = tmdb.movie(tmdb_id)
+        if details:
+            logger.debug("Movie details loaded", extra={'tmdb_id': tmdb_id, 'title': details.get('title')})
+            return details
+        logger.info("Movie not found on TMDB", extra={'tmdb_id': tmdb_id})
     except Exception as e:
-        print(f"❌ Error fetching movie details: {e}")
+        logger.error("Error fetching movie details", extra={'tmdb_id': tmdb_id}, exc_info=e)
     return None
 
 def fetch_tv_details(tmdb_id):
     try:
-        print(f"📺 Fetching TV details for TMDB ID: {tmdb_id}")
-        url = f"{TMDB_BASE_URL}/tv/{tmdb_id}?api_key={TMDB_API_KEY}&append_to_response=credits"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            cast_list = []
-            # Only get top 5 cast members with a profile image
-            for member in data.get('credits', {}).get('cast', [])[:5]:
-                if member.get('profile_path'):
-                    cast_list.append({
-                        "name": member.get('name'),
-                        "character": member.get('character'),
-                        "image": f"{TMDB_IMAGE_BASE_URL}{member.get('profile_path')}"
-                    })
-            print(f"✅ TV details loaded: {data.get('name', 'Unknown')}")
-            return {
-                'title': data.get('name', ''),
-                'description': data.get('overview', ''),
-                'thumbnail': f"{TMDB_IMAGE_BASE_URL}{data.get('poster_path', '')}" if data.get('poster_path') else '',
-                'release_date': data.get('first_air_date', ''),
-                'language': data.get('original_language', ''),
-                'rating': data.get('vote_average', 0),
-                'cast': cast_list,
-                'total_seasons': len(data.get('seasons', []))
-            }
-        else:
-            print(f"❌ Failed to fetch TV series: {response.status_code}")
+        logger.debug("Fetching TV details from TMDB", extra={'tmdb_id': tmdb_id})
+        with timed('tmdb'):
+            details = tmdb.tv(tmdb_id)
+        if details:
+            logger.debug("TV details loaded", extra={'tmdb_id': tmdb_id, 'title': details.get('title')})
+            return details
+        logger.info("TV series not found on TMDB", extra={'tmdb_id': tmdb_id})
     except Exception as e:
-        print(f"❌ Error fetching TV details: {e}")
+        logger.error("Error fetching TV details", extra={'tmdb_id': tmdb_id}, exc_info=e)
     return None
 
 # The rest of the TMDB API routes are unchanged as they just return the fetched data
 # (get_tmdb_movie, get_tmdb_tv)
 
 # Admin API Routes
+def duplicate_title_response(record):
+    """409 naming the existing title if ``record``'s (type, tmdb_id) is already in the catalog, else None."""
+    key = (record['type'], record['tmdb_id'])
+    existing_id = existing_titles([key]).get(key)
+    if existing_id is None:
+        return None
+    label = 'Movie' if record['type'] == 'movie' else 'TV series'
+    return make_cors_response({
+        'status': 'error',
+        'message': f'{label} with TMDB ID {record["tmdb_id"]} already exists',
+        'id': existing_id
+    }, 409)
+
 @app.route('/api/admin/movies', methods=['POST'])
 @auth_required
 def add_movie():
     try:
-        data = request.get_json()
-        if not data or 'tmdb_id' not in data:
-            return make_cors_response({'error': 'No data or TMDB ID provided'}, 400)
-        
-        # Check for required fields in the new format
-        required_fields = ['title', 'description', 'thumbnail', 'release_date', 'language', 'cast', 'rating', 'video_links', 'download_links']
-        for field in required_fields:
-            if field not in data:
-                return make_cors_response({'error': f'Missing required field: {field}'}, 400)
-
-        # Create a new MediaTable entry first to get a shared ID
-        new_media_entry = MediaTable(type='movie')
-        db.session.add(new_media_entry)
-        db.session.commit()
-        
-        movie = Movie(
-            id=new_media_entry.id,
-            tmdb_id=data['tmdb_id'],
-            title=data['title'],
-            description=data.get('description', ''),
-            thumbnail=data.get('thumbnail', ''),
-            release_date=data.get('release_date', ''),
-            language=data.get('language', ''),
-            rating=data.get('rating', 0),
-            video_720p=data.get('video_links', {}).get('video_720p'),
-            video_1080p=data.get('video_links', {}).get('video_1080p'),
-            video_2160p=data.get('video_links', {}).get('video_2160p'),
-            download_720p=data.get('download_links', {}).get('download_720p', {}).get('url'),
-            download_1080p=data.get('download_links', {}).get('download_1080p', {}).get('url'),
-            download_2160p=data.get('download_links', {}).get('download_2160p', {}).get('url'),
-            download_720p_type=data.get('download_links', {}).get('download_720p', {}).get('file_type'),
-            download_1080p_type=data.get('download_links', {}).get('download_1080p', {}).get('file_type'),
-            download_2160p_type=data.get('download_links', {}).get('download_2160p', {}).get('file_type')
-        )
+        record = validate_title(request.get_json(silent=True), 'movie')
+    except ValidationError as e:
+        return make_cors_response({'error': str(e)}, 400)
 
-        for member in data.get('cast', []):
-            cast_member = Cast(
-                media_id=movie.id,
-                name=member.get('name'),
-                character=member.get('character'),
-                image=member.get('image')
-            )
-            db.session.add(cast_member)
-        
-        db.session.add(movie)
+    try:
+        duplicate = duplicate_title_response(record)
+        if duplicate is not None:
+            return duplicate
+        # One transaction: the title, its cast and the derived rows are written together or not at all
+        media_id, = write_batch([record])
         db.session.commit()
         
-        print(f"✅ Movie added successfully with ID: {movie.id}")
+        logger.info("Movie added", extra={'media_id': media_id, 'tmdb_id': record['tmdb_id']})
         
         return make_cors_response({
             'status': 'success',
-            'message': f'Movie "{data["title"]}" added successfully',
-            'id': movie.id
+            'message': f'Movie "{record["title"]}" added successfully',
+            'id': media_id
         })
     except Exception as e:
-        print(f"❌ Error adding movie: {e}")
         db.session.rollback()
+        # A concurrent add of the same title got past the check above; the unique (type, tmdb_id) index caught it
+        duplicate = duplicate_title_response(record) if isinstance(e, IntegrityError) else None
+        if duplicate is not None:
+            return duplicate
+        logger.error("Error adding movie", exc_info=e)
         return make_cors_response({
             'status': 'error',
             'message': 'Failed to add movie. Please check all required fields.'
@@ -294,261 +360,351 @@ def add_movie():
 @auth_required
 def add_tv_series():
     try:
-        data = request.get_json()
-        if not data or 'tmdb_id' not in data:
-            return make_cors_response({'error': 'No data or TMDB ID provided'}, 400)
-
-        required_fields = ['title', 'description', 'thumbnail', 'release_date', 'language', 'cast', 'rating', 'total_seasons', 'seasons']
-        for field in required_fields:
-            if field not in data:
-                return make_cors_response({'error': f'Missing required field: {field}'}, 400)
-
-        # Create a new MediaTable entry first to get a shared ID
-        new_media_entry = MediaTable(type='tv')
-        db.session.add(new_media_entry)
-        db.session.commit()
-        
-        tv_series = TVSeries(
-            id=new_media_entry.id,
-            tmdb_id=data['tmdb_id'],
-            title=data['title'],
-            description=data.get('description', ''),
-            thumbnail=data.get('thumbnail', ''),
-            release_date=data.get('release_date', ''),
-            language=data.get('language', ''),
-            rating=data.get('rating', 0),
-            total_seasons=data.get('total_seasons', 0)
-        )
-        
-        for member in data.get('cast', []):
-            cast_member = Cast(
-                media_id=tv_series.id,
-                name=member.get('name'),
-                character=member.get('character'),
-                image=member.get('image')
-            )
-            db.session.add(cast_member)
+        record = validate_title(request.get_json(silent=True), 'tv')
+    except ValidationError as e:
+        return make_cors_response({'error': str(e)}, 400)
 
-        # Loop through seasons and episodes
-        for season_data in data.get('seasons', {}).values():
-            season = Season(
-                tv_series_id=tv_series.id,
-                season_number=season_data.get('season_number'),
-                total_episodes=season_data.get('total_episodes')
-            )
-            db.session.add(season)
-            db.session.flush() # Flushes to get the season.id for episodes
-
-            for episode_data in season_data.get('episodes', []):
-                episode = Episode(
-                    season_id=season.id,
-                    episode_number=episode_data.get('episode_number'),
-                    episode_name=episode_data.get('episode_name'),
-                    video_720p=episode_data.get('video_720p'),
-                    download_720p=episode_data.get('download_720p', {}).get('url'),
-                    download_720p_type=episode_data.get('download_720p', {}).get('file_type')
-                )
-                db.session.add(episode)
-                
-        db.session.add(tv_series)
+    try:
+        duplicate = duplicate_title_response(record)
+        if duplicate is not None:
+            return duplicate
+        # Seasons are inserted in one statement with RETURNING ids, then all episodes in another
+        media_id, = write_batch([record])
         db.session.commit()
         
-        print(f"✅ TV series added successfully with ID: {tv_series.id}")
+        logger.info("TV series added", extra={'media_id': media_id, 'tmdb_id': record['tmdb_id']})
         
         return make_cors_response({
             'status': 'success',
-            'message': f'TV series "{data["title"]}" added successfully',
-            'id': tv_series.id
+            'message': f'TV series "{record["title"]}" added successfully',
+            'id': media_id
         })
     except Exception as e:
-        print(f"❌ Error adding TV series: {e}")
         db.session.rollback()
+        # A concurrent add of the same title got past the check above; the unique (type, tmdb_id) index caught it
+        duplicate = duplicate_title_response(record) if isinstance(e, IntegrityError) else None
+        if duplicate is not None:
+            return duplicate
+        logger.error("Error adding TV series", exc_info=e)
         return make_cors_response({
             'status': 'error',
             'message': 'Failed to add TV series. Please check all required fields.'
         }, 500)
 
 # Public API Routes
+MAX_PAGE_SIZE = 500
+
+def parse_media_list_args(args):
+    """Validate the /media query string. Returns (options, error_message)."""
+    options = {'media_type': None, 'language': None, 'year': None, 'after_id': None, 'limit': None, 'fields': None}
+
+    media_type = args.get('type')
+    if media_type:
+        if media_type not in MEDIA_TYPES:
+            return None, f"Invalid type '{media_type}', expected one of: {', '.join(MEDIA_TYPES)}"
+        options['media_type'] = media_type
+
+    options['language'] = args.get('language') or None
+
+    for name, key in (('year', 'year'), ('cursor', 'after_id'), ('limit', 'limit')):
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            options[key] = int(value)
+        except ValueError:
+            return None, f"Invalid {name} '{value}', expected an integer"
+        if options[key] < 0 or (name == 'limit' and options[key] == 0):
+            return None, f"Invalid {name} '{value}'"
+    if options['limit'] is not None:
+        options['limit'] = min(options['limit'], MAX_PAGE_SIZE)
+
+    fields = args.get('fields')
+    if fields:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in requested if f not in DOCUMENT_FIELDS]
+        if unknown:
+            return None, f"Unknown fields: {', '.join(unknown)}"
+        options['fields'] = requested
+
+    return options, None
+
 @app.route('/media')
+@read_replica
+@cached_public_view
 def get_all_media():
     try:
-        print("📋 Loading all media...")
-        # Query the shared MediaTable to get all media items
-        media_items = MediaTable.query.all()
-        
-        media_list = []
-        
-        for item in media_items:
-            # Check the type and load the correct subclass data
-            if item.type == 'movie':
-                movie = Movie.query.get(item.id)
-                if not movie:
-                    continue
-                cast_members = Cast.query.filter_by(media_id=movie.id).all()
-                media_list.append({
-                    'id': movie.id,
-                    'type': 'movie',
-                    'title': movie.title,
-                    'description': movie.description,
-                    'thumbnail': movie.thumbnail,
-                    'release_date': movie.release_date,
-                    'language': movie.language,
-                    'rating': movie.rating,
-                    'cast': [{'name': c.name, 'character': c.character, 'image': c.image} for c in cast_members],
-                    'video_links': {
-                        'video_720p': movie.video_720p,
-                        'video_1080p': movie.video_1080p,
-                        'video_2160p': movie.video_2160p
-                    },
-                    'download_links': {
-                        'download_720p': {'url': movie.download_720p, 'file_type': movie.download_720p_type},
-                        'download_1080p': {'url': movie.download_1080p, 'file_type': movie.download_1080p_type},
-                        'download_2160p': {'url': movie.download_2160p, 'file_type': movie.download_2160p_type}
-                    }
-                })
-            elif item.type == 'tv':
-                tv = TVSeries.query.get(item.id)
-                if not tv:
-                    continue
-                cast_members = Cast.query.filter_by(media_id=tv.id).all()
-                seasons_data = {}
-                for season in tv.seasons:
-                    episodes_list = []
-                    for episode in season.episodes:
-                        episodes_list.append({
-                            'episode_number': episode.episode_number,
-                            'episode_name': episode.episode_name,
-                            'video_720p': episode.video_720p,
-                            'download_720p': {'url': episode.download_720p, 'file_type': episode.download_720p_type}
-                        })
-                    seasons_data[f"season_{season.season_number}"] = {
-                        'season_number': season.season_number,
-                        'total_episodes': season.total_episodes,
-                        'episodes': episodes_list
-                    }
-                media_list.append({
-                    'id': tv.id,
-                    'type': 'tv',
-                    'title': tv.title,
-                    'description': tv.description,
-                    'thumbnail': tv.thumbnail,
-                    'release_date': tv.release_date,
-                    'language': tv.language,
-                    'rating': tv.rating,
-                    'cast': [{'name': c.name, 'character': c.character, 'image': c.image} for c in cast_members],
-                    'total_seasons': tv.total_seasons,
-                    'seasons': seasons_data
-                })
-        
-        print(f"✅ Loaded {len(media_list)} media items")
+        options, error = parse_media_list_args(request.args)
+        if error:
+            return make_cors_response({'error': error}, 400)
+
+        filtered = any(options[key] is not None for key in ('media_type', 'language', 'year', 'after_id', 'limit'))
+        media_ids = None
+        if filtered:
+            media_ids = query_media_ids(
+                media_type=options['media_type'],
+                language=options['language'],
+                year=options['year'],
+                after_id=options['after_id'],
+                limit=options['limit']
+            )
+        bodies = load_document_bodies(media_ids)
+        if options['fields'] is not None:
+            with timed('serialize'):
+                bodies = [dumps(project(loads(body), options['fields'])) for body in bodies]
+        logger.debug("Loaded media", extra={'count': len(bodies)})
         
-        return make_cors_response({
+        payload = {
             'status': 'success',
-            'total_count': len(media_list),
-            'data': media_list
-        })
+            'total_count': len(bodies)
+        }
+        if options['limit'] is not None:
+            # A full page means there may be more rows after the last id
+            payload['next_cursor'] = media_ids[-1] if len(media_ids) == options['limit'] else None
+        return make_json_response(payload, data=bodies)
     except Exception as e:
-        print(f"❌ Error loading media: {e}")
+        logger.error("Error loading media", exc_info=e)
         return make_cors_response({'error': 'Failed to retrieve media'}), 500
 
+# What ?expand= can add to a detail response; TV seasons come without episodes otherwise
+EXPAND_OPTIONS = ('episodes',)
+EPISODES_PAGE_SIZE = 100
+
+def media_expand():
+    """``(expand, unknown)``: the ?expand= options of a media request and those not supported."""
+    expand = [e.strip() for e in request.args.get('expand', '').split(',') if e.strip()]
+    return expand, [e for e in expand if e not in EXPAND_OPTIONS]
+
 @app.route('/media/<int:media_id>')
+@read_replica
+@snapshot_first
+@cached_public_view
 def get_media_details(media_id):
     try:
-        print(f"🔍 Loading details for media ID: {media_id}")
-        
-        # Query the shared MediaTable first to find the type
-        media_entry = MediaTable.query.get(media_id)
-        if not media_entry:
+        expand, unknown = media_expand()
+        if unknown:
+            return make_cors_response({'error': f"Unknown expand: {', '.join(unknown)}"}, 400)
+
+        bodies = load_document_bodies([media_id], compact='episodes' not in expand)
+        if not bodies:
             return make_cors_response({'error': 'Media not found'}, 404)
         
-        if media_entry.type == 'movie':
-            movie = Movie.query.get(media_id)
-            if not movie:
-                return make_cors_response({'error': 'Movie not found'}, 404)
-            
-            cast_members = Cast.query.filter_by(media_id=movie.id).all()
-            movie_data = {
-                'id': movie.id,
-                'type': 'movie',
-                'title': movie.title,
-                'description': movie.description,
-                'thumbnail': movie.thumbnail,
-                'release_date': movie.release_date,
-                'language': movie.language,
-                'rating': movie.rating,
-                'cast': [{'name': c.name, 'character': c.character, 'image': c.image} for c in cast_members],
-                'video_links': {
-                    'video_720p': movie.video_720p,
-                    'video_1080p': movie.video_1080p,
-                    'video_2160p': movie.video_2160p
-                },
-                'download_links': {
-                    'download_720p': {'url': movie.download_720p, 'file_type': movie.download_720p_type},
-                    'download_1080p': {'url': movie.download_1080p, 'file_type': movie.download_1080p_type},
-                    'download_2160p': {'url': movie.download_2160p, 'file_type': movie.download_2160p_type}
-                }
-            }
-            return make_cors_response({
-                'status': 'success',
-                'data': movie_data
-            })
-        
-        elif media_entry.type == 'tv':
-            tv_series = TVSeries.query.get(media_id)
-            if not tv_series:
-                return make_cors_response({'error': 'TV series not found'}, 404)
-            
-            cast_members = Cast.query.filter_by(media_id=tv_series.id).all()
-            seasons_data = {}
-            for season in tv_series.seasons:
-                episodes_list = []
-                for episode in season.episodes:
-                    episodes_list.append({
-                        'episode_number': episode.episode_number,
-                        'episode_name': episode.episode_name,
-                        'video_720p': episode.video_720p,
-                        'download_720p': {'url': episode.download_720p, 'file_type': episode.download_720p_type}
-                    })
-                seasons_data[f"season_{season.season_number}"] = {
-                    'season_number': season.season_number,
-                    'total_episodes': season.total_episodes,
-                    'episodes': episodes_list
-                }
-            
-            tv_data = {
-                'id': tv_series.id,
-                'type': 'tv',
-                'title': tv_series.title,
-                'description': tv_series.description,
-                'thumbnail': tv_series.thumbnail,
-                'release_date': tv_series.release_date,
-                'language': tv_series.language,
-                'rating': tv_series.rating,
-                'cast': [{'name': c.name, 'character': c.character, 'image': c.image} for c in cast_members],
-                'total_seasons': tv_series.total_seasons,
-                'seasons': seasons_data
-            }
-            return make_cors_response({
-                'status': 'success',
-                'data': tv_data
-            })
-            
-        return make_cors_response({'error': 'Media not found'}), 404
+        return make_json_response({'status': 'success'}, data=bodies[0])
     except Exception as e:
-        print(f"❌ Error loading media details: {e}")
+        logger.error("Error loading media details", extra={'media_id': media_id}, exc_info=e)
         return make_cors_response({'error': 'Failed to retrieve media details'}), 500
 
+@app.route('/media/<int:media_id>/seasons')
+@read_replica
+@cached_public_view
+def get_media_seasons(media_id):
+    try:
+        seasons = load_seasons(media_id)
+        if seasons is None:
+            return make_cors_response({'error': 'TV series not found'}, 404)
+        return make_cors_response({
+            'status': 'success',
+            'total_count': len(seasons),
+            'data': [serialize_season_summary(season) for season in seasons]
+        })
+    except Exception as e:
+        logger.error("Error loading seasons", extra={'media_id': media_id}, exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve seasons'}), 500
+
+@app.route('/media/<int:media_id>/seasons/<int:season_number>/episodes')
+@read_replica
+@cached_public_view
+def get_season_episodes(media_id, season_number):
+    try:
+        options = {'after_number': None, 'limit': EPISODES_PAGE_SIZE}
+        for name, key in (('cursor', 'after_number'), ('limit', 'limit')):
+            value = request.args.get(name)
+            if value in (None, ''):
+                continue
+            try:
+                options[key] = int(value)
+            except ValueError:
+                return make_cors_response({'error': f"Invalid {name} '{value}', expected an integer"}, 400)
+            if options[key] < 0 or (name == 'limit' and options[key] == 0):
+                return make_cors_response({'error': f"Invalid {name} '{value}'"}, 400)
+        options['limit'] = min(options['limit'], MAX_PAGE_SIZE)
+
+        season, episodes = load_season_episodes(media_id, season_number, **options)
+        if season is None:
+            return make_cors_response({'error': 'Season not found'}, 404)
+        return make_cors_response({
+            'status': 'success',
+            'season_number': season.season_number,
+            'total_episodes': season.total_episodes,
+            'data': [serialize_episode(episode) for episode in episodes],
+            # A full page means there may be more episodes after the last number
+            'next_cursor': episodes[-1].episode_number if len(episodes) == options['limit'] else None
+        })
+    except Exception as e:
+        logger.error("Error loading episodes", extra={'media_id': media_id, 'season_number': season_number},
+                     exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve episodes'}), 500
+
+# Streaming export for catalog mirrors
+EXPORT_FORMATS = ('ndjson', 'json')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+def parse_since(value):
+    """Parse an ISO 8601 timestamp into naive UTC (how updated_at is stored). Raises ValueError."""
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+@app.route('/media/export')
+@read_replica
+def export_media():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return make_cors_response({'error': f"Invalid format '{export_format}', expected one of: {', '.join(EXPORT_FORMATS)}"}, 400)
+    media_type = request.args.get('type') or None
+    if media_type and media_type not in MEDIA_TYPES:
+        return make_cors_response({'error': f"Invalid type '{media_type}', expected one of: {', '.join(MEDIA_TYPES)}"}, 400)
+    since = None
+    if request.args.get('since'):
+        try:
+            since = parse_since(request.args['since'])
+        except ValueError:
+            return make_cors_response({'error': f"Invalid since '{request.args['since']}', expected an ISO 8601 timestamp"}, 400)
+
+    # Mirrors pass this back as since= on their next pull
+    started_at = datetime.utcnow()
+    bodies = iter_document_bodies(media_type=media_type, updated_since=since, batch_size=EXPORT_BATCH_SIZE)
+
+    def generate():
+        try:
+            if export_format == 'ndjson':
+                for body in bodies:
+                    yield body + b'\n'
+            else:
+                yield b'{"status":"success","data":['
+                separator = b''
+                for body in bodies:
+                    yield separator + body
+                    separator = b','
+                yield b']}'
+        except Exception as e:
+            # Headers are already sent; the truncated body is all the client gets
+            logger.error("Error exporting media", exc_info=e)
+            raise
+
+    logger.info("Exporting media", extra={'format': export_format, 'since': since})
+    response = app.response_class(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+    )
+    response.headers['X-Export-Started-At'] = started_at.isoformat() + 'Z'
+    return response
+
+# Change feed
+CHANGES_PAGE_SIZE = 500
+MAX_CHANGES_PAGE_SIZE = 1000
+CHANGES_RETENTION_DAYS = int(os.environ.get('CHANGES_RETENTION_DAYS', 30))
+
+@app.route('/changes')
+@read_replica
+@cached_public_view
+def get_changes():
+    try:
+        try:
+            after = max(int(request.args.get('after', 0)), 0)
+            limit = min(max(int(request.args.get('limit', CHANGES_PAGE_SIZE)), 1), MAX_CHANGES_PAGE_SIZE)
+        except ValueError:
+            return make_cors_response({'error': 'after and limit must be integers'}, 400)
+
+        oldest, latest = change_bounds()
+        if oldest is not None and after < oldest - 1:
+            return make_cors_response({
+                'error': 'Changes after this sequence have been compacted, re-sync from /media',
+                'oldest_sequence': oldest,
+                'latest_sequence': latest
+            }, 410)
+
+        changes = load_changes(after, limit)
+        next_after = changes[-1][0] if changes else after
+        payload = {
+            'status': 'success',
+            'latest_sequence': latest or 0,
+            'next_after': next_after,
+            'has_more': latest is not None and next_after < latest
+        }
+        return make_json_response(payload, changes=[body for _, body in changes])
+    except Exception as e:
+        logger.error("Error loading changes", exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve changes'}, 500)
+
+@app.route('/search')
+@read_replica
+@cached_public_view
+def search():
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return make_cors_response({'error': 'Missing search query (q)'}, 400)
+
+        options, error = parse_media_list_args(request.args)
+        if error:
+            return make_cors_response({'error': error}, 400)
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            limit = min(max(int(request.args.get('limit', 20)), 1), MAX_SEARCH_LIMIT)
+        except ValueError:
+            return make_cors_response({'error': 'page and limit must be integers'}, 400)
+
+        logger.debug("Searching", extra={'query': query})
+        found = search_media(
+            query,
+            media_type=options['media_type'],
+            language=options['language'],
+            year=options['year'],
+            limit=limit,
+            offset=(page - 1) * limit
+        )
+        payload = {
+            'status': 'success',
+            'query': query,
+            'total_results': found['total'],
+            'page': page,
+            'limit': limit,
+            'results': found['results']
+        }
+        if found['fuzzy']:
+            payload['fuzzy'] = True
+            payload['corrected_query'] = found['corrected_query']
+        return make_cors_response(payload)
+    except Exception as e:
+        logger.error("Error searching media", exc_info=e)
+        return make_cors_response({'error': 'Failed to search media'}), 500
+
+@app.route('/api/stats')
+@read_replica
+@cached_public_view
+def get_stats():
+    try:
+        # Counters maintained by the write paths (stats.py), not a count over the catalog
+        return make_cors_response(dict(load_stats(), status='success'))
+    except Exception as e:
+        logger.error("Error loading stats", exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve stats'}, 500)
+
 @app.route('/api/admin/tv-series/<int:tv_id>/episodes', methods=['POST'])
 @auth_required
 def add_episode(tv_id):
     try:
-        data = request.get_json()
-        if not data:
-            return make_cors_response({'error': 'No data provided'}, 400)
-            
-        tv_series = TVSeries.query.get_or_404(tv_id)
+        data = validate_episode(request.get_json(silent=True))
+    except ValidationError as e:
+        return make_cors_response({'error': str(e)}, 400)
+
+    try:
+        if db.session.query(TVSeries.id).filter(TVSeries.id == tv_id).first() is None:
+            return make_cors_response({'error': 'TV series not found'}, 404)
         
-        print(f"➕ Adding episode S{data['season_number']}E{data['episode_number']} to {tv_series.title}")
+        logger.debug("Adding episode", extra={'media_id': tv_id, 'season_number': data['season_number'], 'episode_number': data['episode_number']})
         
         season = Season.query.filter_by(
             tv_series_id=tv_id, 
@@ -561,7 +717,11 @@ def add_episode(tv_id):
                 season_number=data['season_number']
             )
             db.session.add(season)
-            db.session.commit()
+            adjust_stats({('seasons', ''): 1})
+            record_change('season_added', tv_id, {'season_number': season.season_number, 'total_episodes': None},
+                          season_number=season.season_number)
+            # Committed together with the episode below; flushing assigns the season its id
+            db.session.flush()
         
         existing_episode = Episode.query.filter_by(
             season_id=season.id,
@@ -574,41 +734,434 @@ def add_episode(tv_id):
                 'message': f'Episode S{data["season_number"]}E{data["episode_number"]} already exists'
             }, 400)
         
-        episode = Episode(
-            season_id=season.id,
-            episode_number=data['episode_number'],
-            episode_name=data.get('episode_name'),
-            video_720p=data.get('video_720p'),
-            download_720p=data.get('download_720p', {}).get('url'),
-            download_720p_type=data.get('download_720p', {}).get('file_type')
-        )
+        episode = Episode(**episode_values(season.id, data))
         
         db.session.add(episode)
+        adjust_stats({('episodes', ''): 1})
+        store_documents([tv_id])
+        record_change('episode_added', tv_id, serialize_episode(episode),
+                      season_number=season.season_number, episode_number=episode.episode_number)
+        bump_catalog_version()
         db.session.commit()
         
-        print(f"✅ Episode added successfully!")
+        logger.info("Episode added", extra={'media_id': tv_id, 'season_number': data['season_number'], 'episode_number': data['episode_number']})
         
         return make_cors_response({
             'status': 'success',
             'message': f'Episode S{data["season_number"]}E{data["episode_number"]} added successfully'
         })
     except Exception as e:
-        print(f"❌ Error adding episode: {e}")
+        logger.error("Error adding episode", extra={'media_id': tv_id}, exc_info=e)
         db.session.rollback()
         return make_cors_response({
             'status': 'error',
             'message': 'Failed to add episode'
         }, 500)
         
-# The rest of the API routes (search_media, health_check, get_stats, get_movie_duplicates, etc.)
-# will need similar updates to handle the new data models and fields.
-# For simplicity, I have updated the most critical ones that handle saving the new data.
+@app.route('/api/admin/tv-series/<int:tv_id>/episodes/batch', methods=['POST'])
+@auth_required
+def upsert_episode_batch(tv_id):
+    try:
+        seasons = validate_episode_batch(request.get_json(silent=True))
+    except ValidationError as e:
+        return make_cors_response({'error': str(e)}, 400)
+
+    try:
+        if db.session.query(TVSeries.id).filter(TVSeries.id == tv_id).first() is None:
+            return make_cors_response({'error': 'TV series not found'}, 404)
+
+        results = upsert_episodes(tv_id, seasons)
+        db.session.commit()
+
+        summary = {status: sum(1 for result in results if result['status'] == status)
+                   for status in ('created', 'updated', 'unchanged')}
+        logger.info("Episodes upserted", extra={'media_id': tv_id, 'episodes': summary})
+        return make_cors_response({
+            'status': 'success',
+            'summary': summary,
+            'results': results
+        })
+    except Exception as e:
+        logger.error("Error upserting episodes", extra={'media_id': tv_id}, exc_info=e)
+        db.session.rollback()
+        return make_cors_response({
+            'status': 'error',
+            'message': 'Failed to save episodes'
+        }, 500)
+
+# Of the original routes only health_check has not been ported to the new data models yet; search is /search,
+# statistics /api/stats and duplicates are under /api/admin/duplicates.
+
+# Internal endpoints
+@app.route('/internal/pool')
+@auth_required
+def get_pool_stats():
+    return make_cors_response({
+        'status': 'success',
+        'pools': {key or 'default': pool_stats(engine) for key, engine in db.engines.items()},
+        'replicas': replica_router.status(),
+        'snapshot': snapshots.status() if snapshots is not None else None
+    })
+
+@app.route('/metrics')
+@auth_required
+def get_metrics():
+    pools = {key or 'default': pool_stats(engine) for key, engine in db.engines.items()}
+    return app.response_class(metrics.render(pools), mimetype='text/plain; version=0.0.4')
+
+# Bulk import
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 100))
+IMPORT_MAX_WORKERS = int(os.environ.get('IMPORT_MAX_WORKERS', 8))
+
+def fetch_import_details(media_type, tmdb_id):
+    # Unlike fetch_movie_details/fetch_tv_details, errors propagate so the import can report them per item
+    return tmdb.movie(tmdb_id) if media_type == 'movie' else tmdb.tv(tmdb_id)
+
+@app.route('/api/admin/import', methods=['POST'])
+@auth_required
+def import_catalog():
+    try:
+        default_type = request.args.get('type')
+        if request.mimetype == 'text/csv':
+            items = parse_manifest(request.get_data(as_text=True), 'csv', default_type)
+        else:
+            items = parse_manifest(request.get_data(as_text=True), 'json', default_type)
+    except ManifestError as e:
+        return make_cors_response({'error': str(e)}, 400)
+
+    try:
+        logger.info("Importing titles", extra={'count': len(items)})
+        results = run_import(items, fetch_import_details, batch_size=IMPORT_BATCH_SIZE, max_workers=IMPORT_MAX_WORKERS)
+        summary = summarize(results)
+        logger.info("Import finished", extra=summary)
+        return make_cors_response({
+            'status': 'success',
+            'summary': summary,
+            'results': results
+        })
+    except Exception as e:
+        logger.error("Error importing catalog", exc_info=e)
+        db.session.rollback()
+        return make_cors_response({
+            'status': 'error',
+            'message': 'Failed to import catalog'
+        }, 500)
+
+# Duplicate titles (see duplicates.py)
+@app.route('/api/admin/duplicates')
+@auth_required
+def get_duplicates():
+    try:
+        groups = find_duplicates()
+        return make_cors_response({
+            'status': 'success',
+            'total_groups': len(groups),
+            'total_duplicates': sum(len(group['duplicate_ids']) for group in groups),
+            'duplicates': groups
+        })
+    except Exception as e:
+        logger.error("Error finding duplicates", exc_info=e)
+        return make_cors_response({'error': 'Failed to find duplicates'}, 500)
+
+@app.route('/api/admin/duplicates/merge', methods=['POST'])
+@auth_required
+def merge_duplicate_titles():
+    try:
+        result = merge_duplicates(dry_run=request.args.get('dry_run') == '1')
+        logger.info("Duplicates merged", extra={'titles': result['titles'], 'removed': result['removed']})
+        return make_cors_response({
+            'status': 'success',
+            'titles': result['titles'],
+            'removed': result['removed'],
+            # JSON object keys are strings: {"<duplicate id>": <kept id>}
+            'merged': {str(duplicate_id): keep_id for duplicate_id, keep_id in sorted(result['merged'].items())}
+        })
+    except Exception as e:
+        logger.error("Error merging duplicates", exc_info=e)
+        db.session.rollback()
+        return make_cors_response({'error': 'Failed to merge duplicates'}, 500)
+
+# Background jobs (see jobs.py); the worker runs as its own process, not on Vercel
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', 8))
+JOBS_BATCH_SIZE = int(os.environ.get('JOBS_BATCH_SIZE', 50))
+JOBS_RATE_LIMIT = float(os.environ.get('JOBS_RATE_LIMIT', 20))
+JOBS_RETENTION_DAYS = int(os.environ.get('JOBS_RETENTION_DAYS', 14))
+ENRICH_REFRESH_DAYS = int(os.environ.get('ENRICH_REFRESH_DAYS', 7))
+STATS_RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', 6 * 3600))
+JOBS_PAGE_SIZE = 50
+MAX_JOBS_PAGE_SIZE = 500
+
+@app.route('/api/admin/jobs')
+@auth_required
+def get_jobs():
+    status = request.args.get('status')
+    if status and status not in JOB_STATUSES:
+        return make_cors_response({'error': f"status must be one of {', '.join(JOB_STATUSES)}"}, 400)
+    try:
+        limit = min(max(int(request.args.get('limit', JOBS_PAGE_SIZE)), 1), MAX_JOBS_PAGE_SIZE)
+        cursor = request.args.get('cursor', type=int)
+        media_id = request.args.get('media_id', type=int)
+    except ValueError:
+        return make_cors_response({'error': 'limit must be an integer'}, 400)
+
+    try:
+        kind = request.args.get('kind')
+        jobs = list_jobs(status, kind, media_id, before_id=cursor, limit=limit)
+        return make_cors_response({
+            'status': 'success',
+            'counts': job_counts(kind),
+            'jobs': [serialize_job(job) for job in jobs],
+            'next_cursor': jobs[-1].id if len(jobs) == limit else None
+        })
+    except Exception as e:
+        logger.error("Error listing jobs", exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve jobs'}, 500)
+
+@app.route('/api/admin/jobs/<int:job_id>')
+@auth_required
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return make_cors_response({'error': 'Job not found'}, 404)
+    return make_cors_response({'status': 'success', 'job': serialize_job(job)})
+
+@app.route('/api/admin/jobs/<int:job_id>/retry', methods=['POST'])
+@auth_required
+def retry_job(job_id):
+    try:
+        if not retry(job_id):
+            return make_cors_response({'error': 'Only failed jobs can be retried'}, 409)
+        db.session.commit()
+        return make_cors_response({'status': 'success', 'job': serialize_job(db.session.get(Job, job_id))})
+    except Exception as e:
+        logger.error("Error retrying job", extra={'job_id': job_id}, exc_info=e)
+        db.session.rollback()
+        return make_cors_response({'error': 'Failed to retry job'}, 500)
+
+@app.route('/api/admin/jobs/enrich', methods=['POST'])
+@auth_required
+def enrich_titles():
+    # {"media_ids": [...]} enriches those titles, an empty body the whole catalog
+    data = request.get_json(silent=True) or {}
+    media_ids = data.get('media_ids') if isinstance(data, dict) else None
+    if media_ids is not None and (not isinstance(media_ids, list)
+                                  or not all(isinstance(i, int) and not isinstance(i, bool) for i in media_ids)):
+        return make_cors_response({'error': 'media_ids must be a list of integers'}, 400)
+
+    try:
+        queued = enqueue(ENRICH_JOB, media_ids)
+        db.session.commit()
+        logger.info("Enrichment queued", extra={'queued': queued})
+        return make_cors_response({'status': 'success', 'queued': queued}, 202)
+    except Exception as e:
+        logger.error("Error queueing enrichment", exc_info=e)
+        db.session.rollback()
+        return make_cors_response({'error': 'Failed to queue enrichment'}, 500)
+
+# Stream/download link health (see link_check.py); sweeps run from `flask links-check`, e.g. nightly
+LINK_CHECK_CONCURRENCY = int(os.environ.get('LINK_CHECK_CONCURRENCY', 32))
+LINK_CHECK_PER_HOST = int(os.environ.get('LINK_CHECK_PER_HOST', 4))
+LINK_CHECK_DELAY = float(os.environ.get('LINK_CHECK_DELAY', 0.05))
+LINK_CHECK_TIMEOUT = float(os.environ.get('LINK_CHECK_TIMEOUT', 10))
+LINK_CHECK_SLOW_MS = int(os.environ.get('LINK_CHECK_SLOW_MS', 3000))
+LINK_CHECK_MAX_AGE_HOURS = float(os.environ.get('LINK_CHECK_MAX_AGE_HOURS', 24))
+
+@app.route('/api/admin/links')
+@auth_required
+def get_link_checks():
+    # ?status=broken,slow lists the links that need attention
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    if any(status not in LINK_STATUSES for status in statuses):
+        return make_cors_response({'error': f"status must be one of {', '.join(LINK_STATUSES)}"}, 400)
+    try:
+        limit = min(max(int(request.args.get('limit', JOBS_PAGE_SIZE)), 1), MAX_JOBS_PAGE_SIZE)
+        cursor = request.args.get('cursor', type=int)
+        media_id = request.args.get('media_id', type=int)
+    except ValueError:
+        return make_cors_response({'error': 'limit must be an integer'}, 400)
+
+    try:
+        links = list_link_checks(statuses, media_id, request.args.get('host'), before_id=cursor, limit=limit)
+        return make_cors_response({
+            'status': 'success',
+            'counts': link_check_counts(media_id),
+            'broken_hosts': broken_hosts(),
+            'links': [serialize_link_check(link) for link in links],
+            'next_cursor': links[-1].id if len(links) == limit else None
+        })
+    except Exception as e:
+        logger.error("Error listing link checks", exc_info=e)
+        return make_cors_response({'error': 'Failed to retrieve link checks'}, 500)
+
+@app.cli.command('jobs-worker')
+@click.option('--concurrency', default=JOBS_CONCURRENCY, show_default=True, help='TMDB lookups in flight.')
+@click.option('--rate-limit', default=JOBS_RATE_LIMIT, show_default=True, help='TMDB lookups started per second.')
+@click.option('--batch-size', default=JOBS_BATCH_SIZE, show_default=True, help='Jobs claimed (and committed) at once.')
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds to wait when no job is due.')
+@click.option('--refresh-after-days', default=ENRICH_REFRESH_DAYS, show_default=True,
+              help='Queue enrichment for titles not refreshed for this long.')
+@click.option('--refresh-interval', default=3600, show_default=True, help='Seconds between refresh scans.')
+@click.option('--stats-interval', default=STATS_RECONCILE_INTERVAL, show_default=True,
+              help='Seconds between recounts of the /api/stats counters.')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of polling.')
+def jobs_worker_command(concurrency, rate_limit, batch_size, poll_interval, refresh_after_days, refresh_interval,
+                        stats_interval, once):
+    """Run queued jobs: enrich titles from TMDB, periodically queue refreshes and recount stats."""
+    def queue_refresh():
+        queued = schedule_refresh(refresh_after_days)
+        if queued:
+            logger.info("Refresh queued", extra={'queued': queued})
+        prune_jobs(JOBS_RETENTION_DAYS)
+
+    def recount_stats():
+        drift = reconcile_stats()
+        if drift:
+            logger.warning("Stats counters drifted", extra={'drift': drift})
+
+    worker = Worker(app, {ENRICH_JOB: EnrichmentHandler(tmdb)}, concurrency=concurrency, batch_size=batch_size,
+                    poll_interval=poll_interval, rate_limit=rate_limit or None,
+                    periodic=[(refresh_interval, queue_refresh), (stats_interval, recount_stats)])
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    stats = worker.run(once=once)
+    click.echo(f"✅ Worker stopped: {stats}")
+
+@app.cli.command('links-check')
+@click.option('--concurrency', default=LINK_CHECK_CONCURRENCY, show_default=True, help='Requests in flight.')
+@click.option('--per-host', default=LINK_CHECK_PER_HOST, show_default=True, help='Requests in flight per host.')
+@click.option('--delay', default=LINK_CHECK_DELAY, show_default=True,
+              help='Seconds between the starts of two requests to the same host.')
+@click.option('--timeout', default=LINK_CHECK_TIMEOUT, show_default=True, help='Seconds before a link counts as broken.')
+@click.option('--slow-ms', default=LINK_CHECK_SLOW_MS, show_default=True, help='Answers slower than this count as slow.')
+@click.option('--max-age-hours', default=LINK_CHECK_MAX_AGE_HOURS, show_default=True,
+              help='Skip links checked more recently than this; 0 checks every link.')
+@click.option('--media-id', 'media_ids', type=int, multiple=True, help='Only check these titles (repeatable).')
+def links_check_command(concurrency, per_host, delay, timeout, slow_ms, max_age_hours, media_ids):
+    """Check every stream and download link and record status, latency and size. Safe to re-run after a crash."""
+    checker = LinkChecker(timeout=timeout, slow_ms=slow_ms, per_host=per_host, delay=delay)
+    started = time.perf_counter()
+
+    def progress(summary):
+        click.echo(f"{summary['checked']} checked, {summary['skipped']} skipped "
+                   f"({summary['broken']} broken, {summary['slow']} slow)")
+
+    summary = check_links(checker, media_ids=list(media_ids) or None,
+                          max_age=timedelta(hours=max_age_hours) if max_age_hours else None,
+                          concurrency=concurrency, progress=progress)
+    logger.info("Links checked", extra=dict(summary, seconds=round(time.perf_counter() - started, 1)))
+    click.echo(f"✅ Links checked: {summary}")
+
+@app.cli.command('import-catalog')
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option('--ids', help='Comma-separated TMDB ids instead of a manifest file.')
+@click.option('--type', 'media_type', type=click.Choice(MEDIA_TYPES), help='Type for entries that do not specify one.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option('--workers', default=IMPORT_MAX_WORKERS, show_default=True)
+@click.option('--report', type=click.Path(dir_okay=False), help='Write per-item results as JSON to this file.')
+def import_catalog_command(manifest, ids, media_type, batch_size, workers, report):
+    """Import titles from a JSON/CSV manifest or a list of TMDB ids. Safe to re-run after a crash."""
+    try:
+        if ids:
+            items = parse_manifest(json.dumps([i.strip() for i in ids.split(',') if i.strip()]), 'json', media_type)
+        elif manifest:
+            with open(manifest, encoding='utf-8') as f:
+                items = parse_manifest(f.read(), 'csv' if manifest.lower().endswith('.csv') else 'json', media_type)
+        else:
+            raise click.UsageError('Pass a manifest file or --ids')
+    except ManifestError as e:
+        raise click.UsageError(str(e))
+
+    def progress(result):
+        if result['status'] == 'failed':
+            click.echo(f"❌ {result['type']} {result['tmdb_id']}: {result['error']}")
+
+    results = run_import(items, fetch_import_details, batch_size=batch_size, max_workers=workers, progress=progress)
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    click.echo(f"✅ Import finished: {summarize(results)}")
+
+@app.cli.command('search-reindex')
+def search_reindex_command():
+    """Rebuild the full-text search index from the catalog tables."""
+    total = reindex_all()
+    click.echo(f"✅ Search index rebuilt for {total} titles")
+
+@app.cli.command('build-pages')
+@click.option('--output', default=PAGES_BUILD_DIR, show_default=True, type=click.Path(file_okay=False))
+def build_pages_command(output):
+    """Render, minify and precompress the HTML pages for deployment."""
+    for template, sizes in build_pages(output, compressor):
+        click.echo(f"{template}: " + ', '.join(f"{encoding} {size} bytes" for encoding, size in sizes.items()))
+    click.echo(f"✅ Pages written to {output}")
+
+@app.cli.command('duplicates-merge')
+@click.option('--dry-run', is_flag=True, help='Only list the duplicates that would be merged.')
+def duplicates_merge_command(dry_run):
+    """Merge titles added more than once into their oldest copy (needed before migration 5)."""
+    for group in find_duplicates():
+        click.echo(f"{group['type']} {group['tmdb_id']}: keep {group['keep_id']}, "
+                   f"merge {', '.join(str(media_id) for media_id in group['duplicate_ids'])}")
+    if dry_run:
+        return
+    result = merge_duplicates()
+    click.echo(f"✅ Merged {result['removed']} duplicate(s) into {result['titles']} title(s)")
+
+@app.cli.command('snapshot-build')
+@click.option('--output', default=CATALOG_SNAPSHOT_BUILD_DIR, show_default=True, type=click.Path(file_okay=False),
+              help='Directory to write the snapshot to.')
+def snapshot_build_command(output):
+    """Write the catalog snapshot for snapshot mode, e.g. into the deployment before it is uploaded."""
+    # Read first: documents written during the build are newer than the label, never older
+    version = primary_catalog_version()
+    os.makedirs(output, exist_ok=True)
+    result = write_snapshot(os.path.join(output, snapshot_filename(version)), version)
+    remove_older_snapshots(output, version)
+    click.echo(f"✅ Snapshot of catalog version {version}: {result['titles']} titles, {result['bytes']} bytes")
+
+@app.cli.command('stats-reconcile')
+def stats_reconcile_command():
+    """Recount the /api/stats counters from the catalog tables."""
+    drift = reconcile_stats()
+    for key, difference in sorted(drift.items()):
+        click.echo(f"{key}: off by {difference:+g}")
+    click.echo(f"✅ Stats reconciled ({len(drift)} counter(s) corrected)")
+
+@app.cli.command('documents-rebuild')
+def documents_rebuild_command():
+    """Re-encode the stored JSON document of every title."""
+    total = rebuild_documents()
+    click.echo(f"✅ Documents rebuilt for {total} titles")
+
+@app.cli.command('changes-compact')
+@click.option('--days', default=CHANGES_RETENTION_DAYS, show_default=True, help='Keep entries newer than this.')
+def changes_compact_command(days):
+    """Delete change feed entries older than the retention window."""
+    removed = compact_changes(days)
+    click.echo(f"✅ Removed {removed} change feed entries older than {days} days")
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    applied = run_migrations(db.engine)
+    click.echo(f"✅ Applied {len(applied)} migration(s)" if applied else "✅ Schema is up to date")
+
+@app.cli.command('db-status')
+def db_status_command():
+    """List schema migrations that have not been applied yet."""
+    pending = pending_migrations(db.engine)
+    for version, name in pending:
+        click.echo(f"pending {version}: {name}")
+    if not pending:
+        click.echo("✅ Schema is up to date")
 
-# Initialize database on startup
-init_db()
+# Schema setup is an explicit step (flask db-upgrade) so cold starts do not pay for it;
+# AUTO_MIGRATE=1 runs pending migrations at import time instead
+if os.environ.get('AUTO_MIGRATE') == '1':
+    init_db()
 
 # For Vercel deployment
 if __name__ != '__main__':
     application = app
 else:
+    init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,256 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request timing and process metrics.
+#
+# Each request carries a RequestTimings in flask.g. SQL statements are timed
+# by engine-wide cursor events, serialization, compression and TMDB lookups
+# by wrapping those steps in timed(). The breakdown is returned to the client as a
+# Server-Timing header, aggregated into Prometheus metrics for /metrics, and
+# logged with the access log line. Requests can optionally be sampled by a
+# stack profiler whose output is kept when they turn out to be slow.
+#
+# Metrics are per process: on serverless every instance reports its own.
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ('db', 'serialize', 'compress', 'tmdb')
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_sql_hooks_installed = False
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(COMPONENTS, 0.0)
+        self.counts = dict.fromkeys(COMPONENTS, 0)
+
+    def add(self, component, seconds):
+        self.seconds[component] += seconds
+        self.counts[component] += 1
+
+    def server_timing(self, total_seconds):
+        parts = [f'db;dur={self.seconds["db"] * 1000:.2f};desc="{self.counts["db"]} queries"']
+        for component in COMPONENTS[1:]:
+            if self.counts[component]:
+                parts.append(f'{component};dur={self.seconds[component] * 1000:.2f}')
+        parts.append(f'total;dur={total_seconds * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def current_timings():
+    return g.get('timings') if has_request_context() else None
+
+
+@contextmanager
+def timed(component):
+    """Add the time spent in the block to ``component`` of the current request, if any."""
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(component, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    started = getattr(context, 'instrumentation_started', None)
+    if timings is not None and started is not None:
+        timings.add('db', time.perf_counter() - started)
+
+
+def install_sql_hooks():
+    """Time every statement of every engine, including binds created later."""
+    global _sql_hooks_installed
+    if not _sql_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _sql_hooks_installed = True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """Request counters and latency histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.histograms = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.duration_sums = Counter()
+        self.component_seconds = Counter()
+        self.component_counts = Counter()
+
+    def observe(self, method, endpoint, status, duration, timings):
+        with self._lock:
+            self.requests[(method, endpoint, status)] += 1
+            histogram = self.histograms[endpoint]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[index] += 1
+            histogram[-1] += 1
+            self.duration_sums[endpoint] += duration
+            for component in COMPONENTS:
+                self.component_seconds[(endpoint, component)] += timings.seconds[component]
+                self.component_counts[(endpoint, component)] += timings.counts[component]
+
+    def render(self, pools=None):
+        """Exposition text; ``pools`` is ``{bind: pool_stats(...)}`` to include pool gauges."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        with self._lock:
+            metric('http_requests_total', 'counter', 'Requests handled, by endpoint and status.', [
+                f'http_requests_total{_labels(method=m, endpoint=e, status=s)} {n}'
+                for (m, e, s), n in sorted(self.requests.items())
+            ])
+            samples = []
+            for endpoint, histogram in sorted(self.histograms.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    samples.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+                samples.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {histogram[-1]}')
+                samples.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {self.duration_sums[endpoint]:.6f}')
+                samples.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram[-1]}')
+            metric('http_request_duration_seconds', 'histogram', 'Time from routing to response.', samples)
+            metric('request_component_seconds_total', 'counter',
+                   'Time spent in SQL, serialization, compression and TMDB calls.', [
+                f'request_component_seconds_total{_labels(endpoint=e, component=c)} {seconds:.6f}'
+                for (e, c), seconds in sorted(self.component_seconds.items())
+            ])
+            metric('request_component_calls_total', 'counter',
+                   'SQL statements, serializations, compressions and TMDB calls.', [
+                f'request_component_calls_total{_labels(endpoint=e, component=c)} {n}'
+                for (e, c), n in sorted(self.component_counts.items())
+            ])
+
+        if pools:
+            metric('db_pool_checked_out', 'gauge', 'Connections currently checked out.', [
+                f'db_pool_checked_out{_labels(bind=bind)} {stats.get("checked_out", 0)}' for bind, stats in pools.items()
+            ])
+            metric('db_pool_checkouts_total', 'counter', 'Connection checkouts.', [
+                f'db_pool_checkouts_total{_labels(bind=bind)} {stats.get("checkouts", 0)}' for bind, stats in pools.items()
+            ])
+            metric('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', [
+                f'db_pool_wait_seconds_total{_labels(bind=bind)} {stats.get("wait_ms_total", 0) / 1000:.6f}'
+                for bind, stats in pools.items()
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread every ``interval`` seconds into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def dump(self, path):
+        # One "frame;frame;frame count" line per stack, the input format of flamegraph.pl and speedscope
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def init_instrumentation(app, registry, slow_request_ms=1000, profile_sample_rate=0.0, profile_dir=None):
+    """Register the timing hooks on ``app``.
+
+    With ``profile_sample_rate`` > 0 that share of requests is stack-sampled;
+    the samples of those slower than ``slow_request_ms`` are written to
+    ``profile_dir``.
+    """
+    install_sql_hooks()
+
+    @app.before_request
+    def start_request_timing():
+        g.timings = RequestTimings()
+        if profile_sample_rate and random.random() < profile_sample_rate:
+            g.sampler = StackSampler(threading.get_ident())
+            g.sampler.start()
+
+    @app.after_request
+    def finish_request_timing(response):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return response
+        duration = time.perf_counter() - timings.started
+        endpoint = request.endpoint or 'unmatched'
+        response.headers['Server-Timing'] = timings.server_timing(duration)
+        registry.observe(request.method, endpoint, response.status_code, duration, timings)
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_ms': round(timings.seconds['db'] * 1000, 2),
+            'db_statements': timings.counts['db'],
+            'serialize_ms': round(timings.seconds['serialize'] * 1000, 2),
+            'compress_ms': round(timings.seconds['compress'] * 1000, 2),
+            'tmdb_ms': round(timings.seconds['tmdb'] * 1000, 2),
+        }
+        slow = duration * 1000 >= slow_request_ms
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            if slow and profile_dir:
+                os.makedirs(profile_dir, exist_ok=True)
+                fields['profile'] = os.path.join(profile_dir, f'{int(time.time() * 1000)}-{endpoint}.folded')
+                sampler.dump(fields['profile'])
+        logger.log(logging.WARNING if slow else logging.INFO, 'slow request' if slow else 'request', extra=fields)
+        return response
+
+    @app.teardown_request
+    def stop_sampler(exc):
+        # Requests that never reached after_request must not leave a sampler thread behind
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
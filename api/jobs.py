@@ -0,0 +1,313 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, insert, literal, or_, select, update
+
+from models import db, Job, MediaTable
+
+# Database-backed job queue.
+#
+# Jobs are rows in the jobs table, so queueing work is part of the same
+# transaction as whatever asked for it and nothing beyond the database has to
+# run. A worker claims a batch by flipping queued rows to running in one
+# UPDATE ... RETURNING (with FOR UPDATE SKIP LOCKED on Postgres, so several
+# workers never claim the same row). A running job whose lease expired -- its
+# worker died -- is claimed again. Failures are retried with exponential
+# backoff until max_attempts, then the job stays failed for an admin to look
+# at or retry.
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for failures retrying cannot fix; the job fails without further attempts."""
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(kind, media_ids=None, max_attempts=5, chunk_size=500):
+    """Queue a ``kind`` job per title (every title if ``media_ids`` is None). Returns the number queued.
+
+    Titles that already have a queued or running job of that kind are
+    skipped, so asking twice does not double the work. Runs inside the
+    caller's transaction.
+    """
+    now = datetime.utcnow()
+    pending = select(Job.id).where(
+        Job.kind == kind, Job.media_id == MediaTable.id, Job.status.in_(('queued', 'running'))
+    ).exists()
+
+    def queue(ids):
+        query = select(
+            literal(kind), MediaTable.id, literal('queued'), literal(0), literal(max_attempts), literal(now), literal(now)
+        ).where(~pending).order_by(MediaTable.id)
+        if ids is not None:
+            query = query.where(MediaTable.id.in_(ids))
+        return db.session.execute(insert(Job).from_select(
+            ['kind', 'media_id', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at'], query
+        )).rowcount
+
+    if media_ids is None:
+        return queue(None)
+    media_ids = list(media_ids)
+    return sum(queue(media_ids[start:start + chunk_size]) for start in range(0, len(media_ids), chunk_size))
+
+
+def claim(kinds, worker, limit, lease_seconds):
+    """Mark up to ``limit`` due jobs of ``kinds`` as running for ``worker`` and commit. Returns the claimed rows."""
+    now = datetime.utcnow()
+    due = select(Job.id).where(Job.kind.in_(kinds), or_(
+        and_(Job.status == 'queued', Job.run_after <= now),
+        and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=lease_seconds)),
+    )).order_by(Job.run_after, Job.id).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+    rows = db.session.execute(
+        update(Job).where(Job.id.in_(due.scalar_subquery()))
+        .values(status='running', locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.media_id, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def complete(job, result=None):
+    """Mark ``job`` succeeded inside the caller's transaction."""
+    now = datetime.utcnow()
+    db.session.execute(update(Job).where(Job.id == job.id).values(
+        status='succeeded', locked_by=None, locked_at=None, last_error=None,
+        result=json.dumps(result) if result is not None else None, finished_at=now
+    ).execution_options(synchronize_session=False))
+
+
+def fail(job, error, retry_base_seconds=60, permanent=False):
+    """Requeue ``job`` after a backoff, or mark it failed once it has used all its attempts."""
+    now = datetime.utcnow()
+    values = {'locked_by': None, 'locked_at': None, 'last_error': str(error)[:2000]}
+    if permanent or job.attempts >= job.max_attempts:
+        values.update(status='failed', finished_at=now)
+    else:
+        delay = retry_base_seconds * 2 ** (job.attempts - 1)
+        values.update(status='queued', run_after=now + timedelta(seconds=delay))
+    db.session.execute(update(Job).where(Job.id == job.id).values(**values)
+                       .execution_options(synchronize_session=False))
+    return values['status']
+
+
+def retry(job_id):
+    """Queue a failed job again with a fresh set of attempts. Returns False if it is not failed."""
+    now = datetime.utcnow()
+    return db.session.execute(update(Job).where(Job.id == job_id, Job.status == 'failed').values(
+        status='queued', attempts=0, run_after=now, finished_at=None
+    ).execution_options(synchronize_session=False)).rowcount > 0
+
+
+def job_counts(kind=None):
+    """``{status: count}`` with every status present."""
+    query = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status)
+    if kind:
+        query = query.filter(Job.kind == kind)
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    counts.update(dict(query.all()))
+    return counts
+
+
+def list_jobs(status=None, kind=None, media_id=None, before_id=None, limit=50):
+    """Jobs newest first, filtered; ``before_id`` pages backwards through the ids."""
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    if kind:
+        query = query.filter(Job.kind == kind)
+    if media_id is not None:
+        query = query.filter(Job.media_id == media_id)
+    if before_id is not None:
+        query = query.filter(Job.id < before_id)
+    return query.order_by(Job.id.desc()).limit(limit).all()
+
+
+def prune_jobs(retention_days):
+    """Delete finished jobs older than ``retention_days`` and commit. Returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = Job.query.filter(
+        Job.status.in_(('succeeded', 'failed')), Job.finished_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def _isoformat(value):
+    return value.isoformat() + 'Z' if value is not None else None
+
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'media_id': job.media_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': _isoformat(job.run_after),
+        'locked_by': job.locked_by,
+        'last_error': job.last_error,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': _isoformat(job.created_at),
+        'finished_at': _isoformat(job.finished_at),
+    }
+
+
+class Worker:
+    """Claims jobs in batches and runs them on an asyncio loop.
+
+    ``handlers`` maps a job kind to an object with three methods:
+
+    - ``load(jobs)`` reads what the batch needs from the database and returns
+      ``{job_id: context}``;
+    - ``fetch(context)`` does the slow part (network calls). It runs in a
+      thread, up to ``concurrency`` at a time and at most ``rate_limit`` starts
+      per second, and must not touch the database session;
+    - ``apply(items)`` writes the results of ``[(job, context, fetched)]`` in
+      the caller's transaction and returns ``{job_id: result}``.
+
+    Everything that touches the database runs on the loop's thread, one batch
+    per transaction. ``periodic`` is a list of ``(seconds, callable)`` run in
+    the app context whenever that much time has passed, e.g. to queue refreshes.
+    """
+
+    def __init__(self, app, handlers, concurrency=8, batch_size=50, poll_interval=5.0, lease_seconds=600,
+                 retry_base_seconds=60, rate_limit=None, periodic=()):
+        self.app = app
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.rate_limit = rate_limit
+        self.periodic = [[interval, task, 0.0] for interval, task in periodic]
+        self.name = worker_name()
+        self.stats = {'succeeded': 0, 'retried': 0, 'failed': 0}
+        self._stopping = False
+
+    def stop(self):
+        self._stopping = True
+
+    def run(self, once=False):
+        """Process jobs until stopped; with ``once`` return as soon as nothing is due."""
+        asyncio.run(self._run(once))
+        return self.stats
+
+    async def _run(self, once):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._throttle_lock = asyncio.Lock()
+        self._next_start = 0.0
+        while not self._stopping:
+            self._run_periodic()
+            with self.app.app_context():
+                jobs = claim(list(self.handlers), self.name, self.batch_size, self.lease_seconds)
+                if jobs:
+                    await self._process(jobs)
+                db.session.remove()
+            if not jobs:
+                if once:
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+    def _run_periodic(self):
+        now = time.monotonic()
+        for entry in self.periodic:
+            interval, task, last_run = entry
+            if last_run and now - last_run < interval:
+                continue
+            entry[2] = now
+            with self.app.app_context():
+                try:
+                    task()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Periodic job task failed", extra={'task': getattr(task, '__name__', str(task))},
+                                 exc_info=e)
+                finally:
+                    db.session.remove()
+
+    async def _throttle(self):
+        if not self.rate_limit:
+            return
+        async with self._throttle_lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1 / self.rate_limit
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _fetch(self, handler, job, context):
+        async with self._semaphore:
+            await self._throttle()
+            try:
+                return job, context, await asyncio.to_thread(handler.fetch, context), None
+            except Exception as e:
+                return job, context, None, e
+
+    async def _process(self, jobs):
+        by_kind = {}
+        for job in jobs:
+            by_kind.setdefault(job.kind, []).append(job)
+        for kind, kind_jobs in by_kind.items():
+            handler = self.handlers[kind]
+            try:
+                contexts = handler.load(kind_jobs)
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Loading job batch failed", extra={'kind': kind, 'jobs': len(kind_jobs)}, exc_info=e)
+                for job in kind_jobs:
+                    self._fail(job, e)
+                db.session.commit()
+                continue
+            outcomes = await asyncio.gather(*(self._fetch(handler, job, contexts[job.id]) for job in kind_jobs))
+            fetched = []
+            for job, context, result, error in outcomes:
+                if error is None:
+                    fetched.append((job, context, result))
+                else:
+                    self._fail(job, error)
+            db.session.commit()
+            self._apply(handler, fetched)
+
+    def _apply(self, handler, items):
+        if not items:
+            return
+        try:
+            results = handler.apply(items)
+            for job, _, _ in items:
+                complete(job, results.get(job.id))
+            db.session.commit()
+            self.stats['succeeded'] += len(items)
+            return
+        except Exception as e:
+            db.session.rollback()
+            if len(items) == 1:
+                self._fail(items[0][0], e)
+                db.session.commit()
+                return
+            logger.warning("Job batch failed, retrying jobs individually", exc_info=e)
+        for item in items:
+            self._apply(handler, [item])
+
+    def _fail(self, job, error):
+        status = fail(job, error, self.retry_base_seconds, permanent=isinstance(error, PermanentJobError))
+        self.stats['failed' if status == 'failed' else 'retried'] += 1
+        log = logger.warning if status == 'failed' else logger.info
+        log("Job failed" if status == 'failed' else "Job will be retried",
+            extra={'job_id': job.id, 'kind': job.kind, 'media_id': job.media_id, 'attempts': job.attempts,
+                   'error': str(error)})
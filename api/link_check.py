@@ -0,0 +1,326 @@
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, func, select
+
+from models import db, dialect_insert, Movie, Season, Episode, LinkCheck
+
+# Stream and download link health checks.
+#
+# Movies and episodes carry up to six URLs each, all pointing at servers we do
+# not run, so dead links used to be found by users. check_links sweeps them in
+# keyset-ordered chunks of movies and episodes and requests every link that
+# was never checked, changed since, or was last checked more than max_age ago:
+# a HEAD request, or a one-byte Range GET for servers that refuse HEAD, from a
+# thread pool. At most per_host requests are in flight per host, started at
+# least delay seconds apart, so a slow CDN neither stalls the sweep nor gets
+# hammered by it. The last result of each link is a row in link_check, written
+# and committed per chunk, so an interrupted sweep picks up where it stopped.
+
+LINK_FIELDS = ('video_720p', 'video_1080p', 'video_2160p', 'download_720p', 'download_1080p', 'download_2160p')
+LINK_STATUSES = ('ok', 'slow', 'broken')
+OWNER_TYPES = ('movie', 'episode')
+# Answers about the server rather than the link: wait as asked and try once more
+RETRY_STATUSES = (429, 503)
+# Servers that refuse HEAD, e.g. URLs signed for GET only
+HEAD_REFUSED = (403, 405, 501)
+
+
+def link_host(url):
+    try:
+        return urlsplit(url).hostname or ''
+    except ValueError:
+        return ''
+
+
+def _content_length(response):
+    # A Range answer carries the full size after the slash of Content-Range
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    if total.isdigit():
+        return int(total)
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() and response.status_code != 206 else None
+
+
+class _Host:
+    def __init__(self, per_host):
+        self.semaphore = threading.BoundedSemaphore(per_host)
+        self.next_start = 0.0
+
+
+class LinkChecker:
+    """Checks URLs over one pooled requests.Session; ``check`` is safe to call from many threads."""
+
+    def __init__(self, timeout=10, slow_ms=3000, per_host=4, delay=0.0, max_retry_after=10, host_pools=64):
+        self.timeout = timeout
+        self.slow_ms = slow_ms
+        self.per_host = per_host
+        self.delay = delay
+        self.max_retry_after = max_retry_after
+        self.host_pools = host_pools
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    # Keep-alive connections per host, never more than the requests allowed in flight to it
+                    adapter = HTTPAdapter(pool_connections=self.host_pools, pool_maxsize=self.per_host)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    @contextmanager
+    def _slot(self, host):
+        with self._hosts_lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _Host(self.per_host)
+        with state.semaphore:
+            if self.delay:
+                with self._hosts_lock:
+                    now = time.monotonic()
+                    start = max(now, state.next_start)
+                    state.next_start = start + self.delay
+                if start > now:
+                    time.sleep(start - now)
+            yield
+
+    def _retry_delay(self, response):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_after)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0),
+                               self.max_retry_after)
+                except (TypeError, ValueError):
+                    pass
+        return 1
+
+    def _request(self, url):
+        response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        response.close()
+        if response.status_code in HEAD_REFUSED:
+            # stream=True: only the headers are read, never a body the server sends despite the Range
+            response = self.session.get(url, timeout=self.timeout, allow_redirects=True, stream=True,
+                                        headers={'Range': 'bytes=0-0'})
+            response.close()
+        return response
+
+    def check(self, url):
+        """``{status, http_status, latency_ms, content_length, error, checked_at}`` of one URL."""
+        from requests import RequestException
+
+        result = {'status': 'broken', 'http_status': None, 'latency_ms': None, 'content_length': None, 'error': None}
+        for attempt in range(2):
+            with self._slot(link_host(url)):
+                started = time.perf_counter()
+                try:
+                    response = self._request(url)
+                except (RequestException, ValueError) as e:
+                    result['error'] = f"{type(e).__name__}: {e}"[:500]
+                    response = None
+                result['latency_ms'] = round((time.perf_counter() - started) * 1000)
+            if response is None or response.status_code not in RETRY_STATUSES or attempt:
+                break
+            time.sleep(self._retry_delay(response))
+
+        result['checked_at'] = datetime.utcnow()
+        if response is None:
+            return result
+        result['http_status'] = response.status_code
+        if response.status_code >= 400:
+            result['error'] = f"HTTP {response.status_code}"
+        else:
+            result['content_length'] = _content_length(response)
+            result['status'] = 'slow' if result['latency_ms'] > self.slow_ms else 'ok'
+        return result
+
+
+def _owner_query(owner_type, media_ids):
+    if owner_type == 'movie':
+        table = Movie.__table__
+        owner_id, media_id = table.c.id, table.c.id
+        query = select(owner_id, media_id, *(table.c[field] for field in LINK_FIELDS))
+    else:
+        table, season = Episode.__table__, Season.__table__
+        owner_id, media_id = table.c.id, season.c.tv_series_id
+        query = select(owner_id, media_id, *(table.c[field] for field in LINK_FIELDS)) \
+            .join(season, season.c.id == table.c.season_id)
+    if media_ids is not None:
+        query = query.where(media_id.in_(media_ids))
+    return query, owner_id
+
+
+def _owner_chunks(owner_type, media_ids, chunk_size):
+    """Yield ``(lower, upper, links)`` for the owners with ids in ``(lower, upper]``, in id order.
+
+    ``links`` are ``(owner_id, media_id, field, url)`` tuples.
+    """
+    query, owner_id = _owner_query(owner_type, media_ids)
+    lower = 0
+    while True:
+        rows = db.session.execute(query.where(owner_id > lower).order_by(owner_id).limit(chunk_size)).all()
+        if not rows:
+            return
+        links = [(row[0], row[1], field, url.strip())
+                 for row in rows for field, url in zip(LINK_FIELDS, row[2:]) if url and url.strip()]
+        upper = rows[-1][0]
+        yield lower, upper, links
+        lower = upper
+
+
+def _due_links(owner_type, lower, upper, links, media_ids, cutoff, summary):
+    """Delete the results of links no longer stored for owners in ``(lower, upper]``; return the links to check."""
+    query = select(LinkCheck.id, LinkCheck.owner_id, LinkCheck.field, LinkCheck.media_id, LinkCheck.url,
+                   LinkCheck.checked_at) \
+        .where(LinkCheck.owner_type == owner_type, LinkCheck.owner_id > lower, LinkCheck.owner_id <= upper)
+    if media_ids is not None:
+        query = query.where(LinkCheck.media_id.in_(media_ids))
+    checked = {(row.owner_id, row.field): row for row in db.session.execute(query)}
+    due = []
+    for link in links:
+        owner_id, media_id, field, url = link
+        row = checked.pop((owner_id, field), None)
+        if row is None or row.url != url or row.media_id != media_id or cutoff is None or row.checked_at < cutoff:
+            due.append(link)
+        else:
+            summary['skipped'] += 1
+    if checked:
+        db.session.execute(delete(LinkCheck).where(LinkCheck.id.in_([row.id for row in checked.values()])))
+        summary['removed'] += len(checked)
+    return due
+
+
+def _interleave_hosts(links):
+    # Round-robin over hosts, so the pool's threads spread over every host
+    # instead of queueing behind one host's per_host limit
+    by_host = defaultdict(deque)
+    for link in links:
+        by_host[link_host(link[3])].append(link)
+    queues, ordered = list(by_host.values()), []
+    while queues:
+        ordered.extend(queue.popleft() for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+
+def _store(owner_type, checks, summary):
+    rows = []
+    for (owner_id, media_id, field, url), future in checks:
+        result = future.result()
+        rows.append(dict(result, owner_type=owner_type, owner_id=owner_id, field=field, media_id=media_id,
+                         url=url, host=link_host(url)[:255] or None))
+        summary[result['status']] += 1
+    if rows:
+        table = LinkCheck.__table__
+        statement = dialect_insert(table)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['owner_type', 'owner_id', 'field'],
+            set_={column: statement.excluded[column] for column in rows[0]
+                  if column not in ('owner_type', 'owner_id', 'field')}
+        ), rows)
+    db.session.commit()
+    summary['checked'] += len(rows)
+
+
+def check_links(checker, media_ids=None, max_age=None, concurrency=32, chunk_size=500, progress=None):
+    """Check the catalog's stream and download links with ``checker`` and store the results.
+
+    Links already checked less than ``max_age`` (a timedelta; None checks
+    everything) ago with the same URL are skipped. ``media_ids`` limits the
+    sweep to those titles. Results of links that are gone are deleted.
+    Commits per chunk of ``chunk_size`` movies or episodes and calls
+    ``progress(summary)`` after each. Returns the summary:
+    ``{checked, skipped, removed, ok, slow, broken}``.
+    """
+    summary = dict.fromkeys(('checked', 'skipped', 'removed') + LINK_STATUSES, 0)
+    cutoff = datetime.utcnow() - max_age if max_age is not None else None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for owner_type in OWNER_TYPES:
+            in_flight, upper = deque(), 0
+            for lower, upper, links in _owner_chunks(owner_type, media_ids, chunk_size):
+                due = _due_links(owner_type, lower, upper, links, media_ids, cutoff, summary)
+                in_flight.append([(link, pool.submit(checker.check, link[3])) for link in _interleave_hosts(due)])
+                # The next chunk's checks keep the pool busy while the oldest chunk's slowest links finish
+                while len(in_flight) > 1:
+                    _store(owner_type, in_flight.popleft(), summary)
+                    if progress:
+                        progress(summary)
+            while in_flight:
+                _store(owner_type, in_flight.popleft(), summary)
+                if progress:
+                    progress(summary)
+            # Owners past the last one still stored were deleted
+            stale = delete(LinkCheck).where(LinkCheck.owner_type == owner_type, LinkCheck.owner_id > upper)
+            if media_ids is not None:
+                stale = stale.where(LinkCheck.media_id.in_(media_ids))
+            summary['removed'] += db.session.execute(stale).rowcount
+            db.session.commit()
+    return summary
+
+
+def link_check_counts(media_id=None):
+    """``{status: count}`` with every status present."""
+    query = db.session.query(LinkCheck.status, func.count(LinkCheck.id)).group_by(LinkCheck.status)
+    if media_id is not None:
+        query = query.filter(LinkCheck.media_id == media_id)
+    counts = dict.fromkeys(LINK_STATUSES, 0)
+    counts.update(dict(query.all()))
+    return counts
+
+
+def broken_hosts(limit=10):
+    """Hosts with the most broken links, as ``[{host, broken}]``; a dead CDN shows up first."""
+    return [{'host': host, 'broken': count} for host, count in db.session.query(
+        LinkCheck.host, func.count(LinkCheck.id)
+    ).filter(LinkCheck.status == 'broken').group_by(LinkCheck.host)
+        .order_by(func.count(LinkCheck.id).desc(), LinkCheck.host).limit(limit)]
+
+
+def list_link_checks(statuses=None, media_id=None, host=None, before_id=None, limit=50):
+    """Check results newest first, filtered; ``before_id`` pages backwards through the ids."""
+    query = LinkCheck.query
+    if statuses:
+        query = query.filter(LinkCheck.status.in_(statuses))
+    if media_id is not None:
+        query = query.filter(LinkCheck.media_id == media_id)
+    if host:
+        query = query.filter(LinkCheck.host == host)
+    if before_id is not None:
+        query = query.filter(LinkCheck.id < before_id)
+    return query.order_by(LinkCheck.id.desc()).limit(limit).all()
+
+
+def serialize_link_check(row):
+    return {
+        'id': row.id,
+        'media_id': row.media_id,
+        'owner_type': row.owner_type,
+        'owner_id': row.owner_id,
+        'field': row.field,
+        'url': row.url,
+        'host': row.host,
+        'status': row.status,
+        'http_status': row.http_status,
+        'latency_ms': row.latency_ms,
+        'content_length': row.content_length,
+        'error': row.error,
+        'checked_at': row.checked_at.isoformat() + 'Z',
+    }
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models import db, SchemaMigration, MediaDocument, CatalogChange, CatalogStat, Job, LinkCheck
+from search import create_search_schema
+from stats import compute_stats, store_stats
+from tmdb_client import SQLMetadataCache
+
+# Versioned schema migrations.
+#
+# Each migration runs in its own transaction together with the insert into
+# schema_migrations that records it, so a version is either fully applied or
+# not at all. Statements are written to be idempotent (IF NOT EXISTS) because
+# databases created by older releases through db.create_all() may already have
+# some of the objects. On Postgres an advisory lock keeps concurrently starting
+# instances from applying the same version twice.
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_KEY = 727274  # arbitrary, only has to be unique within the database
+
+
+def create_base_schema(conn):
+    db.metadata.create_all(conn, checkfirst=True)
+
+
+def repair_media_id_sequence(conn):
+    # Rows inserted with explicit ids (old imports, SQL scripts) leave the shared sequence behind
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT setval('media_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM media_table), false)"))
+
+
+def create_catalog_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_cast_media_id ON "cast" (media_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_movie_created_at ON movie (created_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_tv_series_created_at ON tv_series (created_at)'))
+
+
+def create_unique_tmdb_ids(conn):
+    # Fails if the catalog already holds duplicate titles; merge them first and re-run
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_movie_type_tmdb_id ON movie (type, tmdb_id)'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_tv_series_type_tmdb_id ON tv_series (type, tmdb_id)'))
+
+
+def create_document_table(conn):
+    # Filled by the write paths; existing titles are served through load_catalog until
+    # `flask documents-rebuild` has stored theirs
+    MediaDocument.__table__.create(conn, checkfirst=True)
+
+
+def add_media_updated_at(conn):
+    # Databases created after this column was added already have it through create_all
+    if 'updated_at' not in {column['name'] for column in inspect(conn).get_columns('media_table')}:
+        conn.execute(text('ALTER TABLE media_table ADD COLUMN updated_at TIMESTAMP'))
+    conn.execute(text("""UPDATE media_table SET updated_at = COALESCE(
+        (SELECT created_at FROM movie WHERE movie.id = media_table.id),
+        (SELECT created_at FROM tv_series WHERE tv_series.id = media_table.id),
+        CURRENT_TIMESTAMP
+    ) WHERE updated_at IS NULL"""))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_media_table_updated_at ON media_table (updated_at)'))
+
+
+
+def create_change_feed_table(conn):
+    CatalogChange.__table__.create(conn, checkfirst=True)
+
+
+def add_document_summary(conn):
+    # Left NULL for existing rows: readers derive the summary from body until
+    # `flask documents-rebuild` (or the title's next write) stores it
+    if 'summary' not in {column['name'] for column in inspect(conn).get_columns('media_document')}:
+        conn.execute(text('ALTER TABLE media_document ADD COLUMN summary TEXT'))
+
+
+def create_job_queue(conn):
+    Job.__table__.create(conn, checkfirst=True)
+    # NULL for existing titles, so the first refresh enriches all of them
+    if 'enriched_at' not in {column['name'] for column in inspect(conn).get_columns('media_table')}:
+        conn.execute(text('ALTER TABLE media_table ADD COLUMN enriched_at TIMESTAMP'))
+
+
+def create_catalog_stats(conn):
+    CatalogStat.__table__.create(conn, checkfirst=True)
+    store_stats(conn, compute_stats(conn))
+
+
+def create_link_check_table(conn):
+    LinkCheck.__table__.create(conn, checkfirst=True)
+
+
+def create_catalog_filter_indexes(conn):
+    # /media?type= walks (type, id) in id order; ?language= and ?year= look ids up per title table
+    conn.execute(text('CREATE INDEX IF NOT EXISTS idx_media_table_type_id ON media_table (type, id)'))
+    for table in ('movie', 'tv_series'):
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS idx_{table}_language ON {table} (language)'))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS idx_{table}_release_date ON {table} (release_date)'))
+
+
+MIGRATIONS = [
+    (1, 'base schema', create_base_schema),
+    (2, 'repair shared media id sequence', repair_media_id_sequence),
+    (3, 'full-text search structures', create_search_schema),
+    (4, 'indexes on cast.media_id and created_at', create_catalog_indexes),
+    (5, 'unique (type, tmdb_id) per title table', create_unique_tmdb_ids),
+    (6, 'TMDB metadata cache table', SQLMetadataCache.create_table),
+    (7, 'precomputed title documents', create_document_table),
+    (8, 'media_table.updated_at for incremental exports', add_media_updated_at),
+    (9, 'catalog change feed', create_change_feed_table),
+    (10, 'compact TV documents', add_document_summary),
+    (11, 'background job queue and media_table.enriched_at', create_job_queue),
+    (12, 'catalog statistics counters', create_catalog_stats),
+    (13, 'stream and download link health checks', create_link_check_table),
+    (14, 'indexes for the /media type, language and year filters', create_catalog_filter_indexes),
+]
+
+
+def applied_versions(conn):
+    SchemaMigration.__table__.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(db.select(SchemaMigration.version))}
+
+
+def pending_migrations(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def run_migrations(engine):
+    """Apply every pending migration in order. Returns the versions applied by this call.
+
+    Stops at (and re-raises) the first failure; earlier versions stay applied.
+    """
+    pending = {version for version, _ in pending_migrations(engine)}
+    applied_now = []
+    for version, name, migrate in MIGRATIONS:
+        if version not in pending:
+            continue
+        with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            # Checked inside the transaction (and lock) so concurrent runners skip what another applied
+            if version in applied_versions(conn):
+                continue
+            migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        logger.info("Applied migration", extra={'version': version, 'migration': name})
+        applied_now.append(version)
+    return applied_now
@@ -0,0 +1,263 @@
+import threading
+
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Sequence  # Added for shared sequence
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db_routing import RoutingSession
+
+
+class LazyEngineSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy that builds each engine (and imports its DB driver) on first use.
+
+    The stock extension creates engines inside init_app, which puts the driver
+    import on every serverless cold start even for requests that never touch
+    the database.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending_engines = {}
+        self._engine_lock = threading.Lock()
+
+    def _make_engine(self, bind_key, options, app):
+        self._pending_engines[(app, bind_key)] = options
+        return None
+
+    @property
+    def engines(self):
+        engines = super().engines
+        if None in engines.values():
+            app = current_app._get_current_object()
+            with self._engine_lock:
+                for key, engine in engines.items():
+                    if engine is None:
+                        options = self._pending_engines.pop((app, key))
+                        engines[key] = super()._make_engine(key, options, app)
+        return engines
+
+
+db = LazyEngineSQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def dialect_insert(table, bind=None):
+    """INSERT construct with ``on_conflict_do_*`` support for ``bind`` (default: the active database)."""
+    dialect = (bind if bind is not None else db.engine).dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise RuntimeError(f"Upserts are not supported on {dialect}")
+
+
+# Database Models
+#
+# A shared Sequence is used to ensure movies and tv series share a single ID namespace.
+# This makes it easy to look up any item by its ID regardless of type.
+#
+class Media(db.Model):
+    __abstract__ = True
+    id = db.Column(db.Integer, Sequence('media_id_seq'), primary_key=True)
+    tmdb_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False) # 'movie' or 'tv'
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    thumbnail = db.Column(db.String(500))
+    release_date = db.Column(db.String(20))
+    language = db.Column(db.String(50))
+    rating = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class Cast(db.Model):
+    __tablename__ = 'cast'
+    id = db.Column(db.Integer, primary_key=True)
+    media_id = db.Column(db.Integer, db.ForeignKey('media_table.id'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    character = db.Column(db.String(200))
+    image = db.Column(db.String(500))
+    __table_args__ = (db.Index('idx_cast_media_id', 'media_id'),)
+
+class Movie(Media):
+    __tablename__ = 'movie'
+    id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
+    video_720p = db.Column(db.String(500))
+    video_1080p = db.Column(db.String(500))
+    video_2160p = db.Column(db.String(500))
+    download_720p = db.Column(db.String(500))
+    download_1080p = db.Column(db.String(500))
+    download_2160p = db.Column(db.String(500))
+    download_720p_type = db.Column(db.String(50))
+    download_1080p_type = db.Column(db.String(50))
+    download_2160p_type = db.Column(db.String(50))
+    __table_args__ = (
+        db.Index('uq_movie_type_tmdb_id', 'type', 'tmdb_id', unique=True),
+        db.Index('idx_movie_created_at', 'created_at'),
+        db.Index('idx_movie_language', 'language'),
+        db.Index('idx_movie_release_date', 'release_date'),
+    )
+    __mapper_args__ = {
+        'polymorphic_identity': 'movie',
+    }
+    
+class TVSeries(Media):
+    __tablename__ = 'tv_series'
+    id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
+    total_seasons = db.Column(db.Integer)
+    __table_args__ = (
+        db.Index('uq_tv_series_type_tmdb_id', 'type', 'tmdb_id', unique=True),
+        db.Index('idx_tv_series_created_at', 'created_at'),
+        db.Index('idx_tv_series_language', 'language'),
+        db.Index('idx_tv_series_release_date', 'release_date'),
+    )
+    __mapper_args__ = {
+        'polymorphic_identity': 'tv',
+    }
+
+class Season(db.Model):
+    __tablename__ = 'season'
+    id = db.Column(db.Integer, primary_key=True)
+    tv_series_id = db.Column(db.Integer, db.ForeignKey('tv_series.id'), nullable=False)
+    season_number = db.Column(db.Integer, nullable=False)
+    total_episodes = db.Column(db.Integer)
+    episodes = db.relationship('Episode', backref='season', lazy=True, cascade='all, delete-orphan')
+    __table_args__ = (db.UniqueConstraint('tv_series_id', 'season_number'),)
+
+class Episode(db.Model):
+    __tablename__ = 'episode'
+    id = db.Column(db.Integer, primary_key=True)
+    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), nullable=False)
+    episode_number = db.Column(db.Integer, nullable=False)
+    episode_name = db.Column(db.String(200))
+    video_720p = db.Column(db.String(500))
+    video_1080p = db.Column(db.String(500)) # Added for consistency
+    video_2160p = db.Column(db.String(500)) # Added for consistency
+    download_720p = db.Column(db.String(500))
+    download_1080p = db.Column(db.String(500)) # Added for consistency
+    download_2160p = db.Column(db.String(500)) # Added for consistency
+    download_720p_type = db.Column(db.String(50))
+    download_1080p_type = db.Column(db.String(50)) # Added for consistency
+    download_2160p_type = db.Column(db.String(50)) # Added for consistency
+    __table_args__ = (db.UniqueConstraint('season_id', 'episode_number'),)
+
+# This table will be used by both Movie and TVSeries for a single ID space
+class MediaTable(db.Model):
+    __tablename__ = 'media_table'
+    id = db.Column(db.Integer, Sequence('media_id_seq'), primary_key=True)
+    type = db.Column(db.String(10))
+    # Last change to the title's public document, stamped by catalog.store_documents
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Last time the enrichment worker refreshed the title from TMDB (see enrichment.py)
+    enriched_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('idx_media_table_updated_at', 'updated_at'),
+        db.Index('idx_media_table_type_id', 'type', 'id'),
+    )
+    __mapper_args__ = {
+        'polymorphic_identity': 'media',
+        'polymorphic_on': type
+    }
+    
+
+# Single-row counter bumped by every admin write. Public responses are cached
+# per version, so a bump invalidates every cached body at once.
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+# Denormalized search index, one row per title (title, description, cast names).
+# The full-text structures on top of it are dialect specific, see search.py.
+class MediaSearch(db.Model):
+    __tablename__ = 'media_search'
+    media_id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
+    tmdb_id = db.Column(db.Integer)
+    type = db.Column(db.String(10), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    cast_names = db.Column(db.Text)
+    thumbnail = db.Column(db.String(500))
+    release_date = db.Column(db.String(20))
+    year = db.Column(db.Integer)
+    language = db.Column(db.String(50))
+    rating = db.Column(db.Float)
+
+# Public JSON document of each title, encoded once at write time (see catalog.store_documents)
+class MediaDocument(db.Model):
+    __tablename__ = 'media_document'
+    media_id = db.Column(db.Integer, db.ForeignKey('media_table.id'), primary_key=True)
+    type = db.Column(db.String(10), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    # TV documents with seasons reduced to their summaries, served by /media/<id> unless episodes are expanded
+    summary = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+# Append-only log of catalog writes, read by clients through /changes (see changes.py)
+class CatalogChange(db.Model):
+    __tablename__ = 'catalog_changes'
+    sequence = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    media_id = db.Column(db.Integer, nullable=False)
+    season_number = db.Column(db.Integer)
+    episode_number = db.Column(db.Integer)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (db.Index('idx_catalog_changes_created_at', 'created_at'),)
+
+# Aggregate counters behind /api/stats, adjusted by every admin write (see stats.py)
+class CatalogStat(db.Model):
+    __tablename__ = 'catalog_stats'
+    name = db.Column(db.String(30), primary_key=True)
+    bucket = db.Column(db.String(50), primary_key=True, default='')
+    value = db.Column(db.Float, nullable=False, default=0)
+
+# Background work queue, claimed and run by `flask jobs-worker` (see jobs.py)
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    media_id = db.Column(db.Integer)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, succeeded or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('idx_jobs_status_run_after', 'status', 'run_after'),
+        db.Index('idx_jobs_kind_media_id', 'kind', 'media_id'),
+    )
+
+# Result of the last check of every stored stream/download URL (see link_check.py)
+class LinkCheck(db.Model):
+    __tablename__ = 'link_check'
+    id = db.Column(db.Integer, primary_key=True)
+    owner_type = db.Column(db.String(10), nullable=False)  # 'movie' or 'episode'
+    owner_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(20), nullable=False)  # video_720p ... download_2160p
+    media_id = db.Column(db.Integer, nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    host = db.Column(db.String(255))
+    status = db.Column(db.String(10), nullable=False)  # ok, slow or broken
+    http_status = db.Column(db.Integer)
+    latency_ms = db.Column(db.Integer)
+    content_length = db.Column(db.BigInteger)
+    error = db.Column(db.String(500))
+    checked_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('owner_type', 'owner_id', 'field', name='uq_link_check_owner_field'),
+        db.Index('idx_link_check_status', 'status', 'id'),
+        db.Index('idx_link_check_media_id', 'media_id'),
+    )
+
+# Versions applied by migrations.py
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from flask import current_app, render_template, request
+
+from compression import encoded_etag
+
+# Precompressed HTML pages.
+#
+# The site's pages are templates without per-request data, so they are
+# rendered once, minified and compressed with every supported encoding at the
+# highest level. `flask build-pages` writes the results (page.html, .html.gz,
+# .html.br) to PAGES_BUILD_DIR at build time; an instance that finds no build
+# output for a page, or one built from a different version of its template,
+# renders and compresses it on first request instead. Either way a request
+# only picks the variant matching its Accept-Encoding.
+
+# URL -> template
+PAGES = {
+    '/': 'index.html',
+    '/admin': 'admin_all_in_one.html',
+    '/admin/search': 'admin_search.html',
+    '/api/docs': 'api_docs.html',
+}
+
+# Whitespace inside these elements is significant (or is JavaScript), so the minifier leaves them alone
+_RAW_BLOCK = re.compile(r'(<(script|pre|textarea)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+_STYLE_BLOCK = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.IGNORECASE | re.DOTALL)
+_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_BETWEEN_TAGS = re.compile(r'>\s*\n\s*<')
+_LINE_BREAK = re.compile(r'\s*\n\s*')
+
+BUILD_LEVELS = {'gzip': 9, 'br': 11}
+FILE_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+MANIFEST = 'manifest.json'
+
+
+def _minify_style(match):
+    css = _LINE_BREAK.sub('\n', _CSS_COMMENT.sub('', match.group(2))).strip()
+    return f"{match.group(1)}{css}{match.group(3)}"
+
+
+def minify_html(html):
+    """Drop comments and indentation outside script/pre/textarea elements.
+
+    Only whitespace between two tags (and inside style sheets) is collapsed,
+    to a single newline, so text content keeps its spacing, including in
+    ``white-space: pre`` elements.
+    """
+    parts = _RAW_BLOCK.split(html)
+    out = []
+    # split() with two groups yields [text, block, tag name, text, block, tag name, ...]
+    for index in range(0, len(parts), 3):
+        text = _COMMENT.sub('', parts[index])
+        text = _STYLE_BLOCK.sub(_minify_style, text)
+        out.append(_BETWEEN_TAGS.sub('>\n<', text))
+        if index + 1 < len(parts):
+            out.append(parts[index + 1])
+    return ''.join(out).strip() + '\n'
+
+
+class Page:
+    __slots__ = ('body', 'compressed', 'etag')
+
+    def __init__(self, body, compressed):
+        self.body = body
+        self.compressed = compressed
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+def template_hash(template):
+    source, _, _ = current_app.jinja_loader.get_source(current_app.jinja_env, template)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def render_page(template, compressor):
+    """Render, minify and compress ``template`` with every supported encoding at build levels."""
+    body = minify_html(render_template(template)).encode('utf-8')
+    return Page(body, {encoding: compressor.compress(body, encoding, BUILD_LEVELS[encoding])
+                       for encoding in compressor.encodings})
+
+
+def build_pages(build_dir, compressor):
+    """Write every page and its compressed variants to ``build_dir``. Returns ``[(template, sizes)]``."""
+    os.makedirs(build_dir, exist_ok=True)
+    built, manifest = [], {}
+    for template in PAGES.values():
+        page = render_page(template, compressor)
+        path = os.path.join(build_dir, template)
+        with open(path, 'wb') as f:
+            f.write(page.body)
+        sizes = {'identity': len(page.body)}
+        for encoding, body in page.compressed.items():
+            with open(path + FILE_SUFFIXES[encoding], 'wb') as f:
+                f.write(body)
+            sizes[encoding] = len(body)
+        manifest[template] = template_hash(template)
+        built.append((template, sizes))
+    with open(os.path.join(build_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return built
+
+
+class PageStore:
+    """Serves the pages from ``build_dir`` when built, rendering them on first use otherwise."""
+
+    def __init__(self, build_dir, compressor, cache_control):
+        self.build_dir = build_dir
+        self.compressor = compressor
+        self.cache_control = cache_control
+        self._pages = {}
+        self._manifest = None
+        self._lock = threading.Lock()
+
+    def _built_hash(self, template):
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.build_dir, MANIFEST), encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest.get(template)
+
+    def _load(self, template):
+        path = os.path.join(self.build_dir, template)
+        # A build of an older template (edited without re-running build-pages) is ignored
+        if self._built_hash(template) != template_hash(template) or not os.path.exists(path):
+            return render_page(template, self.compressor)
+        with open(path, 'rb') as f:
+            body = f.read()
+        compressed = {}
+        for encoding in self.compressor.encodings:
+            if os.path.exists(path + FILE_SUFFIXES[encoding]):
+                with open(path + FILE_SUFFIXES[encoding], 'rb') as f:
+                    compressed[encoding] = f.read()
+        return Page(body, compressed)
+
+    def get(self, template):
+        page = self._pages.get(template)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(template)
+                if page is None:
+                    page = self._pages[template] = self._load(template)
+        return page
+
+    def response(self, template):
+        page = self.get(template)
+        # Each encoding has its own ETag (see compression.encoded_etag)
+        encoding = self.compressor.negotiate(list(page.compressed)) if page.compressed else None
+        etag = encoded_etag(page.etag, encoding)
+        response = current_app.response_class(mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.add('Accept-Encoding')
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            return response
+        if encoding is not None:
+            response.set_data(page.compressed[encoding])
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response.set_data(page.body)
+        return response
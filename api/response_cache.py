@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+from urllib.parse import urlparse, parse_qs
+
+from flask import current_app, request
+
+from compression import encoded_etag
+
+# Versioned response cache for the public media endpoints.
+#
+# Bodies are cached under the catalog version that produced them, so an admin
+# write (which bumps the version) makes every older entry unreachable without
+# having to delete anything. Each entry keeps the encoded body, a compressed
+# copy per supported encoding (see compression.py) and a strong ETag, so a hit
+# costs one version lookup and no serialization or compression. A backend that
+# fails (Redis unreachable) is bypassed for a while: views are served uncached
+# rather than failing.
+
+logger = logging.getLogger(__name__)
+
+# Encodings a cache entry can carry, and the mapping key each is stored under
+ENCODING_FIELDS = {'br': 'br_body', 'gzip': 'gzip_body'}
+
+
+class CacheEntry:
+    __slots__ = ('body', 'compressed', 'etag', 'last_modified', 'mimetype')
+
+    def __init__(self, body, compressed, etag, last_modified, mimetype):
+        self.body = body
+        self.compressed = compressed  # {encoding: body}, empty for small bodies
+        self.etag = etag
+        self.last_modified = last_modified  # unix timestamp or None
+        self.mimetype = mimetype
+
+    @classmethod
+    def from_body(cls, body, mimetype, compressor, last_modified=None):
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        return cls(body, compressor.variants(body), etag, last_modified, mimetype)
+
+    def to_mapping(self):
+        mapping = {
+            'body': self.body,
+            'etag': self.etag,
+            'mimetype': self.mimetype,
+        }
+        for encoding, compressed in self.compressed.items():
+            mapping[ENCODING_FIELDS[encoding]] = compressed
+        if self.last_modified is not None:
+            mapping['last_modified'] = repr(self.last_modified)
+        return mapping
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        def text(key):
+            value = mapping.get(key)
+            return value.decode() if isinstance(value, bytes) else value
+
+        last_modified = text('last_modified')
+        return cls(
+            mapping['body'],
+            {encoding: mapping[field] for encoding, field in ENCODING_FIELDS.items() if mapping.get(field)},
+            text('etag'),
+            float(last_modified) if last_modified else None,
+            text('mimetype'),
+        )
+
+
+class MemoryCache:
+    """In-process LRU with a per-entry TTL. Each serverless instance has its own copy."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Shared cache on Redis (or any server speaking its protocol), so instances reuse each other's bodies.
+
+    ``client`` can be any object with redis-py's ``hgetall``/``hset``/``expire``
+    methods, which lets a local stand-in be used in place of a real server.
+    """
+
+    def __init__(self, url=None, ttl=300, prefix='media-cache:', client=None, timeout=0.5):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("RESPONSE_CACHE_URL points at Redis but the 'redis' package is not installed")
+            # A slow or unreachable server must not hold requests up for long: they are served uncached
+            client = redis.Redis.from_url(url, socket_connect_timeout=timeout, socket_timeout=timeout)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        mapping = self.client.hgetall(self.prefix + key)
+        if not mapping:
+            return None
+        mapping = {k.decode() if isinstance(k, bytes) else k: v for k, v in mapping.items()}
+        return CacheEntry.from_mapping(mapping)
+
+    def set(self, key, entry):
+        name = self.prefix + key
+        pipe = self.client.pipeline() if hasattr(self.client, 'pipeline') else self.client
+        pipe.hset(name, mapping=entry.to_mapping())
+        pipe.expire(name, self.ttl)
+        if pipe is not self.client:
+            pipe.execute()
+
+    def clear(self):
+        for name in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(name)
+
+
+def create_cache_backend(url):
+    """Build a backend from a URL: ``memory://?maxsize=256&ttl=300``, ``redis://host:6379/0?ttl=300`` or ``none``.
+
+    ``timeout`` (seconds, 0.5) bounds each Redis operation.
+    """
+    if not url or url == 'none':
+        return None
+    parsed = urlparse(url)
+    params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+    ttl = int(params.pop('ttl', 300))
+    if parsed.scheme == 'memory':
+        return MemoryCache(maxsize=int(params.get('maxsize', 256)), ttl=ttl)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        return RedisCache(url=parsed._replace(query='').geturl(), ttl=ttl,
+                          timeout=float(params.get('timeout', 0.5)))
+    raise ValueError(f"Unsupported response cache URL: {url}")
+
+
+def build_response(entry, cache_control, compressor):
+    """Turn a cache entry into a response, answering conditional requests with 304.
+
+    Each encoding of the body is its own representation with its own ETag (see
+    compression.encoded_etag), so the encoding is chosen before the validators
+    are compared.
+    """
+    encoding = compressor.negotiate(list(entry.compressed)) if entry.compressed else None
+    etag = encoded_etag(entry.etag, encoding)
+    response = current_app.response_class(mimetype=entry.mimetype)
+    response.set_etag(etag)
+    if entry.last_modified is not None:
+        response.last_modified = entry.last_modified
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since and entry.last_modified is not None:
+        not_modified = int(entry.last_modified) <= request.if_modified_since.timestamp()
+    else:
+        not_modified = False
+    if not_modified:
+        response.status_code = 304
+        return response
+
+    if encoding is not None:
+        response.set_data(entry.compressed[encoding])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response.set_data(entry.body)
+    return response
+
+
+def cached_view(get_backend, get_version, cache_control, compressor, retry_interval=5.0):
+    """Cache a view's 200 responses per (catalog version, full path).
+
+    ``get_version`` returns ``(version, updated_at)``; ``get_backend`` returns
+    the active backend or ``None`` to bypass caching entirely. Compressed
+    copies are made with ``compressor`` when the entry is stored. After a
+    backend error the view is served uncached for ``retry_interval`` seconds.
+    """
+    def decorator(view):
+        # monotonic time until which the backend is left alone after a failure
+        down_until = [0.0]
+
+        def backend_failed(operation, error):
+            down_until[0] = time.monotonic() + retry_interval
+            logger.warning("Response cache unavailable, serving uncached", extra={
+                'operation': operation, 'view': view.__name__, 'error': str(error)})
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None or time.monotonic() < down_until[0]:
+                return view(*args, **kwargs)
+
+            version, updated_at = get_version()
+            key = f"{version}:{request.full_path}"
+            try:
+                entry = backend.get(key)
+            except Exception as e:
+                backend_failed('get', e)
+                return view(*args, **kwargs)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                last_modified = None
+                if updated_at is not None:
+                    # updated_at is stored as naive UTC
+                    last_modified = updated_at.replace(tzinfo=timezone.utc).timestamp()
+                entry = CacheEntry.from_body(response.get_data(), response.mimetype, compressor, last_modified)
+                try:
+                    backend.set(key, entry)
+                except Exception as e:
+                    # The entry is still good for this request
+                    backend_failed('set', e)
+            return build_response(entry, cache_control, compressor)
+        return wrapper
+    return decorator
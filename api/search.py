@@ -0,0 +1,294 @@
+import difflib
+import logging
+import re
+from collections import defaultdict
+
+from sqlalchemy import select, text
+
+from models import db, Cast, Movie, TVSeries, MediaTable, MediaSearch
+
+# Full-text search over titles, descriptions and cast names.
+#
+# media_search holds one denormalized row per title and is kept in sync by the
+# admin write paths. On Postgres it carries a weighted tsvector column with a
+# GIN index (plus a pg_trgm index on the title for typo tolerance); on SQLite an
+# FTS5 external-content table mirrors it through triggers. Queries are prefix
+# matches on every term, ranked by relevance, with a fuzzy fallback when the
+# exact query finds nothing.
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS media_search_fts USING fts5(
+        title, cast_names, description,
+        content='media_search', content_rowid='media_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS media_search_vocab USING fts5vocab(media_search_fts, 'row')",
+    """CREATE TRIGGER IF NOT EXISTS media_search_ai AFTER INSERT ON media_search BEGIN
+        INSERT INTO media_search_fts(rowid, title, cast_names, description)
+        VALUES (new.media_id, new.title, new.cast_names, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS media_search_ad AFTER DELETE ON media_search BEGIN
+        INSERT INTO media_search_fts(media_search_fts, rowid, title, cast_names, description)
+        VALUES ('delete', old.media_id, old.title, old.cast_names, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS media_search_au AFTER UPDATE ON media_search BEGIN
+        INSERT INTO media_search_fts(media_search_fts, rowid, title, cast_names, description)
+        VALUES ('delete', old.media_id, old.title, old.cast_names, old.description);
+        INSERT INTO media_search_fts(rowid, title, cast_names, description)
+        VALUES (new.media_id, new.title, new.cast_names, new.description);
+    END""",
+]
+
+POSTGRES_SCHEMA = [
+    """ALTER TABLE media_search ADD COLUMN IF NOT EXISTS document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(cast_names, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS idx_media_search_document ON media_search USING gin(document)",
+]
+
+POSTGRES_TRIGRAM_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_media_search_title_trgm ON media_search USING gin(title gin_trgm_ops)",
+]
+
+RESULT_COLUMNS = 's.media_id, s.type, s.title, s.description, s.thumbnail, s.release_date, s.language, s.rating, s.tmdb_id'
+
+MAX_SEARCH_LIMIT = 100
+
+_capabilities = {}
+
+
+def create_search_schema(conn):
+    """Create the dialect specific full-text structures and index the existing titles. Run by the migrations."""
+    if conn.dialect.name == 'sqlite':
+        for statement in SQLITE_SCHEMA:
+            conn.execute(text(statement))
+    elif conn.dialect.name == 'postgresql':
+        for statement in POSTGRES_SCHEMA:
+            conn.execute(text(statement))
+        # pg_trgm needs privileges some hosts do not grant; search then works without the fuzzy fallback
+        savepoint = conn.begin_nested()
+        try:
+            for statement in POSTGRES_TRIGRAM_SCHEMA:
+                conn.execute(text(statement))
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            logger.warning("pg_trgm unavailable, fuzzy search disabled", extra={'error': str(e)})
+    # After the SQLite triggers, which fill the FTS table from these rows
+    index_existing_titles(conn)
+
+
+def search_capabilities(engine):
+    """Detect (once per process) which optional search features the database has."""
+    if engine not in _capabilities:
+        trigram = False
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as conn:
+                trigram = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        _capabilities[engine] = {'trigram': trigram}
+    return _capabilities[engine]
+
+
+def _year(release_date):
+    if release_date and release_date[:4].isdigit():
+        return int(release_date[:4])
+    return None
+
+
+def index_titles(media_ids, chunk_size=500, conn=None):
+    """Rebuild the search rows of ``media_ids`` inside the caller's transaction (``conn``, or the session)."""
+    executor = db.session if conn is None else conn
+    media_ids = list(media_ids)
+    for start in range(0, len(media_ids), chunk_size):
+        chunk = media_ids[start:start + chunk_size]
+        cast_names = defaultdict(list)
+        for media_id, name in executor.execute(
+                select(Cast.media_id, Cast.name).where(Cast.media_id.in_(chunk)).order_by(Cast.id)):
+            if name:
+                cast_names[media_id].append(name)
+
+        rows = []
+        for model in (Movie, TVSeries):
+            for title in executor.execute(select(
+                model.id, model.tmdb_id, model.type, model.title, model.description, model.thumbnail,
+                model.release_date, model.language, model.rating
+            ).where(model.id.in_(chunk))):
+                rows.append({
+                    'media_id': title.id,
+                    'tmdb_id': title.tmdb_id,
+                    'type': title.type or ('movie' if model is Movie else 'tv'),
+                    'title': title.title,
+                    'description': title.description,
+                    'cast_names': ' '.join(cast_names[title.id]),
+                    'thumbnail': title.thumbnail,
+                    'release_date': title.release_date,
+                    'year': _year(title.release_date),
+                    'language': title.language,
+                    'rating': title.rating,
+                })
+
+        executor.execute(MediaSearch.__table__.delete().where(MediaSearch.media_id.in_(chunk)))
+        if rows:
+            executor.execute(MediaSearch.__table__.insert(), rows)
+
+
+def index_existing_titles(conn, batch_size=1000):
+    """Index every title through ``conn``, for databases that had titles before the search index."""
+    total, last_id = 0, 0
+    while True:
+        ids = conn.execute(select(MediaTable.id).where(MediaTable.id > last_id)
+                           .order_by(MediaTable.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        index_titles(ids, conn=conn)
+        total += len(ids)
+        last_id = ids[-1]
+    return total
+
+
+def reindex_all(batch_size=1000):
+    """Rebuild the whole search index, committing every ``batch_size`` titles. Returns the title count."""
+    db.session.query(MediaSearch).delete(synchronize_session=False)
+    db.session.commit()
+    total, last_id = 0, 0
+    while True:
+        ids = [row.id for row in db.session.query(MediaTable.id).filter(MediaTable.id > last_id)
+               .order_by(MediaTable.id).limit(batch_size)]
+        if not ids:
+            break
+        index_titles(ids)
+        db.session.commit()
+        total += len(ids)
+        last_id = ids[-1]
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text("INSERT INTO media_search_fts(media_search_fts) VALUES ('rebuild')"))
+        db.session.commit()
+    return total
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _filters(media_type, language, year):
+    clauses, params = [], {}
+    if media_type:
+        clauses.append('s.type = :type')
+        params['type'] = media_type
+    if language:
+        clauses.append('s.language = :language')
+        params['language'] = language
+    if year:
+        clauses.append('s.year = :year')
+        params['year'] = year
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+def _result(row):
+    return {
+        'id': row.media_id,
+        'type': row.type,
+        'title': row.title,
+        'description': row.description,
+        'thumbnail': row.thumbnail,
+        'release_date': row.release_date,
+        'language': row.language,
+        'rating': row.rating,
+        'tmdb_id': row.tmdb_id,
+        'score': round(float(row.score), 4),
+    }
+
+
+def _sqlite_match(terms, where, params, limit, offset):
+    params = dict(params, match=' AND '.join(f'"{term}"*' for term in terms), limit=limit, offset=offset)
+    base = f"""FROM media_search_fts JOIN media_search s ON s.media_id = media_search_fts.rowid
+               WHERE media_search_fts MATCH :match{where}"""
+    total = db.session.execute(text(f"SELECT COUNT(*) {base}"), params).scalar()
+    if not total:
+        return [], 0
+    # bm25 is lower-is-better; weights favour title over cast over description
+    rows = db.session.execute(text(
+        f"""SELECT {RESULT_COLUMNS}, -bm25(media_search_fts, 10.0, 4.0, 1.0) AS score {base}
+            ORDER BY score DESC, s.media_id LIMIT :limit OFFSET :offset"""
+    ), params).all()
+    return [_result(row) for row in rows], total
+
+
+def _sqlite_correct(terms):
+    """Replace terms that match nothing with the closest word in the FTS vocabulary."""
+    corrected = []
+    for term in terms:
+        known = db.session.execute(
+            text("SELECT 1 FROM media_search_vocab WHERE term >= :term AND term < :upper LIMIT 1"),
+            {'term': term, 'upper': term + '\uffff'}
+        ).first()
+        if known or len(term) < 3:
+            corrected.append(term)
+            continue
+        candidates = [row.term for row in db.session.execute(
+            text("SELECT term FROM media_search_vocab WHERE length(term) BETWEEN :lo AND :hi"),
+            {'lo': len(term) - 2, 'hi': len(term) + 2}
+        )]
+        match = difflib.get_close_matches(term, candidates, n=1, cutoff=0.75)
+        corrected.append(match[0] if match else term)
+    return corrected
+
+
+def _postgres_match(terms, where, params, limit, offset):
+    params = dict(params, tsquery=' & '.join(f'{term}:*' for term in terms), limit=limit, offset=offset)
+    base = f"FROM media_search s, to_tsquery('simple', :tsquery) query WHERE s.document @@ query{where}"
+    total = db.session.execute(text(f"SELECT COUNT(*) {base}"), params).scalar()
+    if not total:
+        return [], 0
+    rows = db.session.execute(text(
+        f"""SELECT {RESULT_COLUMNS}, ts_rank_cd(s.document, query) AS score {base}
+            ORDER BY score DESC, s.media_id LIMIT :limit OFFSET :offset"""
+    ), params).all()
+    return [_result(row) for row in rows], total
+
+
+def _postgres_fuzzy(query, where, params, limit, offset):
+    params = dict(params, q=query, limit=limit, offset=offset)
+    base = f"FROM media_search s WHERE s.title % :q{where}"
+    total = db.session.execute(text(f"SELECT COUNT(*) {base}"), params).scalar()
+    if not total:
+        return [], 0
+    rows = db.session.execute(text(
+        f"""SELECT {RESULT_COLUMNS}, similarity(s.title, :q) AS score {base}
+            ORDER BY score DESC, s.media_id LIMIT :limit OFFSET :offset"""
+    ), params).all()
+    return [_result(row) for row in rows], total
+
+
+def search_media(query, media_type=None, language=None, year=None, limit=20, offset=0):
+    """Ranked search. Returns ``{'results', 'total', 'fuzzy', 'corrected_query'}``.
+
+    ``fuzzy`` is set when nothing matched exactly and the results come from
+    the typo-tolerant fallback instead; on SQLite ``corrected_query`` then
+    holds the spelling that was actually searched.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return {'results': [], 'total': 0, 'fuzzy': False, 'corrected_query': None}
+    schema = search_capabilities(db.engine)
+    where, params = _filters(media_type, language, year)
+
+    if db.engine.dialect.name == 'postgresql':
+        results, total = _postgres_match(terms, where, params, limit, offset)
+        if not total and schema['trigram']:
+            results, total = _postgres_fuzzy(' '.join(terms), where, params, limit, offset)
+            return {'results': results, 'total': total, 'fuzzy': True, 'corrected_query': None}
+        return {'results': results, 'total': total, 'fuzzy': False, 'corrected_query': None}
+
+    results, total = _sqlite_match(terms, where, params, limit, offset)
+    if not total:
+        corrected = _sqlite_correct(terms)
+        if corrected != terms:
+            results, total = _sqlite_match(corrected, where, params, limit, offset)
+            return {'results': results, 'total': total, 'fuzzy': True, 'corrected_query': ' '.join(corrected)}
+    return {'results': results, 'total': total, 'fuzzy': False, 'corrected_query': None}
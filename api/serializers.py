@@ -0,0 +1,121 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Public JSON shape of catalog titles and the encoder used for it.
+#
+# Title documents are encoded once when a title is written and stored in
+# media_document; the read routes splice those bytes into the response
+# envelope instead of rebuilding and re-encoding dicts per request. orjson is
+# used when installed, the stdlib encoder (same output) otherwise.
+
+
+def dumps(obj):
+    """Encode ``obj`` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_array(encoded_items):
+    """Join already-encoded JSON values into a JSON array."""
+    return b'[' + b','.join(encoded_items) + b']'
+
+
+def encode_envelope(payload, **encoded):
+    """Encode ``payload`` with the ``encoded`` keys spliced in as already-encoded JSON values."""
+    parts = [dumps(payload)[:-1]]
+    separator = b'' if parts[0] == b'{' else b','
+    for key, value in encoded.items():
+        parts.append(separator + dumps(key) + b':')
+        parts.append(value)
+        separator = b','
+    parts.append(b'}')
+    return b''.join(parts)
+
+
+def serialize_cast(cast_members):
+    return [{'name': c.name, 'character': c.character, 'image': c.image} for c in cast_members]
+
+
+def serialize_movie(movie, cast_members):
+    return {
+        'id': movie.id,
+        'type': 'movie',
+        'title': movie.title,
+        'description': movie.description,
+        'thumbnail': movie.thumbnail,
+        'release_date': movie.release_date,
+        'language': movie.language,
+        'rating': movie.rating,
+        'cast': serialize_cast(cast_members),
+        'video_links': {
+            'video_720p': movie.video_720p,
+            'video_1080p': movie.video_1080p,
+            'video_2160p': movie.video_2160p
+        },
+        'download_links': {
+            'download_720p': {'url': movie.download_720p, 'file_type': movie.download_720p_type},
+            'download_1080p': {'url': movie.download_1080p, 'file_type': movie.download_1080p_type},
+            'download_2160p': {'url': movie.download_2160p, 'file_type': movie.download_2160p_type}
+        }
+    }
+
+
+def serialize_episode(episode):
+    return {
+        'episode_number': episode.episode_number,
+        'episode_name': episode.episode_name,
+        'video_720p': episode.video_720p,
+        'video_1080p': episode.video_1080p,
+        'video_2160p': episode.video_2160p,
+        'download_720p': {'url': episode.download_720p, 'file_type': episode.download_720p_type},
+        'download_1080p': {'url': episode.download_1080p, 'file_type': episode.download_1080p_type},
+        'download_2160p': {'url': episode.download_2160p, 'file_type': episode.download_2160p_type}
+    }
+
+
+def serialize_season_summary(season):
+    return {'season_number': season.season_number, 'total_episodes': season.total_episodes}
+
+
+def serialize_tv(tv, cast_members, seasons, episodes_by_season):
+    seasons_data = {}
+    for season in seasons:
+        seasons_data[f"season_{season.season_number}"] = {
+            'season_number': season.season_number,
+            'total_episodes': season.total_episodes,
+            'episodes': [serialize_episode(e) for e in episodes_by_season.get(season.id, [])]
+        }
+    return {
+        'id': tv.id,
+        'type': 'tv',
+        'title': tv.title,
+        'description': tv.description,
+        'thumbnail': tv.thumbnail,
+        'release_date': tv.release_date,
+        'language': tv.language,
+        'rating': tv.rating,
+        'cast': serialize_cast(cast_members),
+        'total_seasons': tv.total_seasons,
+        'seasons': seasons_data
+    }
+
+
+def compact_document(document):
+    """``document`` with each TV season reduced to its summary (no episodes)."""
+    if document.get('type') != 'tv' or 'seasons' not in document:
+        return document
+    return dict(document, seasons={
+        key: {'season_number': season['season_number'], 'total_episodes': season['total_episodes']}
+        for key, season in document['seasons'].items()
+    })
@@ -0,0 +1,252 @@
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from models import db, CatalogVersion, MediaDocument, MediaTable
+from catalog import load_catalog, query_media_ids
+from serializers import dumps, loads, compact_document
+
+# Read-only catalog snapshot.
+#
+# With snapshot mode on, /media/<id> is answered from a file holding every
+# title's encoded document, memory-mapped by each instance, instead of from
+# the database. The file is a fixed header, a table with one slot per media id
+# between the lowest and highest id (so a lookup is one offset computation,
+# no search), and the document bodies: the full document, followed for TV
+# series by the compact one with season summaries. A snapshot is labelled
+# with the catalog version read before it was built, so its contents are never
+# older than its label; an instance only serves it while that is still the
+# current version and otherwise reads from the database until the snapshot of
+# the new version is built. Files are written under a temporary name and
+# renamed, so processes sharing the directory only ever open complete ones.
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MDBSNAP1'
+# Magic, catalog version, built at (unix time), first media id, slots, titles
+HEADER = struct.Struct('<8sQdIII')
+# Offset of the full document, its length and the length of the compact document after it (0: same)
+SLOT = struct.Struct('<QII')
+
+
+def snapshot_filename(version):
+    return f"catalog-{version}.snap"
+
+
+def remove_older_snapshots(directory, version):
+    # Maps other processes still have open stay valid: the data lives until they are closed
+    for path in glob.glob(os.path.join(directory, snapshot_filename('*'))):
+        older = os.path.basename(path)[len('catalog-'):-len('.snap')]
+        if older.isdigit() and int(older) < version:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def primary_catalog_version():
+    """The catalog version on the primary: a replica may lag behind what the snapshot has to match."""
+    with db.engine.connect() as conn:
+        return conn.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def _document_batch(media_ids):
+    """``[(media_id, body, compact_body or None)]`` of ``media_ids``, encoded, in id order."""
+    documents = {}
+    for row in db.session.query(MediaDocument.media_id, MediaDocument.type, MediaDocument.body,
+                                MediaDocument.summary).filter(MediaDocument.media_id.in_(media_ids)):
+        compact = None
+        if row.type == 'tv':
+            compact = row.summary.encode('utf-8') if row.summary is not None \
+                else dumps(compact_document(loads(row.body)))
+        documents[row.media_id] = (row.body.encode('utf-8'), compact)
+    missing = [media_id for media_id in media_ids if media_id not in documents]
+    if missing:
+        # Titles without a stored document yet, as in load_document_bodies
+        for document in load_catalog(missing):
+            compact = dumps(compact_document(document)) if document['type'] == 'tv' else None
+            documents[document['id']] = (dumps(document), compact)
+    return [(media_id,) + documents[media_id] for media_id in media_ids if media_id in documents]
+
+
+def write_snapshot(path, version, batch_size=1000):
+    """Write the snapshot of every title to ``path``, labelled ``version``. Returns ``{titles, bytes}``.
+
+    ``version`` must have been read before the documents are: titles written
+    during the build are then at most newer than the label.
+    """
+    first, last = db.session.query(func.min(MediaTable.id), func.max(MediaTable.id)).one()
+    slots = last - first + 1 if first is not None else 0
+    first = first or 0
+    table = bytearray(slots * SLOT.size)
+    titles = 0
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, 'wb') as f:
+            offset = HEADER.size + len(table)
+            f.seek(offset)
+            last_id = None
+            while True:
+                # Titles added after the id range was read are left to the next snapshot
+                ids = [media_id for media_id in query_media_ids(after_id=last_id, limit=batch_size)
+                       if media_id <= last]
+                if not ids:
+                    break
+                for media_id, body, compact in _document_batch(ids):
+                    f.write(body)
+                    if compact is not None:
+                        f.write(compact)
+                    SLOT.pack_into(table, (media_id - first) * SLOT.size, offset, len(body), len(compact or b''))
+                    offset += len(body) + len(compact or b'')
+                    titles += 1
+                db.session.expunge_all()
+                last_id = ids[-1]
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, version, time.time(), first, slots, titles))
+            f.write(table)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return {'titles': titles, 'bytes': offset}
+
+
+class CatalogSnapshot:
+    """A snapshot file, memory-mapped; ``get`` is safe to call from many threads."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a catalog snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.built_at, self.first_id, self.slots, self.titles = HEADER.unpack_from(self._map)
+        if magic != MAGIC or size < HEADER.size + self.slots * SLOT.size:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self.size = size
+
+    def get(self, media_id, compact=False):
+        """Encoded document of ``media_id``, or None if the title does not exist."""
+        index = media_id - self.first_id
+        if not 0 <= index < self.slots:
+            return None
+        offset, length, compact_length = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+        if not length:
+            return None
+        if compact and compact_length:
+            return self._map[offset + length:offset + length + compact_length]
+        return self._map[offset:offset + length]
+
+
+class SnapshotManager:
+    """Keeps the snapshot of the current catalog version open for an instance.
+
+    The version is checked on the primary at most every ``check_interval``
+    seconds. A snapshot for it is looked for in ``bundle_dir`` (built at
+    deploy time with ``flask snapshot-build``) and ``directory``, and built
+    into ``directory`` on a background thread if neither has one.
+    """
+
+    def __init__(self, app, directory, check_interval=5.0, bundle_dir=None, batch_size=1000):
+        self.app = app
+        self.directory = directory
+        self.bundle_dir = bundle_dir
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.snapshot = None
+        self.catalog_version = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+        self._builder = None
+        self._builder_lock = threading.Lock()
+
+    def _check_due(self):
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.check_interval
+
+    def current(self):
+        """The snapshot of the current catalog version, or None until it is built (read from the database)."""
+        if self._check_due():
+            with self._lock:
+                if self._check_due():
+                    self._check()
+        snapshot = self.snapshot
+        return snapshot if snapshot is not None and snapshot.version == self.catalog_version else None
+
+    def expire(self):
+        """After a write: check the version on the next read and start building its snapshot now."""
+        self.checked_at = None
+        self._start_build()
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            'catalog_version': self.catalog_version,
+            'snapshot_version': snapshot.version if snapshot is not None else None,
+            'titles': snapshot.titles if snapshot is not None else 0,
+            'bytes': snapshot.size if snapshot is not None else 0,
+            'building': self._builder is not None,
+        }
+
+    def _check(self):
+        try:
+            self.catalog_version = primary_catalog_version()
+        except Exception as e:
+            # Keep the previous answer; the database path reports the outage
+            logger.warning("Catalog version check failed", extra={'error': str(e)})
+            self.checked_at = time.monotonic()
+            return
+        self.checked_at = time.monotonic()
+        if self.snapshot is not None and self.snapshot.version == self.catalog_version:
+            return
+        for directory in (self.bundle_dir, self.directory):
+            path = os.path.join(directory, snapshot_filename(self.catalog_version)) if directory else None
+            if path and os.path.exists(path):
+                try:
+                    self._install(CatalogSnapshot(path))
+                    return
+                except (OSError, ValueError) as e:
+                    logger.warning("Unreadable catalog snapshot", extra={'path': path, 'error': str(e)})
+        self._start_build()
+
+    def _install(self, snapshot):
+        # The previous map is closed by the garbage collector once no request holds it
+        self.snapshot = snapshot
+        logger.info("Catalog snapshot loaded", extra={'version': snapshot.version, 'titles': snapshot.titles})
+
+    def _start_build(self):
+        with self._builder_lock:
+            if self._builder is not None:
+                return
+            self._builder = threading.Thread(target=self._build, name='catalog-snapshot', daemon=True)
+            self._builder.start()
+
+    def _build(self):
+        try:
+            with self.app.app_context():
+                try:
+                    # A write during the build leaves the snapshot behind: build again until it is current
+                    while True:
+                        version = primary_catalog_version()
+                        if self.snapshot is not None and self.snapshot.version >= version:
+                            return
+                        os.makedirs(self.directory, exist_ok=True)
+                        path = os.path.join(self.directory, snapshot_filename(version))
+                        started = time.perf_counter()
+                        result = write_snapshot(path, version, self.batch_size)
+                        logger.info("Catalog snapshot built", extra=dict(
+                            result, version=version, seconds=round(time.perf_counter() - started, 2)))
+                        self._install(CatalogSnapshot(path))
+                        remove_older_snapshots(self.directory, version)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error("Building the catalog snapshot failed", exc_info=e)
+        finally:
+            self._builder = None
@@ -0,0 +1,190 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_, select, text
+
+from models import db, dialect_insert, CatalogStat, Cast, Movie, TVSeries, Season, Episode, MediaSearch
+from catalog import bump_catalog_version
+
+# Catalog statistics.
+#
+# /api/stats is served from the counters in catalog_stats instead of counting
+# the catalog tables on every request. A counter is a (name, bucket) pair:
+# titles per type, per language and per release year, titles added per day,
+# plus totals for seasons, episodes, cast and ratings. Every admin write adds
+# its own contribution in the same transaction with INSERT ... ON CONFLICT
+# increments, so reading the stats touches a number of rows bounded by the
+# languages and years in the catalog, not by its size. reconcile_stats
+# recomputes all counters with GROUP BY queries and replaces them, which
+# corrects drift from writes made outside the app (SQL scripts, manual deletes).
+
+TOTALS = ('seasons', 'episodes', 'cast')
+RECENT_DAYS = (7, 30)
+RECENTLY_ADDED = 10
+
+
+def _year(release_date):
+    # release_date is stored as 'YYYY-MM-DD' text
+    prefix = (release_date or '')[:4]
+    return prefix if prefix.isdigit() else None
+
+
+def _day(created_at):
+    # date() returns text on SQLite and a date on Postgres
+    return str(created_at)[:10] if created_at is not None else None
+
+
+def title_counters(media_ids, chunk_size=500):
+    """What each title contributes to the counters, as ``{media_id: Counter}``."""
+    counters = defaultdict(Counter)
+    media_ids = list(media_ids)
+    for start in range(0, len(media_ids), chunk_size):
+        chunk = media_ids[start:start + chunk_size]
+        for model, kind in ((Movie, 'movie'), (TVSeries, 'tv')):
+            for row in db.session.query(model.id, model.language, model.release_date, model.rating,
+                                        model.created_at).filter(model.id.in_(chunk)):
+                counter = counters[row.id]
+                counter[('titles', kind)] += 1
+                counter[('language', row.language or '')] += 1
+                if _year(row.release_date):
+                    counter[('year', _year(row.release_date))] += 1
+                if _day(row.created_at):
+                    counter[('added_on', _day(row.created_at))] += 1
+                # TMDB rates unrated titles 0, which would drag the average down
+                if row.rating and row.rating > 0:
+                    counter[('rating_sum', '')] += row.rating
+                    counter[('rating_count', '')] += 1
+        for media_id, count in db.session.query(Season.tv_series_id, func.count(Season.id)) \
+                .filter(Season.tv_series_id.in_(chunk)).group_by(Season.tv_series_id):
+            counters[media_id][('seasons', '')] += count
+        for media_id, count in db.session.query(Season.tv_series_id, func.count(Episode.id)).join(Episode) \
+                .filter(Season.tv_series_id.in_(chunk)).group_by(Season.tv_series_id):
+            counters[media_id][('episodes', '')] += count
+        for media_id, count in db.session.query(Cast.media_id, func.count(Cast.id)) \
+                .filter(Cast.media_id.in_(chunk)).group_by(Cast.media_id):
+            counters[media_id][('cast', '')] += count
+    return counters
+
+
+def counter_delta(before, after):
+    """Total change between two ``title_counters`` results, for titles edited in place."""
+    delta = Counter()
+    for media_id in set(before) | set(after):
+        delta.update(after.get(media_id, {}))
+        delta.subtract(before.get(media_id, {}))
+    return delta
+
+
+def adjust_stats(deltas):
+    """Add ``{(name, bucket): delta}`` to the counters inside the caller's transaction."""
+    # Sorted, so concurrent writers lock the counter rows in the same order
+    rows = [{'name': name, 'bucket': bucket, 'value': value}
+            for (name, bucket), value in sorted(deltas.items()) if value]
+    if not rows:
+        return
+    table = CatalogStat.__table__
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['name', 'bucket'], set_={'value': table.c.value + statement.excluded.value}
+    )
+    db.session.execute(statement, rows)
+
+
+def add_titles(media_ids):
+    """Count newly written titles, with their seasons, episodes and cast."""
+    total = Counter()
+    for counter in title_counters(media_ids).values():
+        total.update(counter)
+    adjust_stats(total)
+
+
+def compute_stats(conn):
+    """Every counter, computed from the catalog tables over ``conn``. Returns a Counter."""
+    stats = Counter()
+    for model, kind in ((Movie, 'movie'), (TVSeries, 'tv')):
+        stats[('titles', kind)] += conn.execute(select(func.count(model.id))).scalar()
+        for language, count in conn.execute(select(model.language, func.count(model.id)).group_by(model.language)):
+            stats[('language', language or '')] += count
+        prefix = func.substr(model.release_date, 1, 4)
+        for year, count in conn.execute(select(prefix, func.count(model.id)).group_by(prefix)):
+            if _year(year):
+                stats[('year', year)] += count
+        day = func.date(model.created_at)
+        for created_on, count in conn.execute(select(day, func.count(model.id)).group_by(day)):
+            if _day(created_on):
+                stats[('added_on', _day(created_on))] += count
+        rating_sum, rating_count = conn.execute(
+            select(func.sum(model.rating), func.count(model.rating)).where(model.rating > 0)
+        ).one()
+        stats[('rating_sum', '')] += rating_sum or 0
+        stats[('rating_count', '')] += rating_count
+    stats[('seasons', '')] = conn.execute(select(func.count(Season.id))).scalar()
+    stats[('episodes', '')] = conn.execute(select(func.count(Episode.id))).scalar()
+    stats[('cast', '')] = conn.execute(select(func.count(Cast.id))).scalar()
+    return stats
+
+
+def store_stats(conn, stats):
+    rows = [{'name': name, 'bucket': bucket, 'value': value} for (name, bucket), value in sorted(stats.items()) if value]
+    conn.execute(CatalogStat.__table__.delete())
+    if rows:
+        conn.execute(insert(CatalogStat.__table__), rows)
+
+
+def reconcile_stats():
+    """Recompute every counter and replace the stored ones, then commit.
+
+    Returns the drift that was corrected, as ``{"name:bucket": stored - computed}``.
+    """
+    conn = db.session.connection()
+    if conn.dialect.name == 'postgresql':
+        # Writers wait at their increment until the recount is committed, and a
+        # recount started after their increment waits for their commit
+        conn.execute(text('LOCK TABLE catalog_stats IN EXCLUSIVE MODE'))
+    stored = {(row.name, row.bucket): row.value for row in conn.execute(select(CatalogStat.__table__))}
+    computed = compute_stats(conn)
+    drift = {}
+    for name, bucket in set(stored) | set(computed):
+        difference = round(stored.get((name, bucket), 0) - computed.get((name, bucket), 0), 6)
+        if difference:
+            drift[f"{name}:{bucket}"] = difference
+    if drift:
+        store_stats(conn, computed)
+        # Cached /api/stats responses are keyed by the catalog version
+        bump_catalog_version()
+    db.session.commit()
+    return drift
+
+
+def load_stats(recently_added=RECENTLY_ADDED):
+    """The /api/stats payload."""
+    today = datetime.utcnow().date()
+    oldest_day = (today - timedelta(days=max(RECENT_DAYS) - 1)).isoformat()
+    counters = defaultdict(dict)
+    for name, bucket, value in db.session.query(CatalogStat.name, CatalogStat.bucket, CatalogStat.value) \
+            .filter(or_(CatalogStat.name != 'added_on', CatalogStat.bucket >= oldest_day)):
+        counters[name][bucket] = value
+
+    movies = int(counters['titles'].get('movie', 0))
+    tv_series = int(counters['titles'].get('tv', 0))
+    rating_count = counters['rating_count'].get('', 0)
+    stats = {
+        'total_media': movies + tv_series,
+        'total_movies': movies,
+        'total_tv_series': tv_series,
+    }
+    for name in TOTALS:
+        stats[f'total_{name}'] = int(counters[name].get('', 0))
+    stats['average_rating'] = round(counters['rating_sum'].get('', 0) / rating_count, 2) if rating_count else None
+    stats['by_language'] = {language or 'unknown': int(count) for language, count in sorted(
+        counters['language'].items(), key=lambda item: (-item[1], item[0])) if count}
+    stats['by_year'] = {year: int(count) for year, count in sorted(counters['year'].items()) if count}
+    for days in RECENT_DAYS:
+        since = (today - timedelta(days=days - 1)).isoformat()
+        stats[f'added_last_{days}_days'] = int(sum(count for day, count in counters['added_on'].items() if day >= since))
+    stats['recently_added'] = [{
+        'id': row.media_id, 'type': row.type, 'title': row.title, 'thumbnail': row.thumbnail,
+        'release_date': row.release_date,
+    } for row in db.session.query(MediaSearch.media_id, MediaSearch.type, MediaSearch.title, MediaSearch.thumbnail,
+                                  MediaSearch.release_date).order_by(MediaSearch.media_id.desc()).limit(recently_added)]
+    return stats
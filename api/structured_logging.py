@@ -0,0 +1,81 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Leveled, structured logging.
+#
+# Every record is put on an in-memory queue and written to stdout by a
+# background thread, so request threads never block on the log stream. Extra
+# fields passed with ``logger.info(..., extra={...})`` become keys of the JSON
+# line (LOG_FORMAT=json, the default) or key=value pairs (LOG_FORMAT=text).
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(_extras(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        extras = _extras(record)
+        if extras:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in extras.items())
+        return line
+
+
+class _BufferedHandler(QueueHandler):
+    def prepare(self, record):
+        # Keep extras and the traceback as separate fields instead of folding them into msg
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level='INFO', fmt='json', stream=None):
+    """Send every logger's records through the background writer. Safe to call more than once."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(TextFormatter() if fmt == 'text' else JSONFormatter())
+    log_queue = queue.SimpleQueue()
+    root.handlers[:] = [_BufferedHandler(log_queue)]
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    # Drains whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,273 @@
+import json
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, select
+
+from models import dialect_insert
+
+# TMDB client used by the admin auto-fill.
+#
+# One pooled requests.Session is shared by every lookup (keep-alive instead of
+# a TLS handshake per call), normalized payloads are cached with a TTL plus a
+# stale-while-revalidate window, 429/5xx answers are retried honoring
+# Retry-After, and concurrent lookups of the same id share one outbound call.
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TMDBError(Exception):
+    pass
+
+
+def normalize_cast(data, image_base_url):
+    cast_list = []
+    # Only get top 5 cast members with a profile image
+    for member in data.get('credits', {}).get('cast', [])[:5]:
+        if member.get('profile_path'):
+            cast_list.append({
+                "name": member.get('name'),
+                "character": member.get('character'),
+                "image": f"{image_base_url}{member.get('profile_path')}"
+            })
+    return cast_list
+
+
+def normalize_movie(data, image_base_url):
+    return {
+        'title': data.get('title', ''),
+        'description': data.get('overview', ''),
+        'thumbnail': f"{image_base_url}{data.get('poster_path', '')}" if data.get('poster_path') else '',
+        'release_date': data.get('release_date', ''),
+        'language': data.get('original_language', ''),
+        'rating': data.get('vote_average', 0),
+        'cast': normalize_cast(data, image_base_url)
+    }
+
+
+def normalize_tv(data, image_base_url):
+    return {
+        'title': data.get('name', ''),
+        'description': data.get('overview', ''),
+        'thumbnail': f"{image_base_url}{data.get('poster_path', '')}" if data.get('poster_path') else '',
+        'release_date': data.get('first_air_date', ''),
+        'language': data.get('original_language', ''),
+        'rating': data.get('vote_average', 0),
+        'cast': normalize_cast(data, image_base_url),
+        'total_seasons': len(data.get('seasons', []))
+    }
+
+
+class MemoryMetadataCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, payload, fetched_at):
+        with self._lock:
+            self._entries[key] = (payload, fetched_at)
+
+
+class SQLMetadataCache:
+    """Persistent cache in a ``tmdb_cache`` table of whatever database ``get_engine()`` returns."""
+
+    metadata = MetaData()
+    table = Table(
+        'tmdb_cache', metadata,
+        Column('key', String(64), primary_key=True),
+        Column('payload', Text, nullable=False),
+        Column('fetched_at', Float, nullable=False),
+    )
+
+    def __init__(self, get_engine):
+        self._get_engine = get_engine
+
+    @classmethod
+    def create_table(cls, conn):
+        cls.metadata.create_all(conn, checkfirst=True)
+
+    @property
+    def engine(self):
+        return self._get_engine()
+
+    def get(self, key):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.payload, self.table.c.fetched_at).where(self.table.c.key == key)
+            ).first()
+        if row is None:
+            return None
+        return json.loads(row.payload), row.fetched_at
+
+    def set(self, key, payload, fetched_at):
+        # An upsert, so processes caching the same key at once do not collide on the primary key
+        with self.engine.begin() as conn:
+            statement = dialect_insert(self.table, conn)
+            statement = statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'payload': statement.excluded.payload, 'fetched_at': statement.excluded.fetched_at}
+            )
+            conn.execute(statement, {'key': key, 'payload': json.dumps(payload), 'fetched_at': fetched_at})
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TMDBClient:
+    def __init__(self, api_key, base_url, image_base_url, cache=None, ttl=24 * 3600, stale_ttl=7 * 24 * 3600,
+                 timeout=10, max_retries=3, backoff=0.5, max_backoff=30, pool_size=10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.image_base_url = image_base_url
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    # requests is only needed for TMDB lookups, so keep it off the cold-start import path
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def movie(self, tmdb_id, fresh=False):
+        """Normalized movie details, or ``None`` if TMDB does not know the id.
+
+        ``fresh=True`` skips the cache read (the answer still refreshes the cache).
+        """
+        return self._lookup('movie', tmdb_id, normalize_movie, fresh)
+
+    def tv(self, tmdb_id, fresh=False):
+        """Normalized TV series details, or ``None`` if TMDB does not know the id."""
+        return self._lookup('tv', tmdb_id, normalize_tv, fresh)
+
+    def _lookup(self, kind, tmdb_id, normalize, fresh=False):
+        key = f"{kind}:{tmdb_id}"
+
+        def fetch():
+            data = self._get_json(f"/{kind}/{tmdb_id}", append_to_response='credits')
+            if data is None:
+                return None
+            payload = normalize(data, self.image_base_url)
+            if self.cache is not None:
+                try:
+                    self.cache.set(key, payload, time.time())
+                except Exception as e:
+                    # The lookup itself succeeded; the next one fetches again
+                    logger.warning("TMDB cache write failed", extra={'key': key, 'error': str(e)})
+            return payload
+
+        if self.cache is not None and not fresh:
+            try:
+                cached = self.cache.get(key)
+            except Exception as e:
+                logger.warning("TMDB cache read failed", extra={'key': key, 'error': str(e)})
+                cached = None
+            if cached is not None:
+                payload, fetched_at = cached
+                age = time.time() - fetched_at
+                if age < self.ttl:
+                    return payload
+                if age < self.ttl + self.stale_ttl:
+                    self._revalidate(key, fetch)
+                    return payload
+        return self._coalesce(key, fetch)
+
+    def _coalesce(self, key, fetch):
+        """Run ``fetch`` once per key; concurrent callers wait for and share its result."""
+        with self._in_flight_lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fetch()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def _revalidate(self, key, fetch):
+        with self._in_flight_lock:
+            if key in self._in_flight:
+                return
+
+        def run():
+            try:
+                self._coalesce(key, fetch)
+            except Exception as e:
+                logger.warning("Background TMDB refresh failed", extra={'key': key}, exc_info=e)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        return min(self.backoff * (2 ** attempt), self.max_backoff)
+
+    def _get_json(self, path, **params):
+        from requests import RequestException
+
+        params['api_key'] = self.api_key
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except RequestException as e:
+                if attempt == self.max_retries:
+                    raise TMDBError(f"TMDB request failed: {e}")
+                time.sleep(self._retry_delay(None, attempt))
+                continue
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code == 404:
+                return None
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(self._retry_delay(response, attempt))
+                continue
+            raise TMDBError(f"TMDB returned {response.status_code} for {path}")
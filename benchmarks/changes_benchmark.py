@@ -0,0 +1,85 @@
+"""Bytes a client downloads to catch up: /changes delta vs. a full /media pull.
+
+Seeds a catalog of TV series, records the client's sync point, adds new
+episodes through the admin API (as the admin panel does) and compares what
+the client transfers either way, raw and gzip-compressed.
+
+    python benchmarks/changes_benchmark.py --series 2000 --seasons 3 --episodes 10 --new-episodes 20
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--series', type=int, default=1000)
+    parser.add_argument('--seasons', type=int, default=3)
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--new-episodes', type=int, default=20)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'changes_bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+    import index
+    from catalog_import import write_batch
+
+    def episode(number):
+        return {'episode_number': number, 'episode_name': f'Episode {number}',
+                'video_720p': f'https://cdn.example.com/{random.getrandbits(64):x}.m3u8'}
+
+    with index.app.app_context():
+        index.init_db()
+        for start in range(0, args.series, 500):
+            write_batch([{
+                'type': 'tv', 'tmdb_id': 20_000_000 + i, 'title': f'Series {i}', 'description': 'Lorem ipsum ' * 20,
+                'cast': [{'name': f'Actor {i}-{n}', 'character': 'Role'} for n in range(5)],
+                'seasons': [{'season_number': s, 'episodes': [episode(e) for e in range(1, args.episodes + 1)]}
+                            for s in range(1, args.seasons + 1)]
+            } for i in range(start, min(start + 500, args.series))])
+            index.db.session.commit()
+        tv_ids = [row.id for row in index.db.session.query(index.TVSeries.id)]
+
+    client = index.app.test_client()
+    auth = {'Authorization': 'Basic ' + base64.b64encode(f"{index.ADMIN_USERNAME}:{index.ADMIN_PASSWORD}".encode()).decode()}
+    sync_point = client.get('/changes?limit=1').get_json()['latest_sequence']
+
+    for n in range(args.new_episodes):
+        response = client.post(f"/api/admin/tv-series/{random.choice(tv_ids)}/episodes", headers=auth,
+                               json=dict(episode(args.episodes + 1 + n), season_number=args.seasons))
+        assert response.status_code == 200, response.get_json()
+
+    def pull(path):
+        started = time.perf_counter()
+        raw = client.get(path).get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        compressed = client.get(path, headers={'Accept-Encoding': 'gzip'}).get_data()
+        return len(raw), len(compressed), elapsed
+
+    delta_raw, delta_gzip, delta_ms, after = 0, 0, 0.0, sync_point
+    while True:
+        raw, compressed, elapsed = pull(f'/changes?after={after}')
+        delta_raw, delta_gzip, delta_ms = delta_raw + raw, delta_gzip + compressed, delta_ms + elapsed
+        page = client.get(f'/changes?after={after}').get_json()
+        after = page['next_after']
+        if not page['has_more']:
+            break
+    full_raw, full_gzip, full_ms = pull('/media')
+
+    print(f"catalog: {args.series} series x {args.seasons} seasons x {args.episodes} episodes, "
+          f"{args.new_episodes} new episodes since sync point {sync_point}")
+    print(f"{'':10}{'raw bytes':>14}{'gzip bytes':>14}{'first pull ms':>16}")
+    print(f"{'/changes':10}{delta_raw:>14,}{delta_gzip:>14,}{delta_ms:>16.1f}")
+    print(f"{'/media':10}{full_raw:>14,}{full_gzip:>14,}{full_ms:>16.1f}")
+    print(f"delta is {full_gzip / max(delta_gzip, 1):.0f}x smaller compressed")
+
+
+if __name__ == '__main__':
+    main()
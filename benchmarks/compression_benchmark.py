@@ -0,0 +1,104 @@
+"""Bytes on the wire and CPU per request with and without response compression.
+
+Seeds a synthetic catalog, then requests a set of API routes and HTML pages
+with Accept-Encoding identity, gzip and br (when the brotli package is
+installed). The response cache is off by default, so every request pays for
+its compression; --response-cache shows the cached path, where compressed
+copies are reused. Finally the largest body is compressed at every level to
+help choose COMPRESS_GZIP_LEVEL / COMPRESS_BROTLI_QUALITY.
+
+    python benchmarks/compression_benchmark.py --movies 2000 --series 200 --requests 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def measure(client, path, encoding, requests):
+    """Median wall and CPU milliseconds per request, and the response size in bytes."""
+    headers = {'Accept-Encoding': encoding}
+    size, wall, cpu = 0, [], []
+    for _ in range(requests):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        response = client.get(path, headers=headers)
+        size = len(response.get_data())
+        wall.append((time.perf_counter() - wall_started) * 1000)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+        assert response.status_code == 200, (path, response.status_code)
+    return size, statistics.median(wall), statistics.median(cpu)
+
+
+def level_sweep(body, compressor):
+    print(f"\nCompression levels for a {len(body)} byte body:")
+    levels = {'gzip': [1, 3, 6, 9], 'br': [1, 3, 5, 7, 9, 11]}
+    for encoding in compressor.encodings:
+        for level in levels[encoding]:
+            started = time.process_time()
+            rounds = 0
+            while True:
+                compressed = compressor.compress(body, encoding, level)
+                rounds += 1
+                if time.process_time() - started > 0.2:
+                    break
+            cpu_ms = (time.process_time() - started) * 1000 / rounds
+            print(f"  {encoding:4s} level {level:2d}: {len(compressed):9d} bytes "
+                  f"({len(compressed) / len(body):6.1%})  {cpu_ms:8.2f}ms CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--series', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=30, help='Requests per route and encoding.')
+    parser.add_argument('--response-cache', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'compression_bench.db')}"
+    os.environ['RESPONSE_CACHE_URL'] = 'memory://?maxsize=1024' if args.response_cache else 'none'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Pages are rendered on first request rather than read from a stale build
+    os.environ.setdefault('PAGES_BUILD_DIR', tempfile.mkdtemp())
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+
+    import index
+    from benchmarks.suite import catalog
+    from models import MediaTable, Movie
+
+    with index.app.app_context():
+        index.init_db()
+        seed_seconds = catalog.seed(index.write_batch, index.db.session.commit, random.Random(args.seed),
+                                    args.movies, args.series, 3, 10, 5)
+        tv_id = index.db.session.query(MediaTable.id).filter(MediaTable.type == 'tv').first().id
+        word = index.db.session.query(Movie.title).first().title.split()[0].lower()
+    print(f"Seeded {args.movies} movies and {args.series} series in {seed_seconds:.1f}s; "
+          f"encodings: {', '.join(index.compressor.encodings)}")
+
+    paths = ['/media', '/media?limit=50', f'/media/{tv_id}', f'/media/{tv_id}?expand=episodes',
+             f'/search?q={word}', '/changes', '/admin', '/api/docs']
+    client = index.app.test_client()
+    encodings = ('identity',) + index.compressor.encodings
+    print(f"\n{'route':32s} {'encoding':8s} {'bytes':>10s} {'ratio':>7s} {'wall ms':>9s} {'CPU ms':>9s}")
+    largest = b''
+    for path in paths:
+        baseline = None
+        for encoding in encodings:
+            size, wall_ms, cpu_ms = measure(client, path, encoding, args.requests)
+            baseline = baseline or size
+            print(f"{path[:32]:32s} {encoding:8s} {size:10d} {size / baseline:7.1%} {wall_ms:9.2f} {cpu_ms:9.2f}")
+        body = client.get(path).get_data()
+        largest = body if len(body) > len(largest) else largest
+
+    level_sweep(largest, index.compressor)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Throughput of the link health sweep against a local stub CDN.
+
+Seeds a synthetic catalog, points every stream and download link at the
+link stub (a mix of healthy, slow, missing, HEAD-refusing and flaky links),
+then runs `check_links` once per --concurrency value. Prints links checked
+per second, the most requests the stub saw in flight at once (bounded by
+--per-host, since every link is on one host) and the status counts. A last
+pass with max_age shows the cost of a re-run that has nothing to check.
+
+    python benchmarks/link_check_benchmark.py --movies 2000 --series 100 --concurrency 8,32 --per-host 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def point_links_at(db, base_url, fields, slow_ms):
+    """Rewrite every stored link to a stub path, choosing the answer from the row id."""
+    kind = f"""CASE WHEN id % 23 = 0 THEN 'missing' WHEN id % 17 = 0 THEN 'slow/{slow_ms}'
+                   WHEN id % 13 = 0 THEN 'nohead' WHEN id % 11 = 0 THEN 'flaky' ELSE 'ok' END"""
+    for table in ('movie', 'episode'):
+        assignments = ', '.join(
+            f"{field} = CASE WHEN {field} IS NULL THEN NULL ELSE "
+            f"'{base_url}/' || {kind} || '/{table}-' || id || '-{field}' END" for field in fields
+        )
+        db.session.execute(db.text(f"UPDATE {table} SET {assignments}"))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--series', type=int, default=50)
+    parser.add_argument('--concurrency', default='8,32', help='Comma-separated thread pool sizes to compare.')
+    parser.add_argument('--per-host', type=int, default=16)
+    parser.add_argument('--delay', type=float, default=0.0, help='Politeness delay between requests to one host.')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Latency of every stub answer.')
+    parser.add_argument('--slow-ms', type=int, default=200, help='Extra latency of the slow links.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'link_check_bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+
+    import index
+    from benchmarks.suite import catalog
+    from benchmarks.suite.stub_links import StubLinks
+    from link_check import LINK_FIELDS, LinkChecker, check_links
+
+    stub = StubLinks(args.latency_ms).start()
+    with index.app.app_context():
+        index.init_db()
+        seed_seconds = catalog.seed(index.write_batch, index.db.session.commit, random.Random(args.seed),
+                                    args.movies, args.series, 3, 10, 5)
+        point_links_at(index.db, stub.base_url, LINK_FIELDS, args.slow_ms)
+    print(f"Seeded {args.movies} movies and {args.series} series in {seed_seconds:.1f}s; "
+          f"stub latency {args.latency_ms:.0f}ms, slow links +{args.slow_ms}ms")
+
+    def sweep(concurrency, max_age=None):
+        checker = LinkChecker(timeout=10, slow_ms=args.slow_ms, per_host=args.per_host, delay=args.delay)
+        stub.peak_in_flight = 0
+        started = time.perf_counter()
+        with index.app.app_context():
+            summary = check_links(checker, max_age=max_age, concurrency=concurrency)
+        return summary, time.perf_counter() - started
+
+    print(f"\n{'concurrency':>11s} {'links':>7s} {'seconds':>8s} {'links/s':>8s} {'peak':>5s}  statuses")
+    for concurrency in [int(value) for value in args.concurrency.split(',')]:
+        summary, seconds = sweep(concurrency)
+        print(f"{concurrency:11d} {summary['checked']:7d} {seconds:8.2f} {summary['checked'] / seconds:8.0f} "
+              f"{stub.peak_in_flight:5d}  ok {summary['ok']}, slow {summary['slow']}, broken {summary['broken']}")
+
+    summary, seconds = sweep(max(int(value) for value in args.concurrency.split(',')), timedelta(hours=1))
+    print(f"\nRe-run with max_age: {summary['skipped']} links skipped, {summary['checked']} checked in {seconds:.2f}s")
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
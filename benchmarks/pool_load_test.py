@@ -0,0 +1,85 @@
+"""Concurrent load against the database-backed read path, per pool mode.
+
+Runs worker threads that fetch /media/<id> with the response cache disabled,
+so every request checks a connection out of the pool, then prints throughput,
+latency percentiles and the pool metrics from /internal/pool.
+
+    python benchmarks/pool_load_test.py --mode queue --threads 32 --requests 4000
+    DATABASE_URL=postgresql://... python benchmarks/pool_load_test.py --mode null
+"""
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['null', 'queue'], default='queue')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--titles', type=int, default=200)
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--max-overflow', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MODE'] = args.mode
+    os.environ['DB_POOL_SIZE'] = str(args.pool_size)
+    os.environ['DB_MAX_OVERFLOW'] = str(args.max_overflow)
+    os.environ['RESPONSE_CACHE_URL'] = 'none'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool_load.db')}"
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+    import index
+    from catalog_import import write_batch
+    from models import MediaTable
+
+    with index.app.app_context():
+        index.init_db()
+        write_batch([{'type': 'movie', 'tmdb_id': 10_000_000 + i, 'title': f'Load test {i}', 'cast': [{'name': 'A'}]}
+                     for i in range(args.titles)])
+        index.db.session.commit()
+        media_ids = [row.id for row in index.db.session.query(MediaTable.id)]
+
+    client = index.app.test_client()
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_thread = args.requests // args.threads
+
+    def worker():
+        rng = random.Random()
+        local = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            response = client.get(f"/media/{rng.choice(media_ids)}")
+            local.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"mode={args.mode} threads={args.threads} requests={len(latencies)} errors={len(errors)}")
+    print(f"throughput {len(latencies) / elapsed:.0f} req/s, p50 {latencies[len(latencies) // 2]:.2f}ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}ms, mean {statistics.mean(latencies):.2f}ms")
+    auth = 'Basic ' + base64.b64encode(f"{index.ADMIN_USERNAME}:{index.ADMIN_PASSWORD}".encode()).decode()
+    print(client.get('/internal/pool', headers={'Authorization': auth}).get_json()['pools'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Search latency at catalog scale.
+
+Seeds a throwaway SQLite database with synthetic titles (100k by default) and
+times /search queries through the Flask test client. Point DATABASE_URL at a
+Postgres database to benchmark the tsvector/GIN path instead.
+
+    python benchmarks/search_benchmark.py --titles 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ran', 'tor', 'vel', 'zen', 'dra', 'gon', 'sil', 'mar', 'nex', 'pha', 'qui', 'bri']
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def synthetic_records(count, rng):
+    for i in range(count):
+        kind = 'movie' if i % 3 else 'tv'
+        yield {
+            'type': kind,
+            'tmdb_id': i + 1,
+            'title': ' '.join(word(rng) for _ in range(rng.randint(1, 4))).title(),
+            'description': ' '.join(word(rng) for _ in range(30)),
+            'release_date': f"{rng.randint(1950, 2025)}-01-01",
+            'language': rng.choice(['en', 'en', 'en', 'ja', 'ko', 'hi', 'fr']),
+            'rating': round(rng.uniform(1, 10), 1),
+            'cast': [{'name': f"{word(rng).title()} {word(rng).title()}"} for _ in range(5)],
+        }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(), 'search_bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('RESPONSE_CACHE_URL', 'none')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+    import index
+    from catalog_import import write_batch
+
+    rng = random.Random(args.seed)
+    client = index.app.test_client()
+    with index.app.app_context():
+        index.init_db()
+        started = time.perf_counter()
+        batch = []
+        for record in synthetic_records(args.titles, rng):
+            batch.append(record)
+            if len(batch) == 1000:
+                write_batch(batch)
+                index.db.session.commit()
+                batch = []
+        if batch:
+            write_batch(batch)
+            index.db.session.commit()
+        print(f"Seeded {args.titles} titles in {time.perf_counter() - started:.1f}s")
+
+        queries = {
+            'single term': lambda: word(rng),
+            'prefix': lambda: word(rng)[:3],
+            'two terms': lambda: f"{word(rng)} {word(rng)}",
+            'typo': lambda: word(rng)[:-1] + 'x',
+            'filtered': lambda: f"{word(rng)[:4]}&type=movie&language=en",
+        }
+        for name, make_query in queries.items():
+            timings = []
+            for _ in range(args.queries):
+                url = f"/search?q={make_query()}"
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.get_data(as_text=True)
+            print(f"{name:12s} p50={percentile(timings, 50):7.2f}ms  p95={percentile(timings, 95):7.2f}ms  "
+                  f"p99={percentile(timings, 99):7.2f}ms  mean={statistics.mean(timings):7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
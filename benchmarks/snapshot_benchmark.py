@@ -0,0 +1,126 @@
+"""Catalog snapshot against the database path for /media/<id>.
+
+Seeds a synthetic catalog and builds its snapshot, then compares:
+
+- memory: the snapshot file (mapped, so its pages live in the page cache and
+  are shared by every process on the host) and the resident set growth after
+  every document was read from the map, against the Python heap holding the
+  same documents (full and compact) in a dict would take;
+- lookups: ``CatalogSnapshot.get`` against ``load_document_bodies`` (the
+  SQLAlchemy query the view runs on a cache miss);
+- requests: GET /media/<id> with snapshot mode on and off, with the response
+  cache off so every request reaches the view.
+
+    python benchmarks/snapshot_benchmark.py --movies 5000 --series 500 --lookups 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def timed_calls(function, ids, rounds):
+    """Median and p99 microseconds per call of ``function(media_id)`` over random ``ids``."""
+    rng = random.Random(7)
+    samples = []
+    for _ in range(rounds):
+        media_id = rng.choice(ids)
+        started = time.perf_counter()
+        function(media_id)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--series', type=int, default=200)
+    parser.add_argument('--lookups', type=int, default=1000, help='Lookups and requests per measurement.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'snapshot_bench.db')}"
+    os.environ['RESPONSE_CACHE_URL'] = 'none'
+    os.environ['CATALOG_SNAPSHOT_DIR'] = tempfile.mkdtemp()
+    os.environ['CATALOG_SNAPSHOT_BUILD_DIR'] = tempfile.mkdtemp()
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+
+    import index
+    from benchmarks.suite import catalog
+    from catalog import load_document_bodies, query_media_ids
+    from snapshot import CatalogSnapshot, primary_catalog_version, snapshot_filename, write_snapshot
+
+    with index.app.app_context():
+        index.init_db()
+        seed_seconds = catalog.seed(index.write_batch, index.db.session.commit, random.Random(args.seed),
+                                    args.movies, args.series, 3, 10, 5)
+        ids = query_media_ids()
+        version = primary_catalog_version()
+        path = os.path.join(os.environ['CATALOG_SNAPSHOT_BUILD_DIR'], snapshot_filename(version))
+        started = time.perf_counter()
+        built = write_snapshot(path, version)
+        build_seconds = time.perf_counter() - started
+    print(f"Seeded {args.movies} movies and {args.series} series in {seed_seconds:.1f}s; snapshot of "
+          f"{built['titles']} titles built in {build_seconds:.2f}s")
+
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    snapshot = CatalogSnapshot(path)
+    mapped_heap = tracemalloc.get_traced_memory()[0]
+    for media_id in ids:
+        snapshot.get(media_id, compact=True)
+    rss_after = rss_bytes()
+    with index.app.app_context():
+        tracemalloc.reset_peak()
+        in_memory = dict(zip(ids, zip(load_document_bodies(ids), load_document_bodies(ids, compact=True))))
+        dict_heap = tracemalloc.get_traced_memory()[0] - mapped_heap
+    tracemalloc.stop()
+    print(f"\nSnapshot file: {built['bytes'] / 2**20:.1f} MiB, {mapped_heap / 1024:.1f} KiB of Python heap")
+    if rss_before is not None:
+        print(f"Resident set growth after reading every document from the map: "
+              f"{(rss_after - rss_before) / 2**20:.1f} MiB (shared page cache)")
+    print(f"Same documents in a dict: {dict_heap / 2**20:.1f} MiB of Python heap per process")
+    del in_memory
+
+    print(f"\n{'lookup':34s} {'median us':>10s} {'p99 us':>10s}")
+    median, p99 = timed_calls(lambda media_id: snapshot.get(media_id, compact=True), ids, args.lookups)
+    print(f"{'CatalogSnapshot.get':34s} {median:10.1f} {p99:10.1f}")
+    with index.app.app_context():
+        median, p99 = timed_calls(lambda media_id: load_document_bodies([media_id], compact=True), ids,
+                                  args.lookups)
+    print(f"{'load_document_bodies (SQLAlchemy)':34s} {median:10.1f} {p99:10.1f}")
+
+    client = index.app.test_client()
+    manager = index.snapshots
+    for label, snapshots in (('GET /media/<id>, snapshot mode', manager), ('GET /media/<id>, database', None)):
+        index.snapshots = snapshots
+        # The first request finds the snapshot built above in CATALOG_SNAPSHOT_BUILD_DIR
+        client.get(f'/media/{ids[0]}')
+        if snapshots is not None:
+            assert snapshots.status()['snapshot_version'] == version, 'snapshot not loaded'
+        median, p99 = timed_calls(lambda media_id: client.get(f'/media/{media_id}'), ids, args.lookups)
+        print(f"{label:34s} {median:10.1f} {p99:10.1f}")
+    index.snapshots = manager
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Cold-start cost of the serverless entry point.
+
+Spawns fresh interpreters the way a new Vercel instance starts and reports:
+
+* the slowest imports under ``python -X importtime -c "import index"``
+* time-to-first-response: process start until the first ``GET /media``
+  through the Flask test client has returned
+
+    python benchmarks/startup_benchmark.py --runs 10 --max-first-response-ms 1500
+
+With ``--max-first-response-ms`` / ``--max-import-ms`` the script exits
+non-zero when the median exceeds the budget, so it can gate CI.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+FIRST_RESPONSE_SCRIPT = """
+import sys, time
+sys.path.insert(0, {api_dir!r})
+import index
+response = index.app.test_client().get('/media')
+assert response.status_code == 200, response.status_code
+print(time.time())
+"""
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(env, top):
+    result = run_python(['-X', 'importtime', '-c', f"import sys; sys.path.insert(0, {API_DIR!r}); import index"], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match:
+            rows.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    total_us = next((cumulative for cumulative, _, name in rows if name == 'index'), 0)
+    # Top-level modules only (direct children of the root), slowest first
+    top_level = sorted((row for row in rows if row[1] <= 3 and row[2] != 'index'), reverse=True)[:top]
+    return total_us / 1000, top_level
+
+
+def first_response_ms(env):
+    # The child prints the wall clock once its first response is done
+    started = time.time()
+    result = run_python(['-c', FIRST_RESPONSE_SCRIPT.format(api_dir=API_DIR)], env)
+    return (float(result.stdout.strip().splitlines()[-1]) - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-response-ms', type=float)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Request logs go to stdout, where the child also reports its timestamp
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    if 'DATABASE_URL' not in env:
+        path = os.path.join(tempfile.mkdtemp(), 'startup_bench.db')
+        env['DATABASE_URL'] = f'sqlite:///{path}'
+        run_python(['-c', f"import sys; sys.path.insert(0, {API_DIR!r}); import index; index.init_db()"], env)
+    env.pop('AUTO_MIGRATE', None)
+
+    import_times, top_level = [], []
+    for _ in range(args.runs):
+        total_ms, top_level = import_profile(env, args.top)
+        import_times.append(total_ms)
+    print(f"import index: median {statistics.median(import_times):.1f}ms over {args.runs} runs")
+    for cumulative_us, _, name in top_level:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+    response_times = [first_response_ms(env) for _ in range(args.runs)]
+    print(f"time to first response: median {statistics.median(response_times):.1f}ms, "
+          f"max {max(response_times):.1f}ms")
+
+    failed = False
+    if args.max_import_ms and statistics.median(import_times) > args.max_import_ms:
+        print(f"❌ import time over budget ({args.max_import_ms}ms)")
+        failed = True
+    if args.max_first_response_ms and statistics.median(response_times) > args.max_first_response_ms:
+        print(f"❌ time to first response over budget ({args.max_first_response_ms}ms)")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""Reproducible benchmark suite for the public API and admin ingest.
+
+Seeds a synthetic catalog of configurable size into a fresh database, runs a
+fixed set of scenarios through the Flask test client with TMDB replaced by a
+local stub, and writes throughput and latency percentiles as JSON so runs can
+be compared across commits.
+
+    python -m benchmarks.suite run --movies 5000 --series 500
+    DATABASE_URL=postgresql://localhost/media_bench python -m benchmarks.suite run --reset
+    python -m benchmarks.suite compare before.json after.json --threshold 10
+
+Run from the repository root.
+"""
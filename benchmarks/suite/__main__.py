@@ -0,0 +1,178 @@
+import argparse
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from . import __doc__ as SUITE_DOC
+from . import catalog, compare, runner
+from .stub_tmdb import StubTMDB
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+API_DIR = os.path.join(REPO_DIR, 'api')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+
+def git_info():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+                'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except OSError:
+        return {'commit': 'unknown', 'dirty': None}
+
+
+def prepare_database(args):
+    """Point DATABASE_URL at the database to benchmark; SQLite defaults to a fresh temporary file."""
+    url = args.database or os.environ.get('DATABASE_URL')
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'suite.db')}"
+    elif url.startswith('sqlite:///') and args.reset and os.path.exists(url[len('sqlite:///'):]):
+        os.remove(url[len('sqlite:///'):])
+    os.environ['DATABASE_URL'] = url
+    return url
+
+
+def reset_postgres(index):
+    from sqlalchemy import text
+
+    with index.db.engine.begin() as conn:
+        conn.execute(text('DROP SCHEMA public CASCADE'))
+        conn.execute(text('CREATE SCHEMA public'))
+
+
+def build_fixture(index, shape):
+    from models import MediaTable, Movie, TVSeries
+
+    session = index.db.session
+    movie_ids = [row.id for row in session.query(MediaTable.id).filter(MediaTable.type == 'movie')]
+    tv_ids = [row.id for row in session.query(MediaTable.id).filter(MediaTable.type == 'tv')]
+    titles = [row.title for row in session.query(Movie.title).limit(500)]
+    titles += [row.title for row in session.query(TVSeries.title).limit(500)]
+    title_words = sorted({word.lower() for title in titles for word in title.split()})
+    return runner.Fixture(movie_ids, tv_ids, title_words, shape)
+
+
+def run(args):
+    url = prepare_database(args)
+    stub = StubTMDB(args.tmdb_latency_ms).start()
+    os.environ['TMDB_BASE_URL'] = stub.base_url
+    os.environ['TMDB_CACHE'] = 'none'
+    os.environ['RESPONSE_CACHE_URL'] = 'memory://' if args.response_cache else 'none'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.pop('AUTO_MIGRATE', None)
+    sys.path.insert(0, API_DIR)
+
+    import index
+    from models import MediaTable
+
+    backend = url.split(':', 1)[0].split('+', 1)[0]
+    with index.app.app_context():
+        if args.reset and backend == 'postgresql':
+            reset_postgres(index)
+        if not index.init_db():
+            sys.exit("❌ Could not apply migrations")
+        if index.db.session.query(MediaTable.id).first() is not None:
+            sys.exit("❌ The database already has titles; use an empty database or pass --reset")
+
+        shape = {'movies': args.movies, 'series': args.series, 'seasons': args.seasons,
+                 'episodes': args.episodes, 'cast': args.cast}
+        rng = random.Random(args.seed)
+        print(f"Seeding {args.movies} movies and {args.series} series "
+              f"({args.seasons} seasons x {args.episodes} episodes) on {backend}...")
+        seed_seconds = catalog.seed(index.write_batch, index.db.session.commit, rng, args.movies, args.series,
+                                    args.seasons, args.episodes, args.cast)
+        print(f"Seeded in {seed_seconds:.1f}s")
+        fixture = build_fixture(index, shape)
+        version = index.db.engine.dialect.server_version_info
+        index.db.session.remove()
+
+    available = {scenario.name: scenario for scenario in runner.scenarios(fixture)}
+    selected = args.scenarios.split(',') if args.scenarios else list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        sys.exit(f"❌ Unknown or unavailable scenarios: {', '.join(unknown)} (have {', '.join(available)})")
+    # Read scenarios first, so they all see the seeded catalog rather than one grown by ingest
+    selected.sort(key=lambda name: available[name].writes)
+
+    headers = runner.basic_auth(index.ADMIN_USERNAME, index.ADMIN_PASSWORD)
+    results = {
+        'suite': 1,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_info(),
+        'backend': backend,
+        'database_version': '.'.join(str(part) for part in version or ()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'catalog': dict(shape, seed=args.seed, seed_seconds=round(seed_seconds, 2)),
+        'settings': {'requests': args.requests, 'ingest_requests': args.ingest_requests,
+                     'concurrency': args.concurrency, 'warmup': args.warmup,
+                     'response_cache': args.response_cache, 'tmdb_latency_ms': args.tmdb_latency_ms},
+        'scenarios': {},
+    }
+    for name in selected:
+        scenario = available[name]
+        requests = args.ingest_requests if scenario.writes else args.requests
+        warmup = 0 if scenario.writes else args.warmup
+        result = runner.run_scenario(index.app, scenario, requests, args.concurrency, warmup, headers, args.seed)
+        results['scenarios'][name] = result
+        print(runner.format_result(name, result))
+    results['tmdb_stub_requests'] = stub.requests
+    stub.stop()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{results['git']['commit']}-{backend}-{stamp}.json")
+    runner.write_results(output, results)
+    print(f"Results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=SUITE_DOC,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed a catalog and benchmark every scenario.')
+    run_parser.add_argument('--database', help='Database URL (default: DATABASE_URL, else a temporary SQLite file).')
+    run_parser.add_argument('--reset', action='store_true',
+                            help='Empty the database first (drops the public schema on Postgres).')
+    run_parser.add_argument('--movies', type=int, default=2000)
+    run_parser.add_argument('--series', type=int, default=200)
+    run_parser.add_argument('--seasons', type=int, default=3, help='Seasons per series.')
+    run_parser.add_argument('--episodes', type=int, default=10, help='Episodes per season.')
+    run_parser.add_argument('--cast', type=int, default=5, help='Cast members per title.')
+    run_parser.add_argument('--requests', type=int, default=300, help='Requests per read scenario.')
+    run_parser.add_argument('--ingest-requests', type=int, default=50, help='Requests per admin scenario.')
+    run_parser.add_argument('--concurrency', type=int, default=1)
+    run_parser.add_argument('--warmup', type=int, default=10)
+    run_parser.add_argument('--scenarios', help='Comma-separated subset of scenarios to run.')
+    run_parser.add_argument('--response-cache', action='store_true',
+                            help='Keep the in-memory response cache on (off by default, to measure the database path).')
+    run_parser.add_argument('--tmdb-latency-ms', type=float, default=20, help='Delay added by the TMDB stub.')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help='Result file (default: benchmarks/results/<commit>-<backend>-<time>.json).')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files.')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=10,
+                                help='Percent change in a timing that counts as a regression.')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        regressions = compare.compare(compare.load(args.base), compare.load(args.head), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold}%")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
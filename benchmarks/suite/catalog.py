@@ -0,0 +1,105 @@
+"""Synthetic catalog records, shaped like the admin forms' payloads."""
+import time
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ran', 'tor', 'vel', 'zen', 'dra', 'gon', 'sil', 'mar', 'nex', 'pha', 'qui', 'bri']
+LANGUAGES = ['en', 'en', 'en', 'ja', 'ko', 'hi', 'fr']
+
+# TMDB ids of seeded titles start here; ingest scenarios allocate ids above them
+SEED_TMDB_ID = 1_000_000
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def words(rng, count):
+    return ' '.join(word(rng) for _ in range(count))
+
+
+def cdn_url(rng, suffix):
+    return f"https://cdn.example.com/{rng.getrandbits(64):016x}.{suffix}"
+
+
+def cast(rng, count):
+    return [{
+        'name': f"{word(rng).title()} {word(rng).title()}",
+        'character': word(rng).title(),
+        'image': f"https://image.tmdb.org/t/p/original/{rng.getrandbits(32):08x}.jpg",
+    } for _ in range(count)]
+
+
+def links(rng):
+    video_links = {'video_720p': cdn_url(rng, 'm3u8'), 'video_1080p': cdn_url(rng, 'm3u8')}
+    download_links = {
+        'download_720p': {'url': cdn_url(rng, 'mp4'), 'file_type': 'mp4'},
+        'download_1080p': {'url': cdn_url(rng, 'mkv'), 'file_type': 'mkv'},
+    }
+    return video_links, download_links
+
+
+def _title_fields(rng, cast_size):
+    return {
+        'title': words(rng, rng.randint(1, 4)).title(),
+        'description': words(rng, 30),
+        'thumbnail': f"https://image.tmdb.org/t/p/original/{rng.getrandbits(32):08x}.jpg",
+        'release_date': f"{rng.randint(1950, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'language': rng.choice(LANGUAGES),
+        'rating': round(rng.uniform(1, 10), 1),
+        'cast': cast(rng, cast_size),
+    }
+
+
+def movie(rng, tmdb_id, cast_size=5):
+    record = _title_fields(rng, cast_size)
+    record['video_links'], record['download_links'] = links(rng)
+    record.update({'type': 'movie', 'tmdb_id': tmdb_id})
+    return record
+
+
+def episode(rng, number):
+    video_links, download_links = links(rng)
+    return {'episode_number': number, 'episode_name': f"Episode {number}: {words(rng, 2).title()}",
+            'video_links': video_links, 'download_links': download_links}
+
+
+def series(rng, tmdb_id, seasons=3, episodes=10, cast_size=5):
+    record = _title_fields(rng, cast_size)
+    record.update({
+        'type': 'tv',
+        'tmdb_id': tmdb_id,
+        'total_seasons': seasons,
+        'seasons': [{
+            'season_number': season_number,
+            'total_episodes': episodes,
+            'episodes': [episode(rng, number) for number in range(1, episodes + 1)],
+        } for season_number in range(1, seasons + 1)],
+    })
+    return record
+
+
+def records(rng, movies, series_count, seasons, episodes, cast_size):
+    """Movies and series interleaved, so each write batch mixes both types."""
+    total = movies + series_count
+    for i in range(total):
+        tmdb_id = SEED_TMDB_ID + i
+        # Spread the series evenly through the sequence
+        if series_count and i * series_count // total != (i + 1) * series_count // total:
+            yield series(rng, tmdb_id, seasons, episodes, cast_size)
+        else:
+            yield movie(rng, tmdb_id, cast_size)
+
+
+def seed(write_batch, commit, rng, movies, series_count, seasons, episodes, cast_size, batch_size=500):
+    """Write the synthetic catalog through ``write_batch``. Returns the elapsed seconds."""
+    started = time.perf_counter()
+    batch = []
+    for record in records(rng, movies, series_count, seasons, episodes, cast_size):
+        batch.append(record)
+        if len(batch) == batch_size:
+            write_batch(batch)
+            commit()
+            batch = []
+    if batch:
+        write_batch(batch)
+        commit()
+    return time.perf_counter() - started
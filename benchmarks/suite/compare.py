@@ -0,0 +1,67 @@
+"""Side-by-side comparison of two result files."""
+import json
+
+METRICS = (
+    ('throughput_rps', None, 'req/s', True),
+    ('latency_ms', 'p50', 'p50', False),
+    ('latency_ms', 'p95', 'p95', False),
+    ('latency_ms', 'p99', 'p99', False),
+    ('db_statements_mean', None, 'queries', False),
+)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _value(result, key, sub):
+    value = result.get(key)
+    if sub is not None:
+        value = (value or {}).get(sub)
+    return value
+
+
+def _shape(results):
+    shape = {key: value for key, value in results['catalog'].items() if key != 'seed_seconds'}
+    return shape, results['backend'], results['settings']
+
+
+def _change(before, after, higher_is_better):
+    """Relative change in percent, positive meaning worse."""
+    if not before or after is None:
+        return None
+    change = (after - before) / before * 100
+    return -change if higher_is_better else change
+
+
+def compare(base, head, threshold):
+    """Print a table of both runs; returns the ``(scenario, metric, change)`` regressions over ``threshold`` percent."""
+    print(f"base: {base['git']['commit']} ({base['backend']}, {base['started_at']})")
+    print(f"head: {head['git']['commit']} ({head['backend']}, {head['started_at']})")
+    if _shape(base) != _shape(head):
+        print("⚠️ catalog shape, backend or settings differ, numbers are not directly comparable")
+    print("changes are relative to base, positive meaning worse")
+
+    regressions = []
+    for name, head_result in head['scenarios'].items():
+        base_result = base['scenarios'].get(name)
+        if base_result is None:
+            print(f"\n{name}: only in head")
+            continue
+        print(f"\n{name}")
+        for key, sub, label, higher_is_better in METRICS:
+            before, after = _value(base_result, key, sub), _value(head_result, key, sub)
+            change = _change(before, after, higher_is_better)
+            marker = ''
+            # Query counts are exact, so any increase is flagged; timings get the noise threshold
+            limit = 0 if key == 'db_statements_mean' else threshold
+            if change is not None and change > limit:
+                marker = '  ❌ worse'
+                regressions.append((name, label, change))
+            elif change is not None and change < -limit:
+                marker = '  ✅ better'
+            shown = f"{change:+6.1f}%" if change is not None else '      -'
+            print(f"  {label:8s} {before if before is not None else '-':>10}  ->  "
+                  f"{after if after is not None else '-':>10}  {shown}{marker}")
+    return regressions
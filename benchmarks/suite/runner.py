@@ -0,0 +1,200 @@
+"""Scenario definitions and the load loop."""
+import base64
+import itertools
+import json
+import random
+import re
+import statistics
+import threading
+import time
+
+from . import catalog
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+# Manifest size of one admin_import request
+IMPORT_ITEMS = 10
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def latency_summary(samples):
+    if not samples:
+        return None
+    return {
+        'p50': round(percentile(samples, 50), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+        'mean': round(statistics.mean(samples), 3),
+        'max': round(max(samples), 3),
+    }
+
+
+class Scenario:
+    """One request shape. ``build(rng)`` returns ``(method, path, json_body)``."""
+
+    def __init__(self, name, build, writes=False):
+        self.name = name
+        self.build = build
+        self.writes = writes
+
+
+class Fixture:
+    """What the scenarios pick from: the seeded ids and title words, and fresh TMDB ids for ingest."""
+
+    def __init__(self, movie_ids, tv_ids, title_words, shape):
+        self.movie_ids = movie_ids
+        self.tv_ids = tv_ids
+        self.title_words = title_words
+        self.shape = shape
+        self._tmdb_ids = itertools.count(catalog.SEED_TMDB_ID * 10)
+
+    def next_tmdb_id(self):
+        return next(self._tmdb_ids)
+
+
+def scenarios(fixture):
+    all_ids = fixture.movie_ids + fixture.tv_ids
+    shape = fixture.shape
+
+    def media_page(rng):
+        return 'GET', f"/media?limit=50&cursor={rng.choice(all_ids)}", None
+
+    def media_full(rng):
+        return 'GET', '/media', None
+
+    def media_detail_movie(rng):
+        return 'GET', f"/media/{rng.choice(fixture.movie_ids)}", None
+
+    def media_detail_tv(rng):
+        return 'GET', f"/media/{rng.choice(fixture.tv_ids)}", None
+
+    def media_detail_tv_expanded(rng):
+        return 'GET', f"/media/{rng.choice(fixture.tv_ids)}?expand=episodes", None
+
+    def season_episodes(rng):
+        return 'GET', f"/media/{rng.choice(fixture.tv_ids)}/seasons/{rng.randint(1, shape['seasons'])}/episodes", None
+
+    def search(rng):
+        terms = rng.sample(fixture.title_words, min(rng.randint(1, 2), len(fixture.title_words)))
+        return 'GET', f"/search?q={'+'.join(terms)}", None
+
+    def stats(rng):
+        return 'GET', '/api/stats', None
+
+    def admin_add_movie(rng):
+        return 'POST', '/api/admin/movies', catalog.movie(rng, fixture.next_tmdb_id(), shape['cast'])
+
+    def admin_add_tv(rng):
+        record = catalog.series(rng, fixture.next_tmdb_id(), shape['seasons'], shape['episodes'], shape['cast'])
+        return 'POST', '/api/admin/tv-series', record
+
+    def admin_import(rng):
+        items = [{'type': 'movie' if n % 2 else 'tv', 'tmdb_id': fixture.next_tmdb_id()} for n in range(IMPORT_ITEMS)]
+        return 'POST', '/api/admin/import', items
+
+    available = [
+        Scenario('media_page', media_page),
+        Scenario('media_full', media_full),
+        Scenario('media_detail_movie', media_detail_movie),
+        Scenario('media_detail_tv', media_detail_tv),
+        Scenario('media_detail_tv_expanded', media_detail_tv_expanded),
+        Scenario('season_episodes', season_episodes),
+        Scenario('search', search),
+        Scenario('stats', stats),
+        Scenario('admin_add_movie', admin_add_movie, writes=True),
+        Scenario('admin_add_tv', admin_add_tv, writes=True),
+        Scenario('admin_import', admin_import, writes=True),
+    ]
+    # Drop scenarios the seeded catalog cannot serve (e.g. no series seeded)
+    if not fixture.movie_ids:
+        available = [s for s in available if s.name != 'media_detail_movie']
+    if not fixture.tv_ids or not shape['seasons']:
+        available = [s for s in available if s.name not in ('media_detail_tv', 'media_detail_tv_expanded',
+                                                             'season_episodes')]
+    if not all_ids:
+        available = [s for s in available if s.name != 'media_page']
+    if not fixture.title_words:
+        available = [s for s in available if s.name != 'search']
+    return available
+
+
+def basic_auth(username, password):
+    return {'Authorization': 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()}
+
+
+def run_scenario(app, scenario, requests, concurrency, warmup, headers, seed):
+    """Issue ``requests`` requests from ``concurrency`` threads; returns the scenario's result dict."""
+    remaining = itertools.count()
+    latencies, db_ms, db_statements, errors = [], [], [], {}
+    lock = threading.Lock()
+
+    def send(client, rng):
+        method, path, body = scenario.build(rng)
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        return response, elapsed
+
+    def worker(index):
+        client = app.test_client()
+        # Per-worker generators keep runs with the same seed and concurrency repeatable
+        rng = random.Random(seed * 1000 + index)
+        local = ([], [], [], {})
+        while next(remaining) < requests:
+            response, elapsed = send(client, rng)
+            if response.status_code >= 400:
+                local[3][response.status_code] = local[3].get(response.status_code, 0) + 1
+                continue
+            local[0].append(elapsed)
+            match = SERVER_TIMING_DB.search(response.headers.get('Server-Timing', ''))
+            if match:
+                local[1].append(float(match.group(1)))
+                local[2].append(int(match.group(2)))
+        with lock:
+            latencies.extend(local[0])
+            db_ms.extend(local[1])
+            db_statements.extend(local[2])
+            for status, count in local[3].items():
+                errors[status] = errors.get(status, 0) + count
+
+    warm_client, warm_rng = app.test_client(), random.Random(seed - 1)
+    for _ in range(warmup):
+        send(warm_client, warm_rng)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': {str(status): count for status, count in sorted(errors.items())},
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': latency_summary(latencies),
+        'db_ms': latency_summary(db_ms),
+        'db_statements_mean': round(statistics.mean(db_statements), 2) if db_statements else None,
+    }
+
+
+def format_result(name, result):
+    latency = result['latency_ms'] or {}
+    errors = sum(result['errors'].values())
+    return (f"{name:24s} {result['throughput_rps'] or 0:9.1f} req/s  p50={latency.get('p50', 0):8.2f}ms  "
+            f"p95={latency.get('p95', 0):8.2f}ms  p99={latency.get('p99', 0):8.2f}ms  "
+            f"queries={result['db_statements_mean'] or 0:5.1f}" + (f"  errors={errors}" if errors else ''))
+
+
+def write_results(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,116 @@
+"""Local stand-in for the CDNs behind stream and download links, for link check benchmarks.
+
+The first path segment picks the answer:
+
+- ``/ok/<name>``: 200 with a Content-Length;
+- ``/slow/<ms>/<name>``: the same after ``ms`` milliseconds;
+- ``/missing/<name>``: 404;
+- ``/nohead/<name>``: 405 to HEAD, 206 with a Content-Range to a Range GET;
+- ``/flaky/<name>``: 503 with Retry-After to the first request, then 200.
+
+Every answer also waits ``latency_ms``. It can be run on its own and pointed
+at by links of a local catalog:
+
+    python -m benchmarks.suite.stub_links --port 8766 --latency-ms 20
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILE_SIZE = 734003200
+
+
+class StubLinks:
+    def __init__(self, latency_ms=0, port=0):
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def answer(self, status, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                if not any(name == 'Content-Length' for name, _ in headers):
+                    self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def respond(self, head):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                    first = self.path not in stub._seen
+                    stub._seen.add(self.path)
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    parts = self.path.split('?')[0].strip('/').split('/')
+                    kind = parts[0]
+                    if kind == 'slow' and len(parts) > 1 and parts[1].isdigit():
+                        time.sleep(int(parts[1]) / 1000)
+                    if kind == 'missing' or kind not in ('ok', 'slow', 'nohead', 'flaky'):
+                        self.answer(404)
+                    elif kind == 'flaky' and first:
+                        self.answer(503, [('Retry-After', '0')])
+                    elif kind == 'nohead' and head:
+                        self.answer(405, [('Allow', 'GET')])
+                    elif self.headers.get('Range') == 'bytes=0-0':
+                        self.answer(206, [('Content-Range', f'bytes 0-0/{FILE_SIZE}'), ('Content-Length', '1')])
+                        if not head:
+                            self.wfile.write(b'\0')
+                    else:
+                        # HEAD only; a full GET is never needed by the checker
+                        self.answer(200, [('Content-Type', 'video/mp4'), ('Content-Length', str(FILE_SIZE))])
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def do_HEAD(self):
+                self.respond(head=True)
+
+            def do_GET(self):
+                self.respond(head=False)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite.stub_links', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    args = parser.parse_args()
+    stub = StubLinks(args.latency_ms, args.port)
+    print(f"Link stub listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Local stand-in for the TMDB API, so ingest benchmarks never leave the machine.
+
+Answers ``/3/movie/<id>`` and ``/3/tv/<id>`` with a deterministic payload
+after an optional fixed delay that stands in for network latency. It can
+also be run on its own, e.g. to point a local enrichment worker at it:
+
+    python -m benchmarks.suite.stub_tmdb --port 8765 --latency-ms 50 --error-rate 0.05
+    TMDB_BASE_URL=http://127.0.0.1:8765/3 flask --app api/index.py jobs-worker
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def details(kind, tmdb_id):
+    return {
+        'id': tmdb_id,
+        'title': f'Stub movie {tmdb_id}',
+        'name': f'Stub series {tmdb_id}',
+        'overview': f'Synthetic {kind} {tmdb_id} served by the benchmark TMDB stub.',
+        'poster_path': f'/{tmdb_id}.jpg',
+        'release_date': '2001-02-03',
+        'first_air_date': '2005-01-01',
+        'original_language': 'en',
+        'vote_average': 7.1,
+        'seasons': [{'season_number': 1}, {'season_number': 2}],
+        'credits': {'cast': [
+            {'name': f'Actor {n}', 'character': f'Role {n}', 'profile_path': f'/actor{n}.jpg'} for n in range(8)
+        ]},
+    }
+
+
+class StubTMDB:
+    def __init__(self, latency_ms=0, error_rate=0.0, port=0, rate_limited=0):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        # The first rate_limited requests are answered with 429, for deterministic retry tests
+        self.rate_limited = rate_limited
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    limited = stub.requests <= stub.rate_limited
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if limited or (stub.error_rate and random.random() < stub.error_rate):
+                    # What TMDB answers when the rate limit is hit
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                parts = self.path.split('?')[0].strip('/').split('/')
+                if len(parts) != 3 or parts[1] not in ('movie', 'tv') or not parts[2].isdigit():
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(details(parts[1], int(parts[2]))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/3"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite.stub_tmdb', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of requests answered with 429.')
+    args = parser.parse_args()
+    stub = StubTMDB(args.latency_ms, args.error_rate, args.port)
+    print(f"TMDB stub listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
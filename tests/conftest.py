@@ -0,0 +1,113 @@
+"""Shared fixtures: the app on a throwaway SQLite database, migrated with init_db.
+
+index reads its configuration from the environment at import time, so the
+database and the cache settings are set here, before any test imports it.
+"""
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event, text
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+# Every request reaches the view; no snapshot mode
+os.environ['RESPONSE_CACHE_URL'] = 'none'
+os.environ.pop('CATALOG_SNAPSHOT_DIR', None)
+os.environ.pop('DATABASE_READ_URL', None)
+os.environ['TMDB_CACHE'] = 'memory'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+
+import index  # noqa: E402
+from benchmarks.suite import catalog  # noqa: E402
+from benchmarks.suite.stub_tmdb import StubTMDB  # noqa: E402
+from migrations import create_unique_tmdb_ids  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    assert index.init_db(), 'migrations failed'
+    return index.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def seed(app):
+    """``seed(movies, series)`` adds synthetic titles (see benchmarks/suite/catalog.py); tmdb ids never repeat."""
+    rng = random.Random(42)
+    offset = [0]
+
+    def add(movies, series=0):
+        with app.app_context():
+            records = list(catalog.records(rng, movies, series, 2, 4, 3))
+            for record in records:
+                record['tmdb_id'] += offset[0]
+            offset[0] += len(records)
+            index.write_batch(records)
+            index.db.session.commit()
+    return add
+
+
+@pytest.fixture
+def tmdb_stub():
+    """``tmdb_stub(**options)`` starts a local TMDB stand-in (benchmarks/suite/stub_tmdb.py), stopped after the test."""
+    stubs = []
+
+    def start(**options):
+        stubs.append(StubTMDB(**options).start())
+        return stubs[-1]
+    yield start
+    for stub in stubs:
+        stub.stop()
+
+
+@pytest.fixture
+def allow_duplicates(app):
+    """Drop the unique (type, tmdb_id) indexes for the test, as on a database that predates them."""
+    with app.app_context():
+        index.db.session.execute(text('DROP INDEX uq_movie_type_tmdb_id'))
+        index.db.session.execute(text('DROP INDEX uq_tv_series_type_tmdb_id'))
+        index.db.session.commit()
+    yield
+    with app.app_context():
+        create_unique_tmdb_ids(index.db.session.connection())
+        index.db.session.commit()
+
+
+class StatementCounter:
+    """Counts statements sent to the primary engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements(app):
+    def counter():
+        with app.app_context():
+            return StatementCounter(index.db.engine)
+    return counter
@@ -0,0 +1,54 @@
+"""Admin ingest answers malformed titles with 400 and the first problem, before writing anything."""
+import base64
+import random
+
+import pytest
+
+from benchmarks.suite import catalog
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+def movie(rng_seed=1, **changes):
+    record = catalog.movie(random.Random(rng_seed), 5_000_000 + rng_seed)
+    record.update(changes)
+    return record
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'cast': [{'character': 'Nobody'}]}, 'cast[1].name must be a non-empty string'),
+    ({'cast': [{'name': 'Ann'}, {'name': '   '}]}, 'cast[2].name must be a non-empty string'),
+    ({'cast': [{'name': 'Ann', 'character': 7}]}, 'cast[1].character must be a string'),
+    ({'download_links': {'download_720p': 5}}, 'download_720p must be a URL or an object with url and file_type'),
+    ({'download_links': {'download_720p': {'url': 5}}}, 'download_720p.url must be a string'),
+    ({'download_links': {'1080p': {'url': 'https://cdn.example.com/a.mkv', 'file_type': ['mkv']}}},
+     'download_1080p.file_type must be a string'),
+    ({'video_links': {'video_720p': {'url': 'x'}}}, 'video_720p must be a string'),
+    ({'video_links': {'video_720p': 'https://cdn.example.com/' + 'a' * 500}}, 'video_720p must be at most 500'),
+    ({'title': 'T' * 201}, 'title must be at most 200 characters'),
+    ({'language': 'x' * 51}, 'language must be at most 50 characters'),
+    ({'description': 12}, 'description must be a string'),
+])
+def test_bad_movie_is_rejected(client, changes, message):
+    response = client.post('/api/admin/movies', json=movie(**changes), headers=AUTH)
+    assert response.status_code == 400, response.get_data(as_text=True)
+    assert response.get_json()['error'].startswith(message)
+
+
+def test_valid_movie_is_added(client):
+    response = client.post('/api/admin/movies', json=movie(2, cast=[{'name': 'Ann', 'character': None}]),
+                           headers=AUTH)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_bad_episode_is_rejected(client):
+    series = catalog.series(random.Random(3), 5_000_003, seasons=1, episodes=2)
+    series['seasons'][0]['episodes'][1]['download_links'] = {'download_720p': 5}
+    response = client.post('/api/admin/tv-series', json=series, headers=AUTH)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('S1E2 download_720p must be a URL')
+
+    series['seasons'][0]['episodes'][1] = {'episode_number': 2, 'episode_name': 'E' * 201}
+    response = client.post('/api/admin/tv-series', json=series, headers=AUTH)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'S1E2 episode_name must be at most 200 characters'
@@ -0,0 +1,68 @@
+"""/media and /media/<id> run a fixed number of statements, however large the catalog is."""
+import pytest
+
+import index
+from catalog import load_catalog, query_media_ids, rebuild_documents
+from models import MediaDocument
+
+
+def statements_per_request(client, count_statements, url):
+    client.get(url)  # warm up: connection setup and the first catalog version read
+    with count_statements() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return counter.count
+
+
+@pytest.mark.parametrize('url', ['/media', '/media?type=tv&limit=50', '/media?fields=id,title,cast'])
+def test_media_list_statements_do_not_grow_with_catalog(client, seed, count_statements, url):
+    seed(5, 2)
+    small = statements_per_request(client, count_statements, url)
+    seed(60, 15)
+    large = statements_per_request(client, count_statements, url)
+    # The page of ids, then their documents
+    assert small == large == 2
+
+
+@pytest.mark.parametrize('expand', ['', '?expand=episodes'])
+def test_media_details_statements_do_not_grow_with_title_size(app, client, seed, count_statements, expand):
+    seed(3, 3)
+    with app.app_context():
+        movie_id = query_media_ids(media_type='movie', limit=1)[0]
+        tv_id = query_media_ids(media_type='tv', limit=1)[0]
+    movie = statements_per_request(client, count_statements, f'/media/{movie_id}{expand}')
+    tv = statements_per_request(client, count_statements, f'/media/{tv_id}{expand}')
+    # One document read, with or without the episodes
+    assert movie == tv == 1
+
+
+def test_catalog_loader_statements_do_not_grow_with_catalog(app, seed, count_statements):
+    """Titles without a stored document are built by load_catalog in one batch of queries."""
+    seed(4, 2)
+    with app.app_context():
+        small_ids = query_media_ids()
+        with count_statements() as small:
+            load_catalog(small_ids)
+    seed(40, 10)
+    with app.app_context():
+        large_ids = query_media_ids()
+        with count_statements() as large:
+            documents = load_catalog(large_ids)
+    assert len(documents) == len(large_ids)
+    assert small.count == large.count
+
+
+def test_media_list_without_stored_documents(app, client, seed, count_statements):
+    seed(5, 2)
+    with app.app_context():
+        index.db.session.query(MediaDocument).delete()
+        index.db.session.commit()
+    small = statements_per_request(client, count_statements, '/media')
+    seed(30, 8)
+    with app.app_context():
+        index.db.session.query(MediaDocument).delete()
+        index.db.session.commit()
+    large = statements_per_request(client, count_statements, '/media')
+    with app.app_context():
+        rebuild_documents()
+    assert small == large
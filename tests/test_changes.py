@@ -0,0 +1,77 @@
+"""The /changes feed: admin writes show up after the client's sequence, and compacted sequences get 410."""
+import base64
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.suite import catalog
+from changes import change_bounds
+from models import db, CatalogChange
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+def latest_sequence(app):
+    with app.app_context():
+        return change_bounds()[1] or 0
+
+
+def test_admin_writes_show_up_after_the_sequence(app, client):
+    after = latest_sequence(app)
+    movie = catalog.movie(random.Random(1), 9_200_001)
+    movie_id = client.post('/api/admin/movies', json=movie, headers=AUTH).get_json()['id']
+    series = catalog.series(random.Random(2), 9_200_002, seasons=1, episodes=1)
+    tv_id = client.post('/api/admin/tv-series', json=series, headers=AUTH).get_json()['id']
+    episode = {'season_number': 2, 'episode_number': 1, 'episode_name': 'Pilot'}
+    assert client.post(f'/api/admin/tv-series/{tv_id}/episodes', json=episode, headers=AUTH).status_code == 200
+
+    feed = client.get(f'/changes?after={after}').get_json()
+    assert [(change['kind'], change['media_id'], change['season_number'], change['episode_number'])
+            for change in feed['changes']] == [('movie_added', movie_id, None, None), ('tv_added', tv_id, None, None),
+                                               ('season_added', tv_id, 2, None), ('episode_added', tv_id, 2, 1)]
+    added = feed['changes'][0]['data']
+    assert (added['id'], added['title']) == (movie_id, movie['title'])
+    assert feed['changes'][3]['data']['episode_name'] == 'Pilot'
+    assert feed['next_after'] == feed['latest_sequence'] == feed['changes'][-1]['sequence']
+    assert not feed['has_more']
+
+    # Caught up: nothing new, and next_after stays where it was
+    caught_up = client.get(f"/changes?after={feed['next_after']}").get_json()
+    assert (caught_up['changes'], caught_up['next_after']) == ([], feed['next_after'])
+
+
+def test_next_after_walks_the_feed_in_pages(app, client):
+    after = latest_sequence(app)
+    for n in range(5):
+        client.post('/api/admin/movies', json=catalog.movie(random.Random(n), 9_200_010 + n), headers=AUTH)
+
+    sequences = []
+    while True:
+        page = client.get(f'/changes?after={after}&limit=2').get_json()
+        assert len(page['changes']) <= 2
+        sequences += [change['sequence'] for change in page['changes']]
+        if not page['has_more']:
+            break
+        assert page['next_after'] > after
+        after = page['next_after']
+    assert len(sequences) == 5 and sequences == sorted(set(sequences))
+    assert sequences[-1] == page['latest_sequence']
+
+
+def test_compacted_sequences_are_gone(app, client):
+    client.post('/api/admin/movies', json=catalog.movie(random.Random(3), 9_200_020), headers=AUTH)
+    with app.app_context():
+        CatalogChange.query.update({CatalogChange.created_at: datetime.utcnow() - timedelta(days=31)})
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['changes-compact', '--days', '30'])
+    assert 'Removed' in result.output
+
+    # Only the newest entry is kept, so a client that has not seen it can still catch up
+    latest = latest_sequence(app)
+    response = client.get(f'/changes?after={latest - 1}')
+    assert response.status_code == 200 and [c['sequence'] for c in response.get_json()['changes']] == [latest]
+    for after in (0, latest - 2):
+        response = client.get(f'/changes?after={after}')
+        assert response.status_code == 410
+        assert response.get_json()['oldest_sequence'] == response.get_json()['latest_sequence'] == latest
+
+    assert client.get('/changes?after=soon').status_code == 400
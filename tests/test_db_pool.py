@@ -0,0 +1,81 @@
+"""Pool mode selection from DB_POOL_* settings and the checkout/wait metrics of both pool classes."""
+import base64
+import os
+import tempfile
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+from db_pool import MetricsNullPool, MetricsQueuePool, engine_options, pool_stats
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+def make_engine(environ):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}"
+    return create_engine(url, **engine_options(url, environ))
+
+
+def test_mode_comes_from_the_environment():
+    assert engine_options('sqlite://', {})['poolclass'] is MetricsQueuePool
+    assert engine_options('sqlite://', {'VERCEL': '1'})['poolclass'] is MetricsNullPool
+    assert engine_options('sqlite://', {'VERCEL': '1', 'DB_POOL_MODE': 'queue'})['poolclass'] is MetricsQueuePool
+
+    options = engine_options('postgresql://db/app', {'DB_POOL_MODE': 'queue', 'DB_POOL_SIZE': '3',
+                                                     'DB_MAX_OVERFLOW': '2', 'DB_STATEMENT_TIMEOUT_MS': '1500'})
+    assert (options['pool_size'], options['max_overflow']) == (3, 2)
+    assert options['connect_args'] == {'options': '-c statement_timeout=1500'}
+
+    null = engine_options('sqlite://', {'DB_POOL_MODE': 'null'})
+    assert 'pool_size' not in null and 'connect_args' not in null
+    with pytest.raises(ValueError):
+        engine_options('sqlite://', {'DB_POOL_MODE': 'static'})
+
+
+@pytest.mark.parametrize('mode', ['null', 'queue'])
+def test_checkouts_are_counted(mode):
+    engine = make_engine({'DB_POOL_MODE': mode})
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            assert pool_stats(engine)['checked_out'] == 1
+    stats = pool_stats(engine)
+    assert stats['mode'] == mode
+    assert (stats['checkouts'], stats['checkins'], stats['checked_out']) == (3, 3, 0)
+    if mode == 'queue':
+        assert (stats['size'], stats['idle']) == (5, 1)
+
+
+def queue_of_one(timeout):
+    return make_engine({'DB_POOL_MODE': 'queue', 'DB_POOL_SIZE': '1', 'DB_MAX_OVERFLOW': '0',
+                        'DB_POOL_TIMEOUT': str(timeout)})
+
+
+def test_queue_pool_records_timeouts():
+    engine = queue_of_one(0.05)
+    with engine.connect():
+        with pytest.raises(PoolTimeout):
+            engine.connect()
+    assert pool_stats(engine)['timeouts'] == 1
+
+
+def test_queue_pool_records_waits():
+    engine = queue_of_one(5)
+    held = engine.connect()
+    # The second caller waits for the held connection to come back
+    threading.Timer(0.1, held.close).start()
+    with engine.connect():
+        stats = pool_stats(engine)
+    assert (stats['checkouts'], stats['max_checked_out']) == (2, 1)
+    assert stats['wait_ms_max'] >= 50
+
+
+def test_pool_endpoint_reports_the_app_engine(client):
+    before = client.get('/internal/pool', headers=AUTH).get_json()['pools']['default']
+    client.get('/media')
+    after = client.get('/internal/pool', headers=AUTH).get_json()['pools']['default']
+    assert after['mode'] == 'queue'
+    assert after['checkouts'] > before['checkouts']
+    assert after['checked_out'] == 0
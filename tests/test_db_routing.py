@@ -0,0 +1,106 @@
+"""Read-replica routing with the test database as primary and a copy of it as replica_1.
+
+The replica is a SQLite file copied from the primary, so titles written after
+the copy only exist on the primary: whether a read finds them tells which
+database answered.
+"""
+import base64
+import os
+import random
+import sqlite3
+import tempfile
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine, select
+
+import index
+from benchmarks.suite import catalog
+from db_routing import PRIMARY_COOKIE, ReplicaRouter
+from models import db, CatalogVersion, MediaTable
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture
+def replica(app, monkeypatch):
+    """``replica(max_lag=60, url=None)`` copies the primary into replica_1 and routes reads through it."""
+    engines = []
+
+    def attach(max_lag=60.0, url=None):
+        if url is None:
+            path = os.path.join(tempfile.mkdtemp(), 'replica.db')
+            primary = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+            with sqlite3.connect(path) as copy:
+                primary.backup(copy)
+            primary.close()
+            url = f"sqlite:///{path}"
+        engines.append(create_engine(url))
+        with app.app_context():
+            monkeypatch.setitem(db.engines, 'replica_1', engines[-1])
+        monkeypatch.setattr(index, 'replica_router', ReplicaRouter(db, ['replica_1'], check_interval=0,
+                                                                   max_lag=max_lag))
+        return engines[-1]
+    yield attach
+    for engine in engines:
+        engine.dispose()
+
+
+def add_movie(client, tmdb_id):
+    response = client.post('/api/admin/movies', json=catalog.movie(random.Random(tmdb_id), tmdb_id), headers=AUTH)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+
+def test_reads_go_to_the_replica(app, client, replica):
+    engine = replica()
+    movie_id = add_movie(client, 8_000_001).get_json()['id']
+
+    # A fresh client is not pinned: the copy does not have the new title yet
+    reader = app.test_client()
+    assert reader.get(f'/media/{movie_id}').status_code == 404
+    with engine.connect() as conn:
+        assert conn.execute(select(MediaTable.id).where(MediaTable.id == movie_id)).first() is None
+    # Views not marked @read_replica stay on the primary
+    assert reader.get('/internal/pool', headers=AUTH).get_json()['replicas']['replica_1']['healthy']
+
+
+def test_writes_go_to_the_primary(app, replica):
+    engine = replica()
+    with app.test_request_context('/media'):
+        g.db_read_bind = 'replica_1'
+        version = db.session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar()
+        index.bump_catalog_version()
+        db.session.commit()
+        with engine.connect() as conn:
+            assert conn.execute(select(CatalogVersion.version)).scalar() == version
+        g.db_read_bind = None
+        assert db.session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() == version + 1
+
+
+def test_writer_reads_its_own_writes_from_the_primary(app, client, replica):
+    replica()
+    response = add_movie(client, 8_000_002)
+    assert PRIMARY_COOKIE in response.headers.get('Set-Cookie', '')
+    movie_id = response.get_json()['id']
+
+    # The writing client carries the cookie and reads from the primary
+    assert client.get(f'/media/{movie_id}').status_code == 200
+    assert app.test_client().get(f'/media/{movie_id}').status_code == 404
+
+
+def test_lagging_replica_falls_back_to_the_primary(app, client, replica):
+    replica(max_lag=0)
+    movie_id = add_movie(client, 8_000_003).get_json()['id']
+    reader = app.test_client()
+    assert reader.get(f'/media/{movie_id}').status_code == 200
+    status = reader.get('/internal/pool', headers=AUTH).get_json()['replicas']['replica_1']
+    assert not status['healthy'] and status['error'].startswith('behind the primary')
+
+
+def test_unreachable_replica_falls_back_to_the_primary(app, client, replica):
+    movie_id = add_movie(client, 8_000_004).get_json()['id']
+    replica(url=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'missing', 'replica.db')}")
+    reader = app.test_client()
+    assert reader.get(f'/media/{movie_id}').status_code == 200
+    assert not reader.get('/internal/pool', headers=AUTH).get_json()['replicas']['replica_1']['healthy']
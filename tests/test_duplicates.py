@@ -0,0 +1,75 @@
+"""Merging duplicated titles keeps the derived tables consistent, on full and partly migrated schemas."""
+import random
+from datetime import datetime
+
+import duplicates
+import index
+from benchmarks.suite import catalog
+from models import db, Episode, LinkCheck, MediaDocument, Season
+
+
+def add_twins(app, tmdb_id):
+    """A movie and a series stored twice each; the second series has one more episode and season."""
+    records = [catalog.movie(random.Random(1), tmdb_id), catalog.series(random.Random(2), tmdb_id, 1, 2),
+               catalog.movie(random.Random(3), tmdb_id), catalog.series(random.Random(4), tmdb_id, 2, 3)]
+    with app.app_context():
+        ids = index.write_batch(records)
+        db.session.commit()
+    return ids
+
+
+def check_links(app, movie_ids, tv_ids):
+    """A link_check row for the 720p stream of every movie of ``movie_ids`` and episode of ``tv_ids``."""
+    with app.app_context():
+        rows = [{'owner_type': 'movie', 'owner_id': media_id, 'media_id': media_id,
+                 'url': f'https://cdn.example.com/{media_id}.m3u8'} for media_id in movie_ids]
+        for tv_id in tv_ids:
+            rows += [{'owner_type': 'episode', 'owner_id': episode.id, 'media_id': tv_id, 'url': episode.video_720p}
+                     for episode in Episode.query.join(Season).filter(Season.tv_series_id == tv_id)]
+        db.session.add_all(LinkCheck(field='video_720p', status='ok', checked_at=datetime.utcnow(), **row)
+                           for row in rows)
+        db.session.commit()
+
+
+def merge(app):
+    with app.app_context():
+        return duplicates.merge_duplicates()
+
+
+def test_merge_moves_link_checks_with_their_episodes(app, client, allow_duplicates):
+    movie_id, tv_id, movie_twin, tv_twin = add_twins(app, 7_000_001)
+    check_links(app, [movie_id, movie_twin], [tv_id, tv_twin])
+    with app.app_context():
+        moved = {episode.id for episode in Episode.query.join(Season).filter(
+            Season.tv_series_id == tv_twin, (Season.season_number == 2) | (Episode.episode_number == 3))}
+
+    result = merge(app)
+    assert result['merged'] == {movie_twin: movie_id, tv_twin: tv_id}
+
+    with app.app_context():
+        rows = LinkCheck.query.filter(LinkCheck.media_id.in_([movie_id, tv_id, movie_twin, tv_twin])).all()
+        assert {row.media_id for row in rows} == {movie_id, tv_id}
+        episodes = {episode.id for episode in Episode.query.join(Season).filter(Season.tv_series_id == tv_id)}
+        assert {row.owner_id for row in rows if row.owner_type == 'episode'} == episodes
+        assert moved <= episodes and len(moved) == 4
+        assert [row.owner_id for row in rows if row.owner_type == 'movie'] == [movie_id]
+
+
+def test_merge_before_updated_at_migration_drops_stale_documents(app, client, allow_duplicates, monkeypatch):
+    movie_id, tv_id, movie_twin, tv_twin = add_twins(app, 7_000_002)
+    # media_document exists (migration 7) but media_table.updated_at does not count as migrated (8)
+    monkeypatch.setattr(duplicates, 'applied_versions', lambda conn: set(range(1, 8)))
+
+    merge(app)
+    with app.app_context():
+        assert MediaDocument.query.filter(
+            MediaDocument.media_id.in_([movie_id, tv_id, movie_twin, tv_twin])).count() == 0
+    # The kept series is built from its rows, with the season it took over
+    seasons = client.get(f'/media/{tv_id}?expand=episodes').get_json()['data']['seasons']
+    assert sorted(seasons) == ['season_1', 'season_2']
+    assert [episode['episode_number'] for episode in seasons['season_1']['episodes']] == [1, 2, 3]
+
+    with app.app_context():
+        index.store_documents([movie_id, tv_id])
+        db.session.commit()
+
@@ -0,0 +1,84 @@
+"""Admin episode writes: partial batch updates and single-episode adds."""
+import base64
+import random
+
+import index
+from benchmarks.suite import catalog
+from models import Episode, Season
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+def add_series(client, tmdb_id):
+    series = catalog.series(random.Random(tmdb_id), tmdb_id, seasons=1, episodes=2)
+    response = client.post('/api/admin/tv-series', json=series, headers=AUTH)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['id'], series
+
+
+def stored_episode(app, tv_id, season_number, episode_number):
+    with app.app_context():
+        return Episode.query.join(Season).filter(
+            Season.tv_series_id == tv_id, Season.season_number == season_number,
+            Episode.episode_number == episode_number).first()
+
+
+def document(client, tv_id):
+    return client.get(f'/media/{tv_id}?expand=episodes').get_json()['data']
+
+
+def test_batch_update_keeps_fields_it_does_not_send(app, client):
+    tv_id, series = add_series(client, 6_000_001)
+    video_720p = series['seasons'][0]['episodes'][0]['video_links']['video_720p']
+
+    response = client.post(f'/api/admin/tv-series/{tv_id}/episodes/batch', headers=AUTH, json={
+        'season_number': 1,
+        'episodes': [{'episode_number': 1, 'episode_name': 'Renamed'},
+                     {'episode_number': 2, 'video_links': {'video_1080p': 'https://cdn.example.com/new.m3u8'}}],
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()['summary'] == {'created': 0, 'updated': 2, 'unchanged': 0}
+
+    first = stored_episode(app, tv_id, 1, 1)
+    assert (first.episode_name, first.video_720p) == ('Renamed', video_720p)
+    assert first.download_720p is not None
+    second = stored_episode(app, tv_id, 1, 2)
+    assert second.video_1080p == 'https://cdn.example.com/new.m3u8'
+    assert second.episode_name == series['seasons'][0]['episodes'][1]['episode_name']
+
+    # The published document carries the merged episode too
+    episode = document(client, tv_id)['seasons']['season_1']['episodes'][0]
+    assert (episode['episode_name'], episode['video_720p']) == ('Renamed', video_720p)
+
+
+def test_add_episode_rejects_missing_numbers(client):
+    tv_id, _ = add_series(client, 6_000_002)
+    response = client.post(f'/api/admin/tv-series/{tv_id}/episodes', json={'episode_number': 3}, headers=AUTH)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('season_number')
+    response = client.post(f'/api/admin/tv-series/{tv_id}/episodes', json={'season_number': 1}, headers=AUTH)
+    assert response.status_code == 400
+    response = client.post('/api/admin/tv-series/999999/episodes', json={'season_number': 1, 'episode_number': 1},
+                           headers=AUTH)
+    assert response.status_code == 404
+
+
+def test_add_episode_writes_season_and_episode_together(app, client, monkeypatch):
+    tv_id, _ = add_series(client, 6_000_003)
+
+    def fail(media_ids):
+        raise RuntimeError('document store down')
+    monkeypatch.setattr(index, 'store_documents', fail)
+    response = client.post(f'/api/admin/tv-series/{tv_id}/episodes', headers=AUTH,
+                           json={'season_number': 2, 'episode_number': 1, 'episode_name': 'Pilot'})
+    assert response.status_code == 500
+    with app.app_context():
+        assert Season.query.filter_by(tv_series_id=tv_id, season_number=2).first() is None
+
+    monkeypatch.undo()
+    response = client.post(f'/api/admin/tv-series/{tv_id}/episodes', headers=AUTH,
+                           json={'season_number': 2, 'episode_number': 1, 'episode_name': 'Pilot'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    seasons = document(client, tv_id)['seasons']
+    assert sorted(seasons) == ['season_1', 'season_2']
+    assert seasons['season_2']['episodes'][0]['episode_name'] == 'Pilot'
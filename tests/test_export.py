@@ -0,0 +1,71 @@
+"""/media/export: the streamed documents match /media, and since= keeps only titles updated after it."""
+import base64
+import json
+import random
+
+import pytest
+
+import index
+from benchmarks.suite import catalog
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # Several keyset batches even on the small test catalog
+    monkeypatch.setattr(index, 'EXPORT_BATCH_SIZE', 3)
+
+
+def export(client, query=''):
+    response = client.get(f'/media/export{query}')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+
+def lines(response):
+    assert response.mimetype == 'application/x-ndjson'
+    body = response.get_data(as_text=True)
+    # One document per line, each terminated by a newline
+    assert body == '' or body.endswith('\n')
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_ndjson_lines_match_media(client, seed):
+    seed(20, 6)
+    assert lines(export(client)) == client.get('/media').get_json()['data']
+    assert lines(export(client, '?type=tv')) == client.get('/media?type=tv').get_json()['data']
+
+
+def test_json_format_matches_media(client, seed):
+    seed(20, 6)
+    response = export(client, '?format=json&type=movie')
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'status': 'success', 'data': client.get('/media?type=movie').get_json()['data']}
+
+
+def test_since_keeps_titles_updated_after_it(client, seed):
+    seed(20, 6)
+    since = export(client).headers['X-Export-Started-At']
+    assert lines(export(client, f'?since={since}')) == []
+
+    series_id = next(document['id'] for document in client.get('/media?type=tv').get_json()['data'])
+    movie_id = client.post('/api/admin/movies', json=catalog.movie(random.Random(1), 9_300_001),
+                           headers=AUTH).get_json()['id']
+    episode = {'season_number': 99, 'episode_number': 1, 'episode_name': 'Export special'}
+    assert client.post(f'/api/admin/tv-series/{series_id}/episodes', json=episode, headers=AUTH).status_code == 200
+
+    changed = lines(export(client, f'?since={since}'))
+    assert [document['id'] for document in changed] == sorted([series_id, movie_id])
+    assert changed == [client.get(f'/media/{media_id}?expand=episodes').get_json()['data']
+                       for media_id in sorted([series_id, movie_id])]
+    # The same instant with an explicit offset
+    assert lines(export(client, f"?since={since[:-1]}%2B00:00")) == changed
+    assert [document['id'] for document in lines(export(client, f'?since={since}&type=movie'))] == [movie_id]
+
+
+@pytest.mark.parametrize('query', ['format=csv', 'type=book', 'since=yesterday'])
+def test_bad_parameters_are_rejected(client, query):
+    response = client.get(f'/media/export?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
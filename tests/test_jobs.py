@@ -0,0 +1,148 @@
+"""The job queue (leases, retries with backoff) and TMDB enrichment jobs against the stub TMDB."""
+import base64
+from datetime import datetime, timedelta
+
+import index
+from enrichment import ENRICH_JOB, EnrichmentHandler
+from jobs import PermanentJobError, Worker, claim, enqueue, retry
+from models import db, Cast, Job, MediaTable, Movie
+from tmdb_client import TMDBClient
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/w500'
+
+
+def add_movies(app, first_tmdb_id, count=1):
+    with app.app_context():
+        media_ids = index.write_batch([{'type': 'movie', 'tmdb_id': first_tmdb_id + n, 'title': f'Admin title {n}',
+                                        'cast': []} for n in range(count)])
+        db.session.commit()
+    return media_ids
+
+
+def jobs_of(app, kind):
+    with app.app_context():
+        return Job.query.filter(Job.kind == kind).order_by(Job.id).all()
+
+
+def make_due(app, kind):
+    with app.app_context():
+        Job.query.filter(Job.kind == kind, Job.status == 'queued').update({Job.run_after: datetime.utcnow()})
+        db.session.commit()
+
+
+class Handler:
+    """Fails every fetch with ``error``."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def load(self, jobs):
+        return {job.id: job.media_id for job in jobs}
+
+    def fetch(self, context):
+        raise self.error
+
+    def apply(self, items):
+        return {}
+
+
+def test_claimed_jobs_are_leased_until_the_lease_expires(app):
+    media_ids = add_movies(app, 9_100_000, 2)
+    with app.app_context():
+        assert enqueue('test_lease', media_ids) == 2
+        # Titles with a pending job are not queued twice
+        assert enqueue('test_lease', media_ids) == 0
+        db.session.commit()
+
+        claimed = claim(['test_lease'], 'worker-1', 10, lease_seconds=600)
+        assert [(job.media_id, job.attempts) for job in claimed] == [(media_ids[0], 1), (media_ids[1], 1)]
+        assert claim(['test_lease'], 'worker-2', 10, lease_seconds=600) == []
+
+        # worker-1 died: once its lease is over the jobs go to the next worker
+        Job.query.filter(Job.kind == 'test_lease').update(
+            {Job.locked_at: datetime.utcnow() - timedelta(seconds=601)})
+        db.session.commit()
+        reclaimed = claim(['test_lease'], 'worker-2', 10, lease_seconds=600)
+        assert [job.attempts for job in reclaimed] == [2, 2]
+    assert {job.locked_by for job in jobs_of(app, 'test_lease')} == {'worker-2'}
+
+
+def test_failed_jobs_back_off_until_max_attempts(app):
+    media_id, = add_movies(app, 9_100_010)
+    with app.app_context():
+        enqueue('test_flaky', [media_id], max_attempts=3)
+        db.session.commit()
+    worker = Worker(app, {'test_flaky': Handler(RuntimeError('upstream down'))}, retry_base_seconds=60)
+
+    for attempt, delay in ((1, 60), (2, 120)):
+        started = datetime.utcnow()
+        worker.run(once=True)
+        job, = jobs_of(app, 'test_flaky')
+        assert (job.status, job.attempts, job.last_error) == ('queued', attempt, 'upstream down')
+        assert timedelta(seconds=delay - 1) <= job.run_after - started <= timedelta(seconds=delay + 1)
+        # Not due before its backoff is over
+        assert worker.run(once=True) == {'succeeded': 0, 'retried': attempt, 'failed': 0}
+        make_due(app, 'test_flaky')
+
+    worker.run(once=True)
+    job, = jobs_of(app, 'test_flaky')
+    assert (job.status, job.attempts) == ('failed', 3)
+    assert worker.stats == {'succeeded': 0, 'retried': 2, 'failed': 1}
+
+    with app.app_context():
+        assert retry(job.id)
+        db.session.commit()
+    job, = jobs_of(app, 'test_flaky')
+    assert (job.status, job.attempts) == ('queued', 0)
+
+
+def test_permanent_errors_are_not_retried(app):
+    media_id, = add_movies(app, 9_100_020)
+    with app.app_context():
+        enqueue('test_permanent', [media_id])
+        db.session.commit()
+    Worker(app, {'test_permanent': Handler(PermanentJobError('no such title'))}).run(once=True)
+    job, = jobs_of(app, 'test_permanent')
+    assert (job.status, job.attempts, job.last_error) == ('failed', 1, 'no such title')
+
+
+def test_enrichment_fills_titles_from_tmdb(app, client, tmdb_stub):
+    stub = tmdb_stub()
+    media_id, = add_movies(app, 9_100_030)
+    response = client.post('/api/admin/jobs/enrich', json={'media_ids': [media_id]}, headers=AUTH)
+    assert response.status_code == 202 and response.get_json()['queued'] == 1
+
+    handler = EnrichmentHandler(TMDBClient('key', stub.base_url, IMAGE_BASE_URL))
+    assert Worker(app, {ENRICH_JOB: handler}).run(once=True)['succeeded'] == 1
+    assert stub.requests == 1
+
+    with app.app_context():
+        movie = db.session.get(Movie, media_id)
+        # TMDB fills what the admin left empty and owns rating and poster; the admin's title stays
+        assert movie.title == 'Admin title 0'
+        assert movie.description == 'Synthetic movie 9100030 served by the benchmark TMDB stub.'
+        assert (movie.rating, movie.thumbnail) == (7.1, f'{IMAGE_BASE_URL}/9100030.jpg')
+        assert (movie.release_date, movie.language) == ('2001-02-03', 'en')
+        assert [member.name for member in Cast.query.filter(Cast.media_id == media_id).order_by(Cast.id)] == \
+            [f'Actor {n}' for n in range(5)]
+        assert db.session.query(MediaTable.enriched_at).filter(MediaTable.id == media_id).scalar() is not None
+    job = client.get(f'/api/admin/jobs?kind={ENRICH_JOB}&media_id={media_id}', headers=AUTH).get_json()['jobs'][0]
+    assert job['status'] == 'succeeded' and job['result']['status'] == 'updated'
+    assert client.get(f'/media/{media_id}').get_json()['data']['rating'] == 7.1
+
+
+def test_enrichment_retries_when_tmdb_rate_limits(app, tmdb_stub):
+    stub = tmdb_stub(rate_limited=100)
+    media_id, = add_movies(app, 9_100_040)
+    with app.app_context():
+        enqueue(ENRICH_JOB, [media_id])
+        db.session.commit()
+
+    handler = EnrichmentHandler(TMDBClient('key', stub.base_url, IMAGE_BASE_URL, max_retries=0))
+    assert Worker(app, {ENRICH_JOB: handler}).run(once=True)['retried'] == 1
+    with app.app_context():
+        job = Job.query.filter(Job.kind == ENRICH_JOB, Job.media_id == media_id).one()
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert '429' in job.last_error
+        assert db.session.get(Movie, media_id).rating is None
@@ -0,0 +1,112 @@
+"""Link health checks against the local CDN stand-in (benchmarks/suite/stub_links.py)."""
+import base64
+import random
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+
+import index
+from benchmarks.suite import catalog
+from benchmarks.suite.stub_links import FILE_SIZE, StubLinks
+from link_check import LinkChecker, check_links
+from models import db, LinkCheck
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture
+def links_stub():
+    """``links_stub(latency_ms=0)`` starts a stub CDN, stopped after the test."""
+    stubs = []
+
+    def start(latency_ms=0):
+        stubs.append(StubLinks(latency_ms).start())
+        return stubs[-1]
+    yield start
+    for stub in stubs:
+        stub.stop()
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_links_are_classified(links_stub):
+    stub = links_stub()
+    checker = LinkChecker(timeout=5, slow_ms=150)
+
+    ok = checker.check(f'{stub.base_url}/ok/a.mp4')
+    assert (ok['status'], ok['http_status'], ok['content_length'], ok['error']) == ('ok', 200, FILE_SIZE, None)
+    assert ok['checked_at'] is not None
+
+    slow = checker.check(f'{stub.base_url}/slow/300/b.mp4')
+    assert (slow['status'], slow['http_status']) == ('slow', 200)
+    assert slow['latency_ms'] >= 300
+
+    missing = checker.check(f'{stub.base_url}/missing/c.mp4')
+    assert (missing['status'], missing['http_status'], missing['error']) == ('broken', 404, 'HTTP 404')
+
+    # 503 with Retry-After is retried once
+    assert checker.check(f'{stub.base_url}/flaky/d.mp4')['status'] == 'ok'
+
+    unreachable = checker.check(f'http://127.0.0.1:{unused_port()}/e.mp4')
+    assert (unreachable['status'], unreachable['http_status']) == ('broken', None)
+    assert unreachable['error'].startswith('ConnectionError')
+
+
+def test_head_refused_falls_back_to_a_ranged_get(links_stub):
+    stub = links_stub()
+    result = LinkChecker(timeout=5).check(f'{stub.base_url}/nohead/a.mkv')
+    # The size comes from Content-Range of the one-byte answer
+    assert (result['status'], result['http_status'], result['content_length']) == ('ok', 206, FILE_SIZE)
+    assert stub.requests == 2
+
+
+def test_requests_per_host_are_limited(links_stub):
+    stub = links_stub(latency_ms=100)
+    checker = LinkChecker(timeout=5, per_host=2)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(checker.check, [f'{stub.base_url}/ok/{n}.mp4' for n in range(12)]))
+    assert all(result['status'] == 'ok' for result in results)
+    assert stub.peak_in_flight == 2
+
+
+def test_sweep_stores_results_and_reports_them(app, client, links_stub):
+    stub = links_stub()
+    base = stub.base_url
+    movie = catalog.movie(random.Random(1), 9_000_001)
+    movie['video_links'] = {'video_720p': f'{base}/ok/m720.m3u8', 'video_1080p': f'{base}/slow/300/m1080.m3u8'}
+    movie['download_links'] = {'download_720p': {'url': f'{base}/missing/m720.mp4', 'file_type': 'mp4'},
+                               'download_1080p': {'url': f'{base}/nohead/m1080.mkv', 'file_type': 'mkv'}}
+    series = catalog.series(random.Random(2), 9_000_002, seasons=1, episodes=1)
+    series['seasons'][0]['episodes'][0].update(video_links={'video_720p': f'{base}/missing/e720.m3u8'},
+                                               download_links={})
+    with app.app_context():
+        movie_id, tv_id = index.write_batch([movie, series])
+        db.session.commit()
+
+        checker = LinkChecker(timeout=5, slow_ms=150)
+        summary = check_links(checker, media_ids=[movie_id, tv_id], concurrency=4)
+        assert summary == {'checked': 5, 'skipped': 0, 'removed': 0, 'ok': 2, 'slow': 1, 'broken': 2}
+        rows = {(row.owner_type, row.field): row for row in LinkCheck.query.filter(
+            LinkCheck.media_id.in_([movie_id, tv_id]))}
+        assert rows[('movie', 'download_1080p')].http_status == 206
+        assert rows[('episode', 'video_720p')].media_id == tv_id
+        assert rows[('movie', 'video_720p')].host == '127.0.0.1'
+
+        # Results younger than max_age are kept without asking the server again
+        requests = stub.requests
+        summary = check_links(checker, media_ids=[movie_id, tv_id], max_age=timedelta(hours=1))
+        assert (summary['checked'], summary['skipped'], stub.requests) == (0, 5, requests)
+
+    report = client.get(f'/api/admin/links?status=broken&media_id={movie_id}', headers=AUTH).get_json()
+    assert report['counts'] == {'ok': 2, 'slow': 1, 'broken': 1}
+    assert [(link['field'], link['http_status']) for link in report['links']] == [('download_720p', 404)]
+    assert any(entry['host'] == '127.0.0.1' and entry['broken'] >= 2 for entry in report['broken_hosts'])
+    slow = client.get(f'/api/admin/links?status=slow&media_id={movie_id}', headers=AUTH).get_json()['links']
+    assert [link['field'] for link in slow] == ['video_1080p']
+    assert client.get('/api/admin/links?status=dead', headers=AUTH).status_code == 400
@@ -0,0 +1,86 @@
+"""/media: the unparameterized response, cursor pagination, ?fields= projection and the filters."""
+import pytest
+
+MOVIE_KEYS = {'id', 'type', 'title', 'description', 'thumbnail', 'release_date', 'language', 'rating', 'cast',
+              'video_links', 'download_links'}
+TV_KEYS = {'id', 'type', 'title', 'description', 'thumbnail', 'release_date', 'language', 'rating', 'cast',
+           'total_seasons', 'seasons'}
+
+
+@pytest.fixture(scope='module')
+def catalog(app, seed):
+    """Every title of the unparameterized /media response."""
+    seed(20, 6)
+    response = app.test_client().get('/media')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def test_unparameterized_response_keeps_its_shape(catalog):
+    assert set(catalog) == {'status', 'total_count', 'data'}
+    assert catalog['status'] == 'success'
+    assert catalog['total_count'] == len(catalog['data'])
+    ids = [document['id'] for document in catalog['data']]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    for document in catalog['data']:
+        assert set(document) == (MOVIE_KEYS if document['type'] == 'movie' else TV_KEYS)
+    series = next(document for document in catalog['data'] if document['type'] == 'tv' and document['seasons'])
+    season = series['seasons']['season_1']
+    assert set(season) == {'season_number', 'total_episodes', 'episodes'}
+    # Full documents, episodes included
+    assert {'episode_number', 'episode_name', 'video_720p', 'download_720p'} <= set(season['episodes'][0])
+
+
+@pytest.mark.parametrize('query, kind', [('', None), ('&type=tv', 'tv'), ('&type=movie', 'movie')])
+def test_cursor_walks_every_title_once(client, catalog, query, kind):
+    expected = [document['id'] for document in catalog['data'] if kind in (None, document['type'])]
+    seen, cursor = [], None
+    while True:
+        page = get(client, f"/media?limit=7{query}" + (f"&cursor={cursor}" if cursor is not None else ''))
+        assert page['total_count'] == len(page['data']) <= 7
+        seen += [document['id'] for document in page['data']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+        assert cursor == seen[-1]
+    assert seen == expected
+
+
+def test_fields_projects_every_document(client, catalog):
+    projected = get(client, '/media?fields=id,title,cast')['data']
+    assert projected == [{key: document[key] for key in ('id', 'title', 'cast')} for document in catalog['data']]
+    # Keys a title type does not have are left out rather than null
+    seasons = get(client, '/media?fields=id,seasons&type=movie')['data']
+    assert seasons and all(set(document) == {'id'} for document in seasons)
+
+
+def test_filters_match_the_documents(client, catalog):
+    documents = catalog['data']
+    language = next(document['language'] for document in documents if document['language'])
+    year = next(document['release_date'][:4] for document in documents if document['release_date'])
+
+    def ids(predicate):
+        return [document['id'] for document in documents if predicate(document)]
+
+    assert [d['id'] for d in get(client, f'/media?language={language}')['data']] == \
+        ids(lambda d: d['language'] == language)
+    assert [d['id'] for d in get(client, f'/media?year={year}')['data']] == \
+        ids(lambda d: (d['release_date'] or '').startswith(f'{year}-'))
+    assert [d['id'] for d in get(client, f'/media?type=tv&language={language}&year={year}')['data']] == \
+        ids(lambda d: d['type'] == 'tv' and d['language'] == language and (d['release_date'] or '').startswith(f'{year}-'))
+    # A filtered request without a limit has no cursor
+    assert 'next_cursor' not in get(client, '/media?type=movie')
+
+
+@pytest.mark.parametrize('query', ['type=book', 'limit=0', 'limit=ten', 'cursor=-1', 'year=nineties',
+                                   'fields=id,budget'])
+def test_bad_parameters_are_rejected(client, query):
+    response = client.get(f'/media?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
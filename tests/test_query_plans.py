@@ -0,0 +1,112 @@
+"""The hot list, filter and detail queries are answered through indexes after init_db.
+
+Each request's statements are captured and run again under EXPLAIN QUERY
+PLAN on the test database (SQLite).
+"""
+import pytest
+from sqlalchemy import event
+
+import index
+from catalog import load_catalog, query_media_ids
+from models import MediaDocument, Movie
+
+CATALOG_TABLES = ('media_table', 'movie', 'tv_series', 'cast', 'season', 'episode', 'media_document')
+
+
+@pytest.fixture(scope='module')
+def titles(app, seed):
+    seed(60, 20)
+    with app.app_context():
+        movie_id = query_media_ids(media_type='movie', limit=1)[0]
+        tv_id = query_media_ids(media_type='tv', limit=1)[0]
+        year = index.db.session.get(Movie, movie_id).release_date[:4]
+    return {'movie': movie_id, 'tv': tv_id, 'year': year}
+
+
+def captured(app, call):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    with app.app_context():
+        engine = index.db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            call()
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return [(statement, parameters) for statement, parameters in statements
+            if statement.lstrip().upper().startswith('SELECT')]
+
+
+def plans(app, call):
+    """``[(statement, [plan detail, ...])]`` of the SELECTs ``call`` runs."""
+    result = []
+    for statement, parameters in captured(app, call):
+        with app.app_context(), index.db.engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        result.append((statement, [row[-1] for row in rows]))
+    assert result, 'no statements captured'
+    return result
+
+
+def table_scans(details):
+    return [detail for detail in details
+            if detail.startswith('SCAN ') and detail.split()[1].strip('"') in CATALOG_TABLES]
+
+
+def assert_no_scans(app, call):
+    details = []
+    for statement, plan in plans(app, call):
+        assert not table_scans(plan), f"{statement}\n{plan}"
+        details += plan
+    return details
+
+
+def get(client, url):
+    def call():
+        response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return call
+
+
+def test_list_pages(app, client, titles):
+    # Every page after the first continues from the cursor through the primary key
+    details = assert_no_scans(app, get(client, f"/media?cursor={titles['movie']}&limit=20"))
+    assert any('USING INTEGER PRIMARY KEY' in detail for detail in details)
+    # The first page reads media_table in id order and stops at the limit: no sort, no filter
+    (_, ids_plan), (_, documents_plan) = plans(app, get(client, '/media?limit=20'))
+    assert ids_plan == ['SCAN media_table']
+    assert not table_scans(documents_plan)
+
+
+@pytest.mark.parametrize('query, indexes', [
+    ('type=tv&limit=20', ['idx_media_table_type_id']),
+    ('type=movie&cursor={movie}&limit=20', ['idx_media_table_type_id']),
+    ('language=ja&limit=20', ['idx_movie_language', 'idx_tv_series_language']),
+    ('year={year}&limit=20', ['idx_movie_release_date', 'idx_tv_series_release_date']),
+    ('type=tv&language=en&year={year}&limit=20', ['idx_tv_series_']),
+])
+def test_filters_use_indexes(app, client, titles, query, indexes):
+    details = assert_no_scans(app, get(client, '/media?' + query.format(**titles)))
+    for name in indexes:
+        assert any(name in detail for detail in details), details
+
+
+@pytest.mark.parametrize('path', ['/media/{tv}', '/media/{tv}?expand=episodes', '/media/{movie}',
+                                  '/media/{tv}/seasons', '/media/{tv}/seasons/1/episodes'])
+def test_details(app, client, titles, path):
+    assert_no_scans(app, get(client, path.format(**titles)))
+
+
+def test_titles_without_stored_documents(app, titles):
+    """load_catalog, which builds the documents the detail route has not stored."""
+    with app.app_context():
+        index.db.session.query(MediaDocument).filter(
+            MediaDocument.media_id.in_([titles['movie'], titles['tv']])).delete(synchronize_session=False)
+        index.db.session.commit()
+    details = assert_no_scans(app, lambda: load_catalog([titles['movie'], titles['tv']]))
+    assert any('idx_cast_media_id' in detail for detail in details), details
+    with app.app_context():
+        index.store_documents([titles['movie'], titles['tv']])
+        index.db.session.commit()
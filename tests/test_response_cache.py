@@ -0,0 +1,92 @@
+"""Cached public responses: per-encoding ETags, and a failing cache backend degrades to uncached."""
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+import index
+from compression import Compressor
+from response_cache import MemoryCache, cached_view
+from snapshot import SnapshotManager
+
+
+class FailingBackend:
+    def __init__(self, fail_get=True):
+        self.fail_get = fail_get
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        if self.fail_get:
+            raise ConnectionError('cache server unreachable')
+        return None
+
+    def set(self, key, entry):
+        self.calls += 1
+        raise ConnectionError('cache server unreachable')
+
+
+@pytest.mark.parametrize('fail_get', [True, False])
+def test_backend_failure_serves_the_view(fail_get):
+    app = Flask(__name__)
+    backend = FailingBackend(fail_get)
+
+    @app.route('/thing')
+    @cached_view(lambda: backend, lambda: (1, None), 'public', Compressor(), retry_interval=60)
+    def thing():
+        return jsonify({'status': 'success'})
+
+    client = app.test_client()
+    for _ in range(3):
+        response = client.get('/thing')
+        assert response.status_code == 200
+        assert response.get_json() == {'status': 'success'}
+    # Left alone after the first failure
+    assert backend.calls == (1 if fail_get else 2)
+
+
+@pytest.fixture
+def cached(app, seed, monkeypatch):
+    seed(3, 2)
+    monkeypatch.setattr(index, 'response_cache', MemoryCache())
+    with app.app_context():
+        return index.query_media_ids(media_type='tv', limit=1)[0]
+
+
+def test_etag_per_encoding(client, cached):
+    url = f'/media/{cached}?expand=episodes'
+    identity = client.get(url, headers={'Accept-Encoding': 'identity'})
+    gzipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert identity.headers.get('Content-Encoding') is None
+    assert gzipped.get_etag()[0] == identity.get_etag()[0] + '-gzip'
+    assert 'Accept-Encoding' in gzipped.vary
+
+    for encoding, response in (('identity', identity), ('gzip', gzipped)):
+        etag = response.headers['ETag']
+        assert client.get(url, headers={'Accept-Encoding': encoding, 'If-None-Match': etag}).status_code == 304
+    # The validator of one encoding does not stand for the other
+    mismatch = client.get(url, headers={'Accept-Encoding': 'identity', 'If-None-Match': gzipped.headers['ETag']})
+    assert mismatch.status_code == 200
+
+
+def test_snapshot_path_has_the_cached_etags(app, client, cached, tmp_path, monkeypatch):
+    url = f'/media/{cached}?expand=episodes'
+    expected = {encoding: client.get(url, headers={'Accept-Encoding': encoding})
+                for encoding in ('identity', 'gzip')}
+
+    manager = SnapshotManager(app, str(tmp_path), check_interval=0)
+    monkeypatch.setattr(index, 'snapshots', manager)
+    deadline = time.monotonic() + 10
+    with app.app_context():
+        while manager.current() is None:
+            assert time.monotonic() < deadline, 'snapshot not built'
+            time.sleep(0.05)
+
+    for encoding, response in expected.items():
+        snapshot = client.get(url, headers={'Accept-Encoding': encoding})
+        assert snapshot.headers['ETag'] == response.headers['ETag']
+        assert snapshot.headers.get('Content-Encoding') == response.headers.get('Content-Encoding')
+        assert snapshot.get_data() == response.get_data()
+        revalidated = client.get(url, headers={'Accept-Encoding': encoding, 'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
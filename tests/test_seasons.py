@@ -0,0 +1,78 @@
+"""Per-season reads: /media/<id>/seasons and the paginated /media/<id>/seasons/<n>/episodes."""
+import base64
+import random
+
+import pytest
+
+from benchmarks.suite import catalog
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture(scope='module')
+def series(app):
+    """A series with three seasons of five episodes, and its full document."""
+    client = app.test_client()
+    record = catalog.series(random.Random(9_500_001), 9_500_001, seasons=3, episodes=5)
+    response = client.post('/api/admin/tv-series', json=record, headers=AUTH)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    tv_id = response.get_json()['id']
+    return tv_id, client.get(f'/media/{tv_id}?expand=episodes').get_json()['data']
+
+
+def get(client, url, status_code=200):
+    response = client.get(url)
+    assert response.status_code == status_code, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def test_seasons_list_the_document_seasons(client, series):
+    tv_id, document = series
+    seasons = get(client, f'/media/{tv_id}/seasons')
+    assert seasons == {'status': 'success', 'total_count': 3, 'data': [
+        {key: season[key] for key in ('season_number', 'total_episodes')}
+        for season in document['seasons'].values()]}
+    assert [season['season_number'] for season in seasons['data']] == [1, 2, 3]
+
+
+def test_series_without_seasons_has_an_empty_list(client):
+    record = catalog.series(random.Random(9_500_002), 9_500_002, seasons=0, episodes=0)
+    tv_id = client.post('/api/admin/tv-series', json=record, headers=AUTH).get_json()['id']
+    assert get(client, f'/media/{tv_id}/seasons') == {'status': 'success', 'total_count': 0, 'data': []}
+
+
+def test_season_episodes_match_the_document(client, series):
+    tv_id, document = series
+    season = document['seasons']['season_2']
+    page = get(client, f'/media/{tv_id}/seasons/2/episodes')
+    assert page == {'status': 'success', 'season_number': 2, 'total_episodes': season['total_episodes'],
+                    'data': season['episodes'], 'next_cursor': None}
+
+
+def test_season_episodes_are_paginated(client, series):
+    tv_id, document = series
+    episodes, cursor = [], ''
+    while cursor is not None:
+        page = get(client, f'/media/{tv_id}/seasons/3/episodes?limit=2&cursor={cursor}')
+        assert len(page['data']) <= 2
+        episodes += page['data']
+        cursor = page['next_cursor']
+    assert episodes == document['seasons']['season_3']['episodes']
+    assert get(client, f'/media/{tv_id}/seasons/3/episodes?cursor=5')['data'] == []
+
+
+def test_missing_titles_and_seasons_are_404(client, series, seed):
+    tv_id, _ = series
+    seed(1)
+    movie_id = next(document['id'] for document in get(client, '/media?type=movie')['data'])
+    assert get(client, '/media/999999999/seasons', 404)['error'] == 'TV series not found'
+    # A movie has no seasons
+    assert get(client, f'/media/{movie_id}/seasons', 404)['error'] == 'TV series not found'
+    assert get(client, f'/media/{tv_id}/seasons/4/episodes', 404)['error'] == 'Season not found'
+    assert get(client, '/media/999999999/seasons/1/episodes', 404)['error'] == 'Season not found'
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=two', 'cursor=-1'])
+def test_bad_pagination_is_rejected(client, series, query):
+    tv_id, _ = series
+    assert get(client, f'/media/{tv_id}/seasons/1/episodes?{query}', 400)['error']
@@ -0,0 +1,123 @@
+"""Snapshot mode: /media/<id> is served from the snapshot of the current catalog version, else from the database."""
+import base64
+import os
+import random
+import time
+
+import pytest
+
+import index
+from benchmarks.suite import catalog
+from models import db
+from snapshot import SnapshotManager, snapshot_filename
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture
+def database_reads(monkeypatch):
+    """Media ids /media/<id> looked up in the database, rather than answered from the snapshot."""
+    reads = []
+
+    def load_document_bodies(media_ids, **options):
+        reads.extend(media_ids)
+        return bodies(media_ids, **options)
+    bodies = index.load_document_bodies
+    monkeypatch.setattr(index, 'load_document_bodies', load_document_bodies)
+    return reads
+
+
+@pytest.fixture
+def snapshots(app, tmp_path, monkeypatch, seed):
+    """``snapshots(build=True)`` switches snapshot mode on with an empty snapshot directory."""
+    seed(3, 1)
+
+    def start(build=True):
+        manager = SnapshotManager(app, str(tmp_path / 'snapshots'), check_interval=0,
+                                  bundle_dir=str(tmp_path / 'bundle'))
+        if not build:
+            monkeypatch.setattr(manager, '_start_build', lambda: None)
+        monkeypatch.setattr(index, 'snapshots', manager)
+        return manager
+    return start
+
+
+def wait_until_current(app, manager):
+    deadline = time.monotonic() + 10
+    with app.app_context():
+        while manager.current() is None:
+            assert time.monotonic() < deadline, 'snapshot not built'
+            time.sleep(0.05)
+        return manager.current()
+
+
+def some_title(client):
+    return client.get('/media?type=tv&limit=1').get_json()['data'][0]['id']
+
+
+def test_current_snapshot_answers_without_the_database(app, client, snapshots, database_reads):
+    manager = snapshots()
+    media_id = some_title(client)
+    expected = client.get(f'/media/{media_id}').get_json()
+    database_reads.clear()
+
+    wait_until_current(app, manager)
+    assert client.get(f'/media/{media_id}').get_json() == expected
+    assert client.get('/media/999999999').status_code == 404
+    assert database_reads == []
+
+
+def test_missing_snapshot_falls_back_to_the_database(app, client, snapshots, database_reads):
+    manager = snapshots(build=False)
+    media_id = some_title(client)
+    database_reads.clear()
+    with app.app_context():
+        assert manager.current() is None
+    response = client.get(f'/media/{media_id}?expand=episodes')
+    assert response.status_code == 200 and response.get_json()['data']['id'] == media_id
+    assert client.get('/media/999999999').status_code == 404
+    assert database_reads == [media_id, 999999999]
+    assert manager.status()['snapshot_version'] is None
+
+
+def test_unreadable_snapshot_is_rebuilt(app, client, snapshots, tmp_path):
+    with app.app_context():
+        version = index.primary_catalog_version()
+    os.makedirs(tmp_path / 'bundle')
+    (tmp_path / 'bundle' / snapshot_filename(version)).write_bytes(b'not a snapshot')
+
+    snapshot = wait_until_current(app, snapshots())
+    assert snapshot.version == version
+    assert snapshot.path == str(tmp_path / 'snapshots' / snapshot_filename(version))
+
+
+def test_version_bump_rebuilds_the_snapshot(app, client, snapshots, database_reads, monkeypatch):
+    manager = snapshots()
+    old = wait_until_current(app, manager)
+
+    # Hold the rebuild back to see the stale snapshot left unused
+    start_build = manager._start_build
+    monkeypatch.setattr(manager, '_start_build', lambda: None)
+    response = client.post('/api/admin/movies', json=catalog.movie(random.Random(1), 9_600_001), headers=AUTH)
+    movie_id = response.get_json()['id']
+    reader = app.test_client()
+    with app.app_context():
+        assert manager.current() is None
+        assert manager.status()['catalog_version'] == old.version + 1
+    assert reader.get(f'/media/{movie_id}').get_json()['data']['title'] == \
+        client.get(f'/media/{movie_id}').get_json()['data']['title']
+    assert movie_id in database_reads
+
+    # The next write's expire() starts the build of the new version
+    monkeypatch.setattr(manager, '_start_build', start_build)
+    with app.app_context():
+        index.bump_catalog_version()
+        db.session.commit()
+    manager.expire()
+    new = wait_until_current(app, manager)
+    assert new.version == old.version + 2
+    assert not os.path.exists(old.path)
+
+    database_reads.clear()
+    assert reader.get(f'/media/{movie_id}').status_code == 200
+    assert database_reads == []
@@ -0,0 +1,93 @@
+"""The catalog_stats counters kept by the write paths agree with a fresh count of the catalog."""
+import base64
+import random
+
+import pytest
+from sqlalchemy import func, select, text
+
+import duplicates
+import index
+from benchmarks.suite import catalog
+from enrichment import ENRICH_JOB, EnrichmentHandler
+from jobs import Worker, enqueue
+from models import db, CatalogStat, Cast, Episode, Movie, Season, TVSeries
+from stats import compute_stats, reconcile_stats
+from tmdb_client import TMDBClient
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'venura:venura').decode()}
+
+
+@pytest.fixture(autouse=True)
+def reconciled(app):
+    # Other modules write outside the app's write paths; start each test from exact counters
+    with app.app_context():
+        reconcile_stats()
+
+
+def assert_counters_match(app, client):
+    with app.app_context():
+        conn = db.session.connection()
+        stored = {(row.name, row.bucket): row.value for row in conn.execute(select(CatalogStat.__table__))
+                  if row.value}
+        assert stored == pytest.approx({key: value for key, value in compute_stats(conn).items() if value})
+        counts = {name: conn.execute(select(func.count()).select_from(model)).scalar()
+                  for name, model in (('movies', Movie), ('tv_series', TVSeries), ('seasons', Season),
+                                      ('episodes', Episode), ('cast', Cast))}
+    stats = client.get('/api/stats').get_json()
+    assert {name: stats[f'total_{name}'] for name in counts} == counts
+    assert stats['total_media'] == counts['movies'] + counts['tv_series']
+    with app.app_context():
+        assert reconcile_stats() == {}
+
+
+def test_adding_titles_and_episodes(app, client):
+    assert client.post('/api/admin/movies', json=catalog.movie(random.Random(1), 9_400_001),
+                       headers=AUTH).status_code == 200
+    response = client.post('/api/admin/tv-series', json=catalog.series(random.Random(2), 9_400_002, 2, 3),
+                           headers=AUTH)
+    tv_id = response.get_json()['id']
+    assert_counters_match(app, client)
+
+    episode = {'season_number': 3, 'episode_number': 1, 'episode_name': 'New season'}
+    assert client.post(f'/api/admin/tv-series/{tv_id}/episodes', json=episode, headers=AUTH).status_code == 200
+    batch = {'season_number': 4, 'episodes': [{'episode_number': n, 'episode_name': f'Part {n}'} for n in (1, 2)]}
+    assert client.post(f'/api/admin/tv-series/{tv_id}/episodes/batch', json=batch, headers=AUTH).status_code == 200
+    assert_counters_match(app, client)
+
+
+def test_updating_titles(app, client, tmdb_stub):
+    # Enrichment fills language, release date, rating and cast of a bare title
+    with app.app_context():
+        media_id, = index.write_batch([{'type': 'movie', 'tmdb_id': 9_400_010, 'title': 'Bare title', 'cast': []}])
+        db.session.commit()
+        enqueue(ENRICH_JOB, [media_id])
+        db.session.commit()
+    stub = tmdb_stub()
+    handler = EnrichmentHandler(TMDBClient('key', stub.base_url, 'https://image.tmdb.org/t/p/w500'))
+    assert Worker(app, {ENRICH_JOB: handler}).run(once=True)['succeeded'] == 1
+    assert client.get(f'/media/{media_id}').get_json()['data']['language'] == 'en'
+    assert_counters_match(app, client)
+
+
+def test_merging_duplicates(app, client, allow_duplicates):
+    records = [catalog.movie(random.Random(1), 9_400_020), catalog.series(random.Random(2), 9_400_020, 1, 2),
+               catalog.movie(random.Random(3), 9_400_020), catalog.series(random.Random(4), 9_400_020, 2, 3)]
+    with app.app_context():
+        index.write_batch(records)
+        db.session.commit()
+        assert len(duplicates.merge_duplicates()['merged']) == 2
+    assert_counters_match(app, client)
+
+
+def test_deletes_outside_the_app_are_reconciled(app, client):
+    tv_id = client.post('/api/admin/tv-series', json=catalog.series(random.Random(5), 9_400_030, 1, 2),
+                        headers=AUTH).get_json()['id']
+    with app.app_context():
+        # A manual clean-up in SQL: the counters still include the episodes and cast until reconciled
+        db.session.execute(text('DELETE FROM episode WHERE season_id IN '
+                                '(SELECT id FROM season WHERE tv_series_id = :id)'), {'id': tv_id})
+        cast = db.session.execute(text('DELETE FROM "cast" WHERE media_id = :id'), {'id': tv_id}).rowcount
+        db.session.commit()
+        drift = reconcile_stats()
+    assert drift == {'episodes:': 2, 'cast:': cast}
+    assert_counters_match(app, client)
@@ -0,0 +1,108 @@
+"""The TMDB client against the local stub server, and its metadata cache.
+
+Covers 429/Retry-After backoff, coalescing of concurrent lookups of one id,
+stale-while-revalidate refreshes, concurrent writers of one cache key and
+cache errors, which never fail a lookup.
+"""
+import threading
+import time
+
+import pytest
+
+import index
+from tmdb_client import MemoryMetadataCache, SQLMetadataCache, TMDBClient, TMDBError
+
+
+def stub_client(stub, **options):
+    return TMDBClient('key', stub.base_url, 'https://images.invalid', **options)
+
+
+def test_rate_limited_lookup_waits_for_retry_after(tmdb_stub):
+    stub = tmdb_stub(rate_limited=2)
+    # Retry-After (1s, capped at max_backoff) is honored instead of the much shorter exponential backoff
+    client = stub_client(stub, backoff=0.001, max_backoff=0.2)
+    started = time.perf_counter()
+    assert client.movie(603)['title'] == 'Stub movie 603'
+    assert time.perf_counter() - started >= 0.4
+    assert stub.requests == 3
+
+
+def test_rate_limited_lookup_gives_up_after_max_retries(tmdb_stub):
+    stub = tmdb_stub(rate_limited=10)
+    with pytest.raises(TMDBError):
+        stub_client(stub, max_retries=2, max_backoff=0.01).tv(1399)
+    assert stub.requests == 3
+
+
+def test_concurrent_lookups_share_one_request(tmdb_stub):
+    stub = tmdb_stub(latency_ms=200)
+    client = stub_client(stub)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def lookup():
+        barrier.wait()
+        results.append(client.movie(700))
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert results[0]['title'] == 'Stub movie 700'
+    assert stub.requests == 1
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background(tmdb_stub):
+    stub = tmdb_stub(latency_ms=50)
+    cache = MemoryMetadataCache()
+    client = stub_client(stub, cache=cache, ttl=60, stale_ttl=3600)
+    cache.set('movie:701', {'title': 'Old'}, time.time() - 120)
+
+    assert client.movie(701) == {'title': 'Old'}
+    deadline = time.monotonic() + 5
+    while cache.get('movie:701')[0]['title'] == 'Old' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get('movie:701')[0]['title'] == 'Stub movie 701'
+    assert client.movie(701)['title'] == 'Stub movie 701'
+    assert stub.requests == 1
+
+    # Past the stale window the lookup waits for TMDB
+    cache.set('movie:702', {'title': 'Old'}, time.time() - 60 - 3600 - 1)
+    assert client.movie(702)['title'] == 'Stub movie 702'
+    assert stub.requests == 2
+
+
+def test_concurrent_writes_of_one_key(app):
+    cache = SQLMetadataCache(index.tmdb_cache_engine)
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def write(n):
+        barrier.wait()
+        try:
+            for round_ in range(10):
+                cache.set('movie:4242', {'title': f'writer {n}', 'round': round_}, float(round_))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    payload, fetched_at = cache.get('movie:4242')
+    assert payload['round'] == 9 and fetched_at == 9.0
+
+
+class BrokenCache:
+    def get(self, key):
+        raise RuntimeError('cache database unreachable')
+
+    def set(self, key, payload, fetched_at):
+        raise RuntimeError('cache database unreachable')
+
+
+def test_cache_errors_do_not_fail_the_lookup(tmdb_stub):
+    client = stub_client(tmdb_stub(), cache=BrokenCache())
+    assert client.movie(603)['title'] == 'Stub movie 603'